@@ -0,0 +1,243 @@
+'''
+Архив прогона погружения: параметры расчёта, траектории x, t, w, impulse
+и заранее прореженные уровни траекторий для быстрого отображения.
+
+Устройство файла:
+сигнатура `MAGIC` (8 байт) и версия (uint64);
+уровни траекторий подряд -- массивы записей `RECORD` (x, t, w, impulse, little-endian float64),
+каждый с границы `ALIGN` байт;
+описание в JSON (параметры `main`, причина окончания, счётчики, смещения и длины уровней);
+последние 16 байт -- смещение описания (uint64) и сигнатура.
+Уровень 0 -- все моменты расчёта. Уровень k -- по два момента (с наименьшей и наибольшей
+силой импульса) на каждые `FACTOR ** k` моментов, уровни строятся, пока в уровне больше
+`OVERVIEW_POINTS` моментов. Уровни открываются через `np.memmap`, поэтому архив любого
+размера открывается сразу, а с диска читаются только страницы отображаемого окна (`Archive.window`).
+'''
+import json
+import os
+
+import numpy as np
+
+import decimation
+import pogruzhatel_jit
+
+MAGIC = b'XOLMRUN\x00'
+VERSION = 1
+RECORD = np.dtype([('x', '<f8'), ('t', '<f8'), ('w', '<f8'), ('impulse', '<f8')])
+ALIGN = 64
+FACTOR = 8  # во сколько раз каждый уровень короче предыдущего (по количеству групп)
+OVERVIEW_POINTS = 2 * 2700  # наибольшее количество моментов в самом грубом уровне
+BLOCK = 2 ** 18  # моментов в блоке при построении уровней
+
+STATUS_NAMES = pogruzhatel_jit.STATUS_NAMES
+
+
+def jsonable(params: dict) -> dict:
+    '''
+    Возвращает копию словаря параметров `params` для JSON: массивы -- списки, числа numpy -- числа Python.
+    '''
+    return {name: np.asarray(value).tolist() for name, value in params.items()}
+
+
+class ArchiveWriter:
+    '''
+    Запись архива по частям: `append` дописывает моменты траектории в уровень 0,
+    `finish` строит прореженные уровни и записывает описание.
+    '''
+
+    def __init__(self, path: str, params: dict):
+        self.path = path
+        self.params = jsonable(params)
+        self.file = open(path, 'w+b')
+        self.file.write(MAGIC + np.uint64(VERSION).tobytes())
+        self.pad()
+        self.levels = [{'bucket': 1, 'offset': self.file.tell(), 'size': 0}]
+
+    def pad(self):
+        self.file.write(b'\x00' * (-self.file.tell() % ALIGN))
+
+    def append(self, x, t, w, impulse):
+        '''
+        Дописывает моменты времени в уровень 0.
+        '''
+        records = np.empty(len(t), RECORD)
+        records['x'] = x
+        records['t'] = t
+        records['w'] = w
+        records['impulse'] = impulse
+        records.tofile(self.file)
+        self.levels[0]['size'] += len(records)
+
+    def build_level(self, source: dict, group: int):
+        '''
+        Дописывает уровень из двух моментов на каждые `group` моментов уровня `source`.
+        '''
+        self.file.flush()
+        self.pad()
+        level = {'bucket': source['bucket'] * FACTOR, 'offset': self.file.tell(), 'size': 0}
+        records = np.memmap(self.path, RECORD, 'r', source['offset'], (source['size'],))
+        out = np.empty(BLOCK // group * 2 + 2, RECORD)
+        out_x = np.empty(len(out))
+        out_t = np.empty(len(out))
+        out_w = np.empty(len(out))
+        out_impulse = np.empty(len(out))
+        # блоки кратны группе, поэтому группы не разрываются границами блоков
+        step = BLOCK // group * group
+        for start in range(0, len(records), step):
+            block = np.array(records[start:start + step])
+            size = decimation.minmax_append(
+                np.ascontiguousarray(block['x']), np.ascontiguousarray(block['t']),
+                np.ascontiguousarray(block['w']), np.ascontiguousarray(block['impulse']),
+                0, len(block), group, out_x, out_t, out_w, out_impulse, 0
+            )
+            out['x'][:size] = out_x[:size]
+            out['t'][:size] = out_t[:size]
+            out['w'][:size] = out_w[:size]
+            out['impulse'][:size] = out_impulse[:size]
+            out[:size].tofile(self.file)
+            level['size'] += size
+        del records
+        self.levels.append(level)
+        return level
+
+    def finish(self, status: str, stats: dict = None):
+        '''
+        Строит прореженные уровни, записывает описание архива и закрывает файл.
+        status -- причина окончания расчёта (см. `STATUS_NAMES`); stats -- счётчики расчёта.
+        '''
+        level = self.levels[0]
+        # уровень 1 -- по группам из FACTOR моментов расчёта, следующие -- по FACTOR групп
+        # (2 * FACTOR моментов) предыдущего уровня
+        group = FACTOR
+        while level['size'] > OVERVIEW_POINTS:
+            level = self.build_level(level, group)
+            group = 2 * FACTOR
+        self.file.flush()
+        header = json.dumps({
+            'version': VERSION,
+            'params': self.params,
+            'status': status,
+            'stats': stats or {},
+            'levels': self.levels,
+        }, ensure_ascii=False).encode('utf-8')
+        offset = self.file.tell()
+        self.file.write(header)
+        self.file.write(np.uint64(offset).tobytes() + MAGIC)
+        self.file.close()
+
+
+def write(path: str, params: dict, x, t, w, impulse, status: str, stats: dict = None):
+    '''
+    Записывает в архив `path` готовые траектории расчёта с параметрами `params`.
+    '''
+    writer = ArchiveWriter(path, params)
+    writer.append(x, t, w, impulse)
+    writer.finish(status, stats)
+
+
+def save_run(path: str, params: dict, control: np.ndarray = None, chunk: int = 2 ** 16) -> str:
+    '''
+    Считает погружение с параметрами `params` (см. `pogruzhatel_jit.main_args`) порциями
+    по `chunk` моментов времени и записывает все моменты в архив `path` по мере расчёта,
+    поэтому память не зависит от длительности погружения.
+    Для совпадения с уже показанным расчётом с шумами в `params` должно быть задано зерно `seed`.
+    control -- массив управления (см. `pogruzhatel_jit.simulate`): после каждой порции
+               в него записываются глубина, время и счётчики, при отмене архив не сохраняется.
+    Возвращает причину окончания расчёта (см. `STATUS_NAMES`).
+    '''
+    if control is None:
+        control = np.zeros(pogruzhatel_jit.CONTROL_SIZE)
+    state = pogruzhatel_jit.start(params)
+    writer = ArchiveWriter(path, params)
+    try:
+        while state.scal[pogruzhatel_jit.S_STATUS] == pogruzhatel_jit.STATUS_RUNNING:
+            x, t, w, impulse = pogruzhatel_jit.advance(state, chunk)
+            writer.append(x, t, w, impulse)
+            control[pogruzhatel_jit.CONTROL_X] = x[-1]
+            control[pogruzhatel_jit.CONTROL_T] = t[-1]
+            pogruzhatel_jit.update_counters(state, control, writer.levels[0]['size'])
+            if control[pogruzhatel_jit.CONTROL_CANCEL]:
+                raise InterruptedError('Сохранение прогона отменено')
+    except BaseException:
+        writer.file.close()
+        os.remove(path)
+        raise
+    status = STATUS_NAMES[int(state.scal[pogruzhatel_jit.S_STATUS])]
+    writer.finish(status, pogruzhatel_jit.counters(control))
+    return status
+
+
+class Archive:
+    '''
+    Архив прогона, открытый для чтения.
+    params -- параметры `main`; status -- причина окончания расчёта; stats -- счётчики расчёта;
+    levels -- уровни траекторий (массивы записей `RECORD` через `np.memmap`, уровень 0 -- все моменты).
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path}: не архив прогона')
+            version = int(np.frombuffer(f.read(8), '<u8')[0])
+            if version > VERSION:
+                raise ValueError(f'{path}: версия архива {version} не поддерживается')
+            f.seek(-16, os.SEEK_END)
+            tail = f.read(16)
+            if tail[8:] != MAGIC:
+                raise ValueError(f'{path}: архив не дописан')
+            f.seek(int(np.frombuffer(tail[:8], '<u8')[0]))
+            header = json.loads(f.read()[:-16].decode('utf-8'))
+        self.params = header['params']
+        self.status = header['status']
+        self.stats = header['stats']
+        self.buckets = [level['bucket'] for level in header['levels']]
+        self.levels = [
+            np.memmap(path, RECORD, 'r', level['offset'], (level['size'],))
+            if level['size'] else np.empty(0, RECORD)
+            for level in header['levels']
+        ]
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.levels = []
+
+    @staticmethod
+    def columns(records) -> tuple:
+        '''
+        Возвращает x, t, w, impulse записей `records` отдельными массивами (копиями).
+        '''
+        return tuple(np.array(records[name], dtype=np.float64) for name in RECORD.names)
+
+    def overview(self, n_points: int = OVERVIEW_POINTS) -> tuple:
+        '''
+        Возвращает x, t, w, impulse всего прогона из самого подробного уровня,
+        в котором не больше `n_points` моментов (или из самого грубого уровня).
+        '''
+        for level in self.levels:
+            if len(level) <= n_points:
+                break
+        return self.columns(level)
+
+    def window(self, t_start: float, t_stop: float, n_points: int = OVERVIEW_POINTS) -> tuple:
+        '''
+        Возвращает x, t, w, impulse моментов из интервала времени [`t_start`, `t_stop`]
+        (и по одному моменту за его границами) из самого подробного уровня, в котором
+        на интервал приходится не больше `n_points` моментов. Границы интервала ищутся
+        двоичным поиском, с диска читаются только страницы найденного окна.
+        '''
+        for level in self.levels:
+            t = level['t']
+            lo = max(int(np.searchsorted(t, t_start)) - 1, 0)
+            hi = min(int(np.searchsorted(t, t_stop, 'right')) + 1, len(level))
+            if hi - lo <= n_points:
+                break
+        return self.columns(level[lo:hi])
@@ -0,0 +1,263 @@
+'''
+Пакетный расчёт сценариев погружения без окна.
+
+Сценарий -- словарь параметров `pogruzhatel_jit.main` (геометрия сваи, грунт и его слои,
+дебалансы, управление оборотами `dw` или `t_table`/`w_table`, шумы и зерно `seed`)
+и необязательное имя `name`. Сценарии читаются из файлов:
+JSON -- список сценариев или `{"base": {...}, "scenarios": [...]}` (общие параметры в `base`);
+CSV -- по сценарию в строке, столбцы -- имена параметров, массивы -- числа через `;`,
+пустая ячейка -- параметр не задан.
+Сценарии считаются в пуле потоков (ядро не держит GIL). Итоги (см. `sweep.run_point`)
+дописываются в `summary.csv` каталога результатов по мере готовности, траектории --
+по файлу на сценарий (`npz` или архив прогона `archive`). Строка итогов записывается
+после траектории, поэтому прерванный пакет продолжается с `--resume`: пропускаются
+сценарии, для которых уже есть строка итогов с тем же ключом параметров и формата
+траекторий (и файл траектории).
+
+Запуск: `python batch.py SCENARIOS [SCENARIOS ...] --out DIR [--base FILE] [--workers N]
+[--trajectories none|npz|archive] [--max-points N] [--seed N] [--resume]`.
+'''
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import archive
+import pogruzhatel_jit
+import result_cache
+import sweep
+
+SUMMARY_FILE = 'summary.csv'
+TRAJECTORY_FORMATS = ('none', 'npz', 'archive')
+# ключ параметров -- последний столбец: строка, оборванная при прерывании, не совпадёт по ключу
+COLUMNS = ('id', 'seed', *sweep.SUMMARY_FIELDS, 'wall', 'key')
+
+
+def parse_cell(name: str, text: str):
+    '''
+    Возвращает значение параметра `name` из ячейки CSV `text` (None -- пустая ячейка).
+    '''
+    text = text.strip()
+    if not text:
+        return None
+    if name == 'name':
+        return text
+    if name in pogruzhatel_jit.MAIN_ARRAYS:
+        return [float(item) for item in text.split(';') if item.strip()]
+    if name in pogruzhatel_jit.MAIN_INTS:
+        return int(text)
+    return float(text)
+
+
+def load_scenarios(path: str) -> list:
+    '''
+    Возвращает список сценариев из файла JSON или CSV `path` (общие параметры JSON-файла
+    подставляются в каждый сценарий).
+    '''
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        scenarios = []
+        for row in rows:
+            scenario = {}
+            for name, text in row.items():
+                value = parse_cell(name, text or '')
+                if value is not None:
+                    scenario[name] = value
+            scenarios.append(scenario)
+        return scenarios
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        base = data.get('base', {})
+        return [{**base, **scenario} for scenario in data['scenarios']]
+    return data
+
+
+def scenario_ids(scenarios: list) -> list:
+    '''
+    Возвращает имена сценариев для файлов траекторий и строк итогов: `name` сценария
+    (символы, недопустимые в имени файла, заменяются на `_`) или номер в пакете.
+    '''
+    ids = []
+    for index, scenario in enumerate(scenarios):
+        name = scenario.get('name')
+        ids.append(re.sub(r'[^\w.-]', '_', str(name)) if name is not None else f'{index:06d}')
+    duplicates = {name for name in ids if ids.count(name) > 1}
+    if duplicates:
+        raise ValueError(f'Повторяющиеся имена сценариев: {", ".join(sorted(duplicates))}')
+    return ids
+
+
+def prepare(scenario: dict, base: dict, index: int, seed: int) -> dict:
+    '''
+    Возвращает параметры `main` сценария: общие параметры `base`, дополненные сценарием.
+    Сценарию с шумами без своего зерна назначается зерно `seed + index`, чтобы пакет повторялся.
+    '''
+    params = {**base, **{name: value for name, value in scenario.items() if name != 'name'}}
+    noisy = any(params.get(name) for name in result_cache.NOISE_PARAMS)
+    if noisy and params.get('seed', -1) < 0:
+        params['seed'] = seed + index
+    pogruzhatel_jit.main_args(params)  # проверка имён и наличия параметров
+    return params
+
+
+def write_trajectory(path: str, fmt: str, params: dict, result: tuple, status: str, stats: dict):
+    '''
+    Записывает траектории сценария в файл `path` (через временный файл).
+    '''
+    temp = f'{path}.tmp'
+    if fmt == 'npz':
+        with open(temp, 'wb') as f:
+            np.savez(f, **dict(zip(('x', 't', 'w', 'impulse'), result)))
+    else:
+        archive.write(temp, params, *result, status, stats)
+    os.replace(temp, path)
+
+
+def run_scenario(params: dict, max_points: int, trajectory: str = None, fmt: str = 'none') -> dict:
+    '''
+    Считает сценарий и возвращает его строку итогов (без `id` и `key`).
+    Итоги считаются ядром без траектории (`sweep.run_point`) по всем моментам расчёта,
+    поэтому не зависят от формата траекторий и прореживания `max_points`.
+    trajectory -- файл траекторий для формата `fmt` (см. `TRAJECTORY_FORMATS`);
+                  без него траектория не считается.
+    '''
+    started = time.perf_counter()
+    row = sweep.run_point(params)
+    if trajectory and row['status'] != 'broken':
+        control = np.zeros(pogruzhatel_jit.CONTROL_SIZE)
+        result = pogruzhatel_jit.get_simulate()(*pogruzhatel_jit.main_args(params), max_points, control)
+        write_trajectory(trajectory, fmt, params, result, row['status'], pogruzhatel_jit.counters(control))
+    row['seed'] = params.get('seed', -1)
+    row['wall'] = time.perf_counter() - started
+    return row
+
+
+def completed(path: str, keys: dict) -> list:
+    '''
+    Возвращает строки файла итогов `path` посчитанных сценариев: строки, ключ которых
+    совпадает с ключом сценария в `keys` (по имени сценария). Строки сценариев с другими
+    параметрами и строка, оборванная при прерывании, отбрасываются.
+    '''
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row for row in csv.DictReader(f) if row.get('key') and keys.get(row['id']) == row['key']]
+
+
+def run_batch(
+    scenarios: list, out: str, base: dict = None, workers: int = None, trajectories: str = 'none',
+    max_points: int = 0, seed: int = 0, resume: bool = False, log=None
+) -> dict:
+    '''
+    Считает сценарии `scenarios` и записывает результаты в каталог `out`.
+
+    Параметры:
+    base -- общие параметры всех сценариев;
+    workers -- количество потоков, по умолчанию по количеству ядер;
+    trajectories -- формат файлов траекторий (`TRAJECTORY_FORMATS`), `none` -- только итоги;
+    max_points -- см. `pogruzhatel_jit.main` (на итоги не влияет);
+    seed -- начальное зерно сценариев с шумами без своего зерна (см. `prepare`);
+    resume -- продолжить прерванный пакет (иначе файл итогов перезаписывается): пропускаются
+              сценарии с теми же параметрами, `max_points` и `trajectories`, посчитанные раньше;
+    log -- файл для строк о ходе расчёта (None -- без них).
+    Возвращает количество сценариев: total, skipped (посчитаны раньше), done, broken.
+    '''
+    if trajectories not in TRAJECTORY_FORMATS:
+        raise ValueError(f'Неизвестный формат траекторий `{trajectories}`')
+    base = base or {}
+    ids = scenario_ids(scenarios)
+    params = [prepare(scenario, base, index, seed) for index, scenario in enumerate(scenarios)]
+    # формат траекторий входит в ключ: пакет, продолженный с другим форматом, считается заново
+    keys = [f'{result_cache.params_key(p, max_points)}-{trajectories}' for p in params]
+    os.makedirs(out, exist_ok=True)
+    summary_path = os.path.join(out, SUMMARY_FILE)
+    extension = {'npz': '.npz', 'archive': '.xarc'}.get(trajectories)
+    kept = completed(summary_path, dict(zip(ids, keys))) if resume else []
+    if extension:
+        # строки сценариев, файлы траекторий которых удалены, тоже считаются заново
+        # (у сломавшейся сваи файла траектории нет)
+        kept = [
+            row for row in kept
+            if row['status'] == 'broken' or os.path.exists(os.path.join(out, 'trajectories', row['id'] + extension))
+        ]
+    done = {row['id'] for row in kept}
+    pending = [index for index in range(len(params)) if ids[index] not in done]
+    counts = {'total': len(params), 'skipped': len(params) - len(pending), 'done': 0, 'broken': 0}
+
+    # файл итогов начинается заново со строк уже посчитанных сценариев (через временный файл,
+    # чтобы прерывание в этот момент их не потеряло)
+    with open(summary_path + '.tmp', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(kept)
+    os.replace(summary_path + '.tmp', summary_path)
+    summary = open(summary_path, 'a', newline='', encoding='utf-8')
+    writer = csv.DictWriter(summary, fieldnames=COLUMNS, extrasaction='ignore')
+    try:
+        if trajectories != 'none':
+            os.makedirs(os.path.join(out, 'trajectories'), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = {}
+            for index in pending:
+                trajectory = os.path.join(out, 'trajectories', ids[index] + extension) if extension else None
+                futures[pool.submit(run_scenario, params[index], max_points, trajectory, trajectories)] = index
+            for future in as_completed(futures):
+                index = futures[future]
+                row = {'id': ids[index], **future.result(), 'key': keys[index]}
+                writer.writerow(row)
+                summary.flush()
+                counts['done'] += 1
+                counts['broken'] += row['status'] == 'broken'
+                if log:
+                    print(
+                        f'[{counts["skipped"] + counts["done"]}/{counts["total"]}] {ids[index]}: '
+                        f'{row["status"]}, {row["wall"]:.2f} с', file=log, flush=True
+                    )
+    finally:
+        summary.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='+', help='файлы сценариев (JSON или CSV)')
+    parser.add_argument('--out', required=True, help='каталог результатов')
+    parser.add_argument('--base', help='общие параметры сценариев (JSON)')
+    parser.add_argument('--workers', type=int, help='количество потоков (по умолчанию по количеству ядер)')
+    parser.add_argument('--trajectories', choices=TRAJECTORY_FORMATS, default='none',
+                        help='формат файлов траекторий (по умолчанию только итоги)')
+    parser.add_argument('--max-points', type=int, default=0,
+                        help='сохраняемых моментов времени на сценарий (0 -- все)')
+    parser.add_argument('--seed', type=int, default=0, help='начальное зерно сценариев с шумами без зерна')
+    parser.add_argument('--resume', action='store_true', help='продолжить прерванный пакет')
+    parser.add_argument('--quiet', action='store_true', help='не выводить ход расчёта')
+    args = parser.parse_args(argv)
+
+    base = {}
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+    scenarios = [scenario for path in args.scenarios for scenario in load_scenarios(path)]
+    try:
+        counts = run_batch(
+            scenarios, args.out, base, args.workers, args.trajectories, args.max_points, args.seed,
+            args.resume, None if args.quiet else sys.stderr
+        )
+    except (KeyError, ValueError) as e:
+        parser.exit(2, f'{parser.prog}: ошибка в сценариях: {e}\n')
+    print(
+        f'Сценариев: {counts["total"]}, посчитано: {counts["done"]}, '
+        f'пропущено: {counts["skipped"]}, свая сломалась: {counts["broken"]}'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+'''
+Замеры производительности расчётного ядра `pogruzhatel_jit`.
+Запуск из корня репозитория: `python -m benchmarks.<модуль>`.
+'''
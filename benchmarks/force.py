@@ -0,0 +1,84 @@
+'''
+Микро-бенчмарк вычисления силы импульса дебалансов.
+
+Сравнивает прежнюю схему (временный список из `get_fimp_el`, `np.array`, `np.sum`
+и `cos` от растущей фазы на каждом шаге) с `fimp_step` (поворот фазоров без
+выделения памяти) для 6 и 32 пар дебалансов.
+
+Запуск: `python -m benchmarks.force [--steps N]`.
+'''
+import argparse
+import math
+import time
+
+import numpy as np
+from numba import jit
+
+import pogruzhatel_jit
+
+
+@jit(nopython=True, cache=True)
+def list_force_loop(m_debs, R_debs, w0, dt, steps):
+    '''
+    Прежняя схема: `steps` шагов с пересчётом каждой пары через `get_fimp_el`.
+    '''
+    n = len(m_debs)
+    theta = [0.0] * n
+    theta_noise_coef = np.zeros(n)
+    acc = 0.0
+    for _ in range(steps):
+        rpm_noise = np.random.normal(1, 0.0, n)
+        for k in range(n):
+            theta[k] += w0 * (k + 1) * rpm_noise[k] * dt * 2 * math.pi
+        acc += np.sum(np.array([pogruzhatel_jit.get_fimp_el(m_debs[k], R_debs[k], w0, k, theta[k], theta_noise_coef[k]) for k in range(n)]))
+    return acc
+
+
+@jit(nopython=True, cache=True)
+def phasor_force_loop(m_debs, R_debs, w0, dt, steps):
+    '''
+    Новая схема: постоянные множители и поворот фазоров через `fimp_step`.
+    '''
+    n = len(m_debs)
+    amp = pogruzhatel_jit.debalance_amplitudes(m_debs, R_debs)
+    ph_re = np.ones(n)
+    ph_im = np.zeros(n)
+    rot_re = np.empty(n)
+    rot_im = np.empty(n)
+    pogruzhatel_jit.phase_rotation(w0, dt, rot_re, rot_im)
+    acc = 0.0
+    for _ in range(steps):
+        acc += pogruzhatel_jit.fimp_step(amp, w0, ph_re, ph_im, rot_re, rot_im)
+    return acc
+
+
+def steps_per_second(func, m_debs, R_debs, steps, repeat=3):
+    '''
+    Возвращает лучшую из `repeat` попыток скорость (шагов в секунду) функции `func`.
+    '''
+    func(m_debs, R_debs, 10.0, 0.001, 10)  # компиляция
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(m_debs, R_debs, 10.0, 0.001, steps)
+        best = min(best, time.perf_counter() - start)
+    return steps / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', type=int, default=300_000, help='количество шагов на замер')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"пар":>4} {"до, шаг/с":>14} {"после, шаг/с":>14} {"ускорение":>10}')
+    for n in (6, 32):
+        m_debs = rng.uniform(0.05, 3.0, n)
+        R_debs = rng.uniform(0.003, 0.02, n)
+        before = steps_per_second(list_force_loop, m_debs, R_debs, args.steps)
+        after = steps_per_second(phasor_force_loop, m_debs, R_debs, args.steps)
+        print(f'{n:>4} {before:>14,.0f} {after:>14,.0f} {after / before:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''
+Проверка подбора параметров (`calibration.calibrate`) по синтетической записи погружения.
+
+Запись строится расчётом `pogruzhatel_jit.main` без шумов с известными параметрами
+(`BASE_PARAMS`): глубина и обороты с частотой `--rate` отсчётов в секунду. Подбор
+начинается с параметров, отличающихся от известных в несколько раз, и должен найти
+их с относительной погрешностью не больше `--tolerance`; иначе команда завершается
+с кодом 1. Запись чаще 1 Гц проверяет приведение оборотов записи к таблице управления
+(`drive_log.DriveLog.control_table`).
+
+Запуск из корня репозитория: `python -m benchmarks.recovery [--rate 10] [--tolerance 0.05]`.
+'''
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import startup
+from benchmarks.suite import BASE_PARAMS
+
+# подбираемые параметры: известное значение и начальная точка подбора
+TRUTH = {'gamma_cr': 1.1, 'fi': 17000.0}
+START = {'gamma_cr': 0.5, 'fi': 30000.0}
+
+
+def synthetic_log(params: dict, rate: float) -> tuple:
+    '''
+    Возвращает t, x, w расчёта `main` с параметрами `params`, прореженные до `rate` отсчётов в секунду.
+    '''
+    import pogruzhatel_jit
+
+    x, t, w, _ = pogruzhatel_jit.main(*pogruzhatel_jit.main_args(params), 0)
+    every = max(int(round(1 / (rate * params['dt']))), 1)
+    return t[::every], x[::every], w[::every]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=float, default=10.0, help='отсчётов записи в секунду')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='допустимая относительная погрешность')
+    args = parser.parse_args()
+
+    sys.path.insert(0, startup.ROOT)
+    import calibration
+
+    params = {**BASE_PARAMS, **TRUTH, 'seed': -1}
+    t, x, w = synthetic_log(params, args.rate)
+    started = time.perf_counter()
+    result = calibration.calibrate({**params, **START}, t, x, w, tuple(TRUTH))
+    elapsed = time.perf_counter() - started
+
+    failed = 0
+    print(f'{"параметр":<12} {"известно":>12} {"подобрано":>12} {"погрешность":>12}')
+    for name, value in TRUTH.items():
+        error = abs(result['values'][name] / value - 1)
+        failed += error > args.tolerance
+        print(f'{name:<12} {value:>12.6g} {result["values"][name]:>12.6g} {error:>11.2%}'
+              f'{"  ОШИБКА" if error > args.tolerance else ""}')
+    print(f'Отсчётов: {len(t)}, невязка (СКО): {result["rmse"]:.3g} м, поколений: {result["generations"]}, '
+          f'{elapsed:.1f} с')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+Время от запуска процесса до первого результата расчёта.
+
+Каждый вариант запускается в отдельном процессе:
+aot -- модуль `pogruzhatel_aot` (собирается `python build_aot.py`);
+jit (кэш) -- JIT-компиляция с готовым кэшем numba;
+jit (без кэша) -- JIT-компиляция с пустым кэшем, как в сборке с недоступным кэшем.
+
+Запуск: `python -m benchmarks.startup [--repeat N]`.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# код дочернего процесса: импорт ядра и первый расчёт
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import numpy as np
+import pogruzhatel_jit
+imported = time.perf_counter()
+args = pogruzhatel_jit.main_args({
+    'g': 9.81, 'dt': 0.001, 'l_pile': 1.15, 'P': 0.08, 'S': 0.000076, 'M': 38.38,
+    'gamma_cr': 1.1, 'gamma_cf': 1.0, 'fi': 17000.0,
+    'm_debs': [2.75758026171761, 0.969494952543874, 0.486348994233291],
+    'R_debs': [0.020070401444444, 0.011900487555556, 0.008428804666667],
+    't_table': [0.0, 5.0, 10.0], 'w_table': [0.0, 10.0, 15.0],
+})
+pogruzhatel_jit.get_simulate()(*args, 0, np.zeros(pogruzhatel_jit.CONTROL_SIZE))
+done = time.perf_counter()
+print(json.dumps({
+    'aot': pogruzhatel_jit.pogruzhatel_aot is not None,
+    'import': imported - started,
+    'first_result': done - imported,
+}))
+'''
+
+
+def run_child(env: dict) -> dict:
+    '''
+    Запускает дочерний процесс и возвращает его замеры и общее время от запуска до результата.
+    '''
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=ROOT, env={**os.environ, **env},
+        check=True, capture_output=True, text=True,
+    ).stdout
+    total = time.perf_counter() - started
+    return {**json.loads(output.strip().splitlines()[-1]), 'total': total}
+
+
+def variants() -> dict:
+    '''
+    Возвращает варианты запуска: название -> переменные окружения дочернего процесса.
+    '''
+    import pogruzhatel_jit
+
+    result = {}
+    if pogruzhatel_jit.pogruzhatel_aot is not None:  # собран из текущих исходных текстов ядра
+        result['aot'] = {}
+    result['jit (кэш)'] = {'XOLM_NO_AOT': '1'}
+    result['jit (без кэша)'] = {'XOLM_NO_AOT': '1', 'NUMBA_CACHE_DIR': ''}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='количество запусков каждого варианта')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    run_child({'XOLM_NO_AOT': '1'})  # наполняем кэш numba
+    print(f'{"вариант":<16} {"импорт, с":>10} {"расчёт, с":>10} {"всего, с":>10}')
+    for name, env in variants().items():
+        runs = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                if 'NUMBA_CACHE_DIR' in env:
+                    env = {**env, 'NUMBA_CACHE_DIR': cache_dir}
+                runs.append(run_child(env))
+        best = min(runs, key=lambda run: run['total'])
+        print(f'{name:<16} {best["import"]:>10.2f} {best["first_result"]:>10.2f} {best["total"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+'''
+Набор замеров производительности ядра расчёта и воспроизведения графиков.
+
+Группы замеров:
+kernel -- `pogruzhatel_jit.main` при разных шаге `dt`, количестве пар дебалансов,
+          с шумами оборотов и без, с управлением шагом `dw` и по таблице;
+compile -- первый расчёт в новом процессе с пустым кэшем numba (JIT-компиляция);
+playback -- время кадра `xolm.draw_tick` при разной длине траектории
+            (окно без экрана, `QT_QPA_PLATFORM=offscreen`);
+telemetry -- задержка публикации расчёта по поступающим оборотам (`telemetry.run_live`)
+             при отсчётах 1 кГц от локального источника через сокет TCP.
+
+Запуск из корня репозитория:
+`python -m benchmarks.suite run [--out FILE] [--only kernel,compile,playback,telemetry] [--quick]` --
+замер и запись результатов в JSON;
+`python -m benchmarks.suite compare BASELINE CURRENT [--threshold 0.1] [--min-delta 0.005]` --
+сравнение результатов с сохранёнными: замеры, ставшие медленнее больше чем на `threshold`
+(и больше чем на `min-delta` секунд), отмечаются как регрессии, и команда завершается с кодом 1.
+'''
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import startup
+
+ROOT = startup.ROOT
+GROUPS = ('kernel', 'compile', 'playback', 'telemetry')
+
+# параметры расчёта по умолчанию (как в `pogruzhatel_jit.__main__`)
+L_PILE = 1.15
+BASE_PARAMS = {
+    'g': 9.81,
+    'dt': 0.001,
+    'l_pile': L_PILE,
+    'P': 0.02 * 4,
+    'S': 0.02 * 0.02 - 0.018 * 0.018,
+    'M': 37 + L_PILE * 1.2,
+    'gamma_cr': 1.1,
+    'gamma_cf': 1.0,
+    'fi': 17000.0,
+    'm_debs': [
+        2.75758026171761, 0.969494952543874, 0.486348994233291,
+        0.273755006621712, 0.155229853500278, 0.076567059516108,
+    ],
+    'R_debs': [
+        0.020070401444444, 0.011900487555556, 0.008428804666667,
+        0.006323725555556, 0.004761892666667, 0.003344359555556,
+    ],
+    't_table': [
+        0.0, 6.0, 12.0, 18.0, 23.0, 27.0, 34.0, 40.0, 44.0, 55.0, 61.0, 64.0, 72.0, 77.0, 82.0, 86.0, 90.0,
+        99.0, 105.0, 113.0, 120.0, 125.0, 135.0, 150.0, 158.0, 185.0, 203.0, 230.0, 263.0, 276.0, 285.0,
+        291.0, 310.0, 320.0,
+    ],
+    'w_table': [
+        0.0, 5.0, 5.16, 5.33, 5.5, 5.6, 5.8, 6.0, 6.16, 6.33, 6.5, 6.66, 6.83, 7.0, 7.16, 7.33, 7.5, 9.0,
+        9.16, 9.83, 10.5, 11.16, 11.83, 13.83, 14.0, 14.4, 14.9, 15.4, 16.7, 17.5, 18.0, 18.5, 19.0, 19.0,
+    ],
+    'seed': 1,
+}
+# сохраняемых моментов времени, как в окне приложения (`xolm.trace_points`):
+# память не зависит от `dt`, поэтому замеры при `dt` = 1e-5 помещаются в память
+MAX_POINTS = 2 * 2700
+
+
+def debalances(n: int) -> dict:
+    '''
+    Возвращает массы и радиусы `n` пар дебалансов: первые шесть -- как в `BASE_PARAMS`,
+    остальные -- случайные (с постоянным зерном) в тех же пределах.
+    '''
+    rng = np.random.default_rng(0)
+    m_debs = list(BASE_PARAMS['m_debs']) + list(rng.uniform(0.05, 3.0, max(n - 6, 0)))
+    R_debs = list(BASE_PARAMS['R_debs']) + list(rng.uniform(0.003, 0.02, max(n - 6, 0)))
+    return {'m_debs': m_debs[:n], 'R_debs': R_debs[:n]}
+
+
+def kernel_cases(quick: bool) -> dict:
+    '''
+    Возвращает замеры ядра: название -> изменения `BASE_PARAMS`.
+    Каждый замер отличается от основного (`dt` = 1e-3, 6 пар, без шумов, по таблице) одним параметром;
+    при большом количестве пар свая погружается быстро, поэтому эти замеры -- с `dt` = 1e-4.
+    '''
+    cases = {}
+    for dt in (1e-3, 1e-4) if quick else (1e-3, 1e-4, 1e-5):
+        cases[f'kernel/dt={dt:g}'] = {'dt': dt}
+    for n in (3, 6, 12, 24):
+        cases[f'kernel/pairs={n}'] = {'dt': 1e-4, **debalances(n)}
+    cases['kernel/rpm_noise'] = {'rpm_noise_scale': 0.01}
+    cases['kernel/noise_all'] = {
+        'rpm_noise_scale': 0.01, 'm_debs_noise_scale': 0.01, 'R_debs_noise_scale': 0.01, 'theta_noise': 0.1,
+    }
+    cases['kernel/dw'] = {'dw': 0.1}
+    return cases
+
+
+def best_time(func, repeat: int) -> float:
+    '''
+    Возвращает лучшее из `repeat` время вызова `func` (с).
+    '''
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_kernel(repeat: int, quick: bool) -> dict:
+    '''
+    Замеры `pogruzhatel_jit.main` (JIT-версия ядра, компиляция -- до замеров).
+    '''
+    import pogruzhatel_jit
+
+    results = {}
+    for name, changes in kernel_cases(quick).items():
+        params = {**BASE_PARAMS, **changes}
+        args = pogruzhatel_jit.main_args(params) + (MAX_POINTS,)
+        x, t, w, impulse = pogruzhatel_jit.main(*args)
+        seconds = best_time(lambda: pogruzhatel_jit.main(*args), repeat)
+        steps = int(round(t[-1] / params['dt'])) + 1
+        results[name] = {'seconds': seconds, 'steps': steps, 'steps_per_second': steps / seconds}
+        print(f'{name:<28} {seconds:>9.3f} с {steps / seconds:>14,.0f} шаг/с')
+
+    # расчёт без траектории, только итоги (`pogruzhatel_jit.summary`) -- для сравнения с `kernel/dt=0.0001`
+    name = 'kernel/summary'
+    params = {**BASE_PARAMS, 'dt': 1e-4}
+    steps = pogruzhatel_jit.summary(params)['steps']
+    seconds = best_time(lambda: pogruzhatel_jit.summary(params), repeat)
+    results[name] = {'seconds': seconds, 'steps': steps, 'steps_per_second': steps / seconds}
+    print(f'{name:<28} {seconds:>9.3f} с {steps / seconds:>14,.0f} шаг/с')
+    return results
+
+
+def bench_compile(repeat: int) -> dict:
+    '''
+    Замер первого расчёта в новом процессе с пустым кэшем numba (см. `benchmarks.startup`).
+    '''
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            runs.append(startup.run_child({'XOLM_NO_AOT': '1', 'NUMBA_CACHE_DIR': cache_dir}))
+    best = min(runs, key=lambda run: run['total'])
+    print(f'{"compile/first_result":<28} {best["total"]:>9.3f} с (импорт {best["import"]:.2f} с)')
+    return {'compile/first_result': {'seconds': best['total'], 'import_seconds': best['import']}}
+
+
+def bench_playback(repeat: int, quick: bool) -> dict:
+    '''
+    Замеры времени кадра `xolm.draw_tick` для траекторий разной длины: перед каждым
+    повтором границы графиков восстанавливаются, а траектория загружается в окно заново
+    (`start_playback`), поэтому в каждый повтор входят одни и те же полные перерисовки холста
+    при расширении границ. Кадр -- вызов `draw_tick` и обработка событий Qt.
+    '''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtWidgets
+
+    import pogruzhatel_jit
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    sys.path.insert(0, ROOT)
+    import main as gui
+
+    window = gui.xolm()
+    window.show()
+    while window.sc is None:
+        app.processEvents()
+    limits = [(axes.get_xlim(), axes.get_ylim()) for axes in window.sc.axarr]
+
+    frames = 50 if quick else 200
+    results = {}
+    for points in (MAX_POINTS, 100_000) if quick else (MAX_POINTS, 100_000, 1_000_000):
+        params = {**BASE_PARAMS, 'dt': 1e-4}
+        result = pogruzhatel_jit.main(*pogruzhatel_jit.main_args(params) + (points,))
+        best = None
+        for _ in range(repeat):
+            for axes, (xlim, ylim) in zip(window.sc.axarr, limits):
+                axes.set_xlim(*xlim)
+                axes.set_ylim(*ylim)
+            window.start_playback(*result)
+            window.timer.stop()
+            app.processEvents()
+            frame_seconds = []
+            for _ in range(frames):
+                started = time.perf_counter()
+                window.draw_tick()
+                app.processEvents()
+                frame_seconds.append(time.perf_counter() - started)
+            if best is None or sum(frame_seconds) < sum(best):
+                best = frame_seconds
+        seconds = sum(best)
+        name = f'playback/points={points}'
+        results[name] = {
+            'seconds': seconds,
+            'frames': frames,
+            'points': len(result[0]),
+            'frame_ms': seconds / frames * 1000,
+            'max_frame_ms': max(best) * 1000,
+        }
+        print(f'{name:<28} {seconds:>9.3f} с {seconds / frames * 1000:>11.2f} мс/кадр'
+              f' (наибольший {max(best) * 1000:.1f} мс)')
+    window.close()
+    return results
+
+
+def bench_telemetry(quick: bool) -> dict:
+    '''
+    Замер задержки `telemetry.run_live`: источник (`telemetry.replay`) в отдельном потоке
+    отправляет обороты `BASE_PARAMS` отсчётами с частотой 1 кГц в реальном времени,
+    задержка отсчёта -- от его отправки до публикации записи, в которую он вошёл.
+    Время замера -- 99-й процентиль задержки.
+    '''
+    import threading
+
+    import telemetry
+
+    rate = 1000.0
+    duration = 5.0 if quick else 30.0
+    t = np.arange(int(duration * rate)) / rate
+    t_table = np.array(BASE_PARAMS['t_table'])
+    w = np.array(BASE_PARAMS['w_table'])[np.searchsorted(t_table, t, 'right') - 1]
+    sent = np.full(len(t), np.nan)
+    published_t = []
+    published_at = []
+
+    def publish(record):
+        published_at.append(time.perf_counter())
+        published_t.append(record['t'])
+
+    params = {**BASE_PARAMS, 'dt': 1 / rate}
+    telemetry.LiveModel(params).feed(0.0, 0.0)  # компиляция до замера
+    with telemetry.socket.create_server(('127.0.0.1', 0)) as server:
+        source = threading.Thread(
+            target=telemetry.replay, args=(np.column_stack((t, w)), server.getsockname(), rate, sent)
+        )
+        source.start()
+        connection, _ = server.accept()
+    with connection:
+        connection.setsockopt(telemetry.socket.IPPROTO_TCP, telemetry.socket.TCP_NODELAY, 1)
+        telemetry.run_live(params, telemetry.line_batches(lambda: connection.recv(telemetry.BUFFER)), publish)
+    source.join()
+
+    # запись с временем расчёта t содержит все отсчёты не позже t
+    index = np.searchsorted(np.array(published_t) + 0.5 / rate, t)
+    received = index < len(published_at)
+    latency = np.array(published_at)[index[received]] - sent[received]
+    name = 'telemetry/rate=1kHz'
+    result = {
+        'seconds': float(np.percentile(latency, 99)),
+        'samples': int(received.sum()),
+        'records': len(published_at),
+        'p50_ms': float(np.percentile(latency, 50) * 1000),
+        'p99_ms': float(np.percentile(latency, 99) * 1000),
+        'max_ms': float(latency.max() * 1000),
+    }
+    print(f'{name:<28} {result["p50_ms"]:>9.3f} мс (p50), {result["p99_ms"]:.3f} мс (p99), '
+          f'{result["max_ms"]:.3f} мс (наибольшая), записей {result["records"]} на {result["samples"]} отсчётов')
+    return {name: result}
+
+
+def environment() -> dict:
+    '''
+    Возвращает описание окружения замеров (версии, процессор, коммит).
+    '''
+    import numba
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': numba.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(args) -> None:
+    os.environ['XOLM_NO_AOT'] = '1'
+    groups = args.only.split(',') if args.only else GROUPS
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f'Неизвестные группы замеров: {", ".join(sorted(unknown))}')
+
+    sys.path.insert(0, ROOT)
+    results = {}
+    if 'kernel' in groups:
+        results.update(bench_kernel(args.repeat, args.quick))
+    if 'compile' in groups:
+        results.update(bench_compile(1 if args.quick else args.repeat))
+    if 'playback' in groups:
+        results.update(bench_playback(args.repeat, args.quick))
+    if 'telemetry' in groups:
+        results.update(bench_telemetry(args.quick))
+
+    with open(args.out, 'w', encoding='utf-8') as file:
+        json.dump({'environment': environment(), 'results': results}, file, ensure_ascii=False, indent=2)
+    print(f'Результаты записаны в {args.out}')
+
+
+def compare(args) -> int:
+    '''
+    Сравнивает время замеров `args.current` с `args.baseline` и возвращает код завершения:
+    1, если хотя бы один замер стал медленнее больше чем на `args.threshold`
+    и больше чем на `args.min_delta` секунд (разброс коротких замеров не считается регрессией).
+    '''
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)['results']
+    with open(args.current, encoding='utf-8') as file:
+        current = json.load(file)['results']
+
+    regressions = 0
+    print(f'{"замер":<28} {"было, с":>10} {"стало, с":>10} {"отношение":>10}')
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name]['seconds']
+        after = current[name]['seconds']
+        ratio = after / before
+        if ratio > 1 + args.threshold and after - before > args.min_delta:
+            mark = 'РЕГРЕССИЯ'
+            regressions += 1
+        elif ratio < 1 - args.threshold and before - after > args.min_delta:
+            mark = 'быстрее'
+        else:
+            mark = ''
+        print(f'{name:<28} {before:>10.3f} {after:>10.3f} {ratio:>10.2f} {mark}')
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f'{name:<28} есть только в {"базовых" if name in baseline else "новых"} результатах')
+    print(f'Регрессий: {regressions} (порог {args.threshold:.0%})')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='замерить и записать результаты в JSON')
+    run_parser.add_argument('--out', default='benchmark.json', help='файл результатов')
+    run_parser.add_argument('--only', help=f'группы замеров через запятую ({",".join(GROUPS)})')
+    run_parser.add_argument('--repeat', type=int, default=3, help='количество повторов каждого замера')
+    run_parser.add_argument('--quick', action='store_true', help='без самых долгих замеров')
+
+    compare_parser = commands.add_parser('compare', help='сравнить результаты с базовыми')
+    compare_parser.add_argument('baseline', help='базовые результаты (JSON)')
+    compare_parser.add_argument('current', help='новые результаты (JSON)')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='допустимое относительное замедление (по умолчанию 0.1)')
+    compare_parser.add_argument('--min-delta', type=float, default=0.005,
+                                help='допустимое замедление в секундах (по умолчанию 0.005)')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
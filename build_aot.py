@@ -0,0 +1,50 @@
+'''
+Сборка модуля `pogruzhatel_aot` с заранее скомпилированными функциями `pogruzhatel_jit.simulate`
+и `pogruzhatel_jit.simulate_summary`.
+
+Собранный модуль не требует компиляции при запуске и не зависит от кэша numba,
+поэтому подходит для сборок auto-py-to-exe. В модуль встраивается хэш исходных текстов
+ядра (`kernel_digest`); если модуль не собран, не импортируется или собран из других
+исходников, `pogruzhatel_jit.get_simulate` и `get_summary` возвращают JIT-версии.
+
+Запуск из корня репозитория: `python build_aot.py`.
+'''
+import os
+import tempfile
+import warnings
+
+# функции из кэша numba (`cache=True`) ссылаются на окружение JIT-расчёта, и исключения
+# в собранном из них модуле (поломка сваи) приводят к аварийному завершению процесса,
+# поэтому сборка идёт с пустым временным кэшем
+os.environ['NUMBA_CACHE_DIR'] = tempfile.mkdtemp(prefix='xolm-aot-')
+from numba.pycc import CC  # noqa: E402
+
+os.environ['XOLM_NO_AOT'] = '1'  # собираем из исходников, а не из уже собранного модуля
+import pogruzhatel_jit  # noqa: E402
+
+
+def build(output_dir: str = None) -> str:
+    '''
+    Собирает модуль `pogruzhatel_aot` в `output_dir` (по умолчанию -- рядом с `pogruzhatel_jit.py`)
+    и возвращает путь к нему.
+    '''
+    cc = CC('pogruzhatel_aot')
+    cc.output_dir = output_dir or os.path.dirname(os.path.abspath(pogruzhatel_jit.__file__))
+    cc.verbose = True
+    cc.export('simulate', pogruzhatel_jit.SIMULATE_SIGNATURE)(pogruzhatel_jit.simulate.py_func)
+    cc.export('simulate_summary', pogruzhatel_jit.SUMMARY_SIGNATURE)(pogruzhatel_jit.simulate_summary.py_func)
+    # хэш исходных текстов ядра: по нему `pogruzhatel_jit` не использует модуль, собранный из других исходников
+    word = pogruzhatel_jit.digest_word(pogruzhatel_jit.kernel_digest())
+
+    def kernel_digest():
+        return word
+
+    cc.export('kernel_digest', 'int64()')(kernel_digest)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # numba.pycc помечен устаревшим, но другой AOT-сборки в numba нет
+        cc.compile()
+    return os.path.join(cc.output_dir, cc.output_file)
+
+
+if __name__ == '__main__':
+    print(build())
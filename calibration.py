@@ -0,0 +1,287 @@
+'''
+Подбор параметров модели по измеренной записи погружения.
+
+Запись -- моменты времени `t`, измеренная глубина `x` и обороты `w` (обороты, усреднённые
+за каждую секунду, задают табличное управление расчёта). Подбираются параметры грунта (`gamma_cr`, `fi`, `gamma_cf`)
+и поправочные коэффициенты дебалансов: `m_debs_factor` и `R_debs_factor` -- общие для всех пар
+множители `m_debs_custom_noise` и `R_debs_custom_noise`. Сила дебалансов пропорциональна
+произведению массы и радиуса, поэтому эти два множителя по отдельности не различимы --
+подбирается один из них (по умолчанию масса), а их произведение видно в корреляции.
+
+Минимизируется сумма квадратов невязок глубины в моменты записи. Поиск -- эволюционная
+стратегия (1+λ) в логарифмах параметров: на каждом поколении λ кандидатов вокруг лучшей
+точки считаются параллельно в пуле потоков (ядро не держит GIL), шаг увеличивается
+после удачного поколения и уменьшается после неудачного. Кандидат считается порциями
+до очередного момента записи (`pogruzhatel_jit.advance`) и прекращается, как только
+накопленная сумма квадратов невязок превысит лучшую найденную. Погрешность подобранных
+параметров оценивается по матрице Якоби невязок в найденной точке (линеаризация
+около минимума: ковариация s² (JᵀJ)⁻¹, s² -- остаточная дисперсия).
+'''
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import drive_log
+import pogruzhatel_jit
+import result_cache
+
+# подбираемые параметры: множители дебалансов преобразуются в `*_custom_noise` (см. `apply`)
+FIT_PARAMS = ('gamma_cr', 'gamma_cf', 'fi', 'm_debs_factor', 'R_debs_factor')
+DEFAULT_FIT = ('gamma_cr', 'fi', 'm_debs_factor')
+# начальные значения множителей дебалансов и границы поиска относительно начальной точки
+FACTOR_DEFAULT = 1.0
+BOUND_RATIO = 10.0
+
+
+def apply(params: dict, values: dict) -> dict:
+    '''
+    Возвращает параметры `main`: `params` с подставленными значениями подбираемых параметров `values`.
+    '''
+    params = dict(params)
+    n = max(len(params['m_debs']), len(params['R_debs']))
+    for name, value in values.items():
+        if name == 'm_debs_factor':
+            params['m_debs_custom_noise'] = np.full(n, value)
+        elif name == 'R_debs_factor':
+            params['R_debs_custom_noise'] = np.full(n, value)
+        else:
+            params[name] = value
+    return params
+
+
+def initial_value(params: dict, name: str) -> float:
+    '''
+    Возвращает начальное значение подбираемого параметра `name` из `params`.
+    '''
+    if name in ('m_debs_factor', 'R_debs_factor'):
+        custom = np.asarray(params.get(name.replace('factor', 'custom_noise'), (0.0,)), dtype=np.float64)
+        return float(custom.mean()) if custom.any() else FACTOR_DEFAULT
+    return float(params.get(name, pogruzhatel_jit.MAIN_DEFAULTS.get(name, 0.0)))
+
+
+class Objective:
+    '''
+    Сумма квадратов невязок глубины расчёта `main` с параметрами `params` и записи
+    (`t_log`, `x_log`) с прекращением кандидатов хуже лучшего (см. `evaluate`).
+    Считает количество расчётов `evaluations` и прекращённых расчётов `stopped`.
+    '''
+
+    def __init__(self, params: dict, names: tuple, t_log: np.ndarray, x_log: np.ndarray):
+        self.params = params
+        self.names = names
+        self.t_log = t_log
+        self.x_log = x_log
+        self.steps = np.rint(t_log / params['dt']).astype(np.int64) + 1  # шагов до момента записи
+        self.best = math.inf
+        self.lock = threading.Lock()
+        self.evaluations = 0
+        self.stopped = 0
+
+    def residuals(self, values: np.ndarray, stop: bool = False):
+        '''
+        Возвращает сумму квадратов невязок и невязки в моменты записи для параметров `values`
+        (в порядке `names`). При `stop` расчёт прекращается, когда сумма превышает лучшую
+        найденную `best` (она читается в каждый момент записи, поэтому улучшения в других
+        потоках сразу ужесточают порог): тогда невязки -- None. Поломка сваи -- бесконечная сумма.
+        '''
+        params = apply(self.params, dict(zip(self.names, values)))
+        residuals = np.empty(len(self.t_log))
+        sse = 0.0
+        x_last = 0.0
+        with self.lock:
+            self.evaluations += 1
+        try:
+            state = pogruzhatel_jit.start(params)
+            scal = state.scal
+            for k in range(len(self.t_log)):
+                n = self.steps[k] - int(scal[pogruzhatel_jit.S_I])
+                if n > 0 and scal[pogruzhatel_jit.S_STATUS] == pogruzhatel_jit.STATUS_RUNNING:
+                    x = pogruzhatel_jit.advance(state, n)[0]
+                    if len(x):
+                        x_last = x[-1]
+                # после окончания расчёта (свая погружена или кончилась таблица) глубина не меняется
+                residuals[k] = x_last - self.x_log[k]
+                sse += residuals[k] ** 2
+                if stop and sse > self.best:
+                    with self.lock:
+                        self.stopped += 1
+                    return sse, None
+        except ZeroDivisionError:
+            return math.inf, None
+        return sse, residuals
+
+    def evaluate(self, values: np.ndarray) -> float:
+        '''
+        Возвращает сумму квадратов невязок кандидата `values` или, если кандидат прекращён
+        как заведомо худший, чем лучший найденный, -- оценку суммы снизу.
+        '''
+        sse, residuals = self.residuals(values, stop=True)
+        if residuals is not None:
+            with self.lock:
+                self.best = min(self.best, sse)
+        return sse
+
+
+def calibrate(
+    params: dict, t_log, x_log, w_log=None, fit: tuple = DEFAULT_FIT, bounds: dict = None,
+    population: int = 12, seed: int = 0, sigma: float = 0.3, sigma_min: float = 1e-3,
+    max_generations: int = 200, workers: int = None
+) -> dict:
+    '''
+    Подбирает параметры `fit` (см. `FIT_PARAMS`) по записи погружения.
+
+    Параметры:
+    params -- параметры `main` (см. `pogruzhatel_jit.main_args`); значения подбираемых
+              параметров в них -- начальная точка; расчёт только с постоянным шагом и без шумов;
+    t_log, x_log -- моменты времени записи (с, по возрастанию) и измеренная глубина (м);
+    w_log -- обороты в моменты записи (об./с): задают табличное управление `t_table`/`w_table`
+             (средние обороты за каждую секунду, см. `drive_log.DriveLog.control_table`),
+             None -- управление из `params`;
+    bounds -- границы параметров `{name: (lo, hi)}`, по умолчанию в `BOUND_RATIO` раз
+              меньше и больше начального значения;
+    population -- кандидатов в поколении; seed -- зерно выбора кандидатов;
+    sigma, sigma_min -- начальный и наименьший шаг поиска (по натуральному логарифму параметров);
+    max_generations -- наибольшее количество поколений;
+    workers -- количество потоков, по умолчанию по количеству ядер.
+
+    Возвращает словарь:
+    values, std -- подобранные значения и их стандартные отклонения по именам параметров;
+    correlation -- матрица корреляций параметров (в порядке `names`);
+    params -- параметры `main` с подобранными значениями (см. `apply`);
+    rmse, residuals -- среднеквадратичная невязка (м) и невязки в моменты записи;
+    evaluations, stopped -- количество расчётов и прекращённых как заведомо худшие;
+    generations, elapsed -- количество поколений и время подбора (с).
+    '''
+    started = time.perf_counter()
+    unknown = set(fit) - set(FIT_PARAMS)
+    if unknown:
+        raise KeyError(f'Неподбираемые параметры: {", ".join(sorted(unknown))}')
+    if params.get('tol'):
+        raise ValueError('Подбор -- только с постоянным шагом (tol = 0)')
+    if any(params.get(name) for name in result_cache.NOISE_PARAMS):
+        raise ValueError('Подбор -- только без шумов')
+    t_log = np.asarray(t_log, dtype=np.float64)
+    x_log = np.asarray(x_log, dtype=np.float64)
+    params = dict(params)
+    if w_log is not None:
+        # ядро применяет не больше одной строки таблицы на проверку оборотов (раз в секунду),
+        # поэтому обороты записи приводятся к таблице с шагом 1 с
+        log = drive_log.DriveLog(t_log, x_log, np.asarray(w_log, dtype=np.float64))
+        params['t_table'], params['w_table'] = log.control_table()
+        params['dw'] = 0.0
+
+    names = tuple(fit)
+    x0 = np.log([initial_value(params, name) for name in names])
+    lo = np.empty(len(names))
+    hi = np.empty(len(names))
+    for k, name in enumerate(names):
+        if bounds and name in bounds:
+            lo[k], hi[k] = np.log(bounds[name])
+        else:
+            lo[k], hi[k] = x0[k] - math.log(BOUND_RATIO), x0[k] + math.log(BOUND_RATIO)
+
+    objective = Objective(params, names, t_log, x_log)
+    rng = np.random.default_rng(seed)
+    best_z = np.clip(x0, lo, hi)
+    best_sse = objective.residuals(np.exp(best_z))[0]
+    objective.best = best_sse
+    generations = 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while generations < max_generations and sigma >= sigma_min:
+            generations += 1
+            # зеркальные пары кандидатов: смещение шага поиска в среднем нулевое
+            steps = rng.standard_normal(((population + 1) // 2, len(names)))
+            candidates = np.clip(best_z + sigma * np.concatenate([steps, -steps]), lo, hi)
+            sse = list(pool.map(objective.evaluate, np.exp(candidates)))
+            k = int(np.argmin(sse))
+            if sse[k] < best_sse:
+                best_z = candidates[k]
+                best_sse = sse[k]
+                sigma *= 1.5
+            else:
+                sigma *= 0.6
+
+        # матрица Якоби невязок по логарифмам параметров (центральные разности)
+        h = 1e-2
+        shifted = [best_z + h * sign * np.eye(len(names))[k] for k in range(len(names)) for sign in (1, -1)]
+        columns = list(pool.map(lambda z: objective.residuals(np.exp(z))[1], shifted))
+    best_sse, residuals = objective.residuals(np.exp(best_z))
+
+    values = np.exp(best_z)
+    std = np.full(len(names), np.nan)
+    correlation = np.full((len(names), len(names)), np.nan)
+    if all(column is not None for column in columns):
+        jacobian = np.column_stack([
+            (columns[2 * k] - columns[2 * k + 1]) / (2 * h) for k in range(len(names))
+        ])
+        dof = max(len(t_log) - len(names), 1)
+        covariance = best_sse / dof * np.linalg.pinv(jacobian.T @ jacobian)
+        sd_log = np.sqrt(np.maximum(np.diag(covariance), 0))
+        std = values * sd_log
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = covariance / np.outer(sd_log, sd_log)
+
+    return {
+        'names': names,
+        'values': dict(zip(names, values.tolist())),
+        'std': dict(zip(names, std.tolist())),
+        'correlation': correlation,
+        'params': apply(params, dict(zip(names, values))),
+        'rmse': math.sqrt(best_sse / len(t_log)),
+        'residuals': residuals,
+        'evaluations': objective.evaluations,
+        'stopped': objective.stopped,
+        'generations': generations,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def load_log(path: str) -> tuple:
+    '''
+    Возвращает t, x, w записи погружения `path` (см. `drive_log.DriveLog.load`;
+    столбца `w` может не быть -- тогда w = None).
+    '''
+    log = drive_log.DriveLog.load(path)
+    if log.x is None:
+        raise ValueError(f'{path}: в записи нет глубины')
+    return log.t, log.x, log.w
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('log', help='запись погружения (CSV со столбцами t, x, w)')
+    parser.add_argument('--base', required=True, help='параметры расчёта (JSON, см. pogruzhatel_jit.MAIN_PARAMS)')
+    parser.add_argument('--fit', default=','.join(DEFAULT_FIT),
+                        help=f'подбираемые параметры через запятую (из {", ".join(FIT_PARAMS)})')
+    parser.add_argument('--population', type=int, default=12, help='кандидатов в поколении')
+    parser.add_argument('--seed', type=int, default=0, help='зерно выбора кандидатов')
+    parser.add_argument('--workers', type=int, help='количество потоков (по умолчанию по количеству ядер)')
+    parser.add_argument('--out', help='файл для подобранных параметров `main` (JSON)')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as f:
+        params = json.load(f)
+    t, x, w = load_log(args.log)
+    result = calibrate(
+        params, t, x, w, tuple(args.fit.split(',')), population=args.population, seed=args.seed,
+        workers=args.workers
+    )
+    for name in result['names']:
+        print(f'{name:<16} {result["values"][name]:>14.6g} ± {result["std"][name]:.3g}')
+    print(
+        f'Невязка (СКО): {result["rmse"]:.4g} м, расчётов: {result["evaluations"]} '
+        f'(прекращено: {result["stopped"]}), поколений: {result["generations"]}, {result["elapsed"]:.1f} с'
+    )
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({name: np.asarray(value).tolist() for name, value in result['params'].items()}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
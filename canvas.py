@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+'''
+Графики погружения в окне приложения.
+Модуль импортирует matplotlib и загружается после появления окна (см. `main.xolm.build_canvas`).
+'''
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.backends.backend_qt5agg import \
+    NavigationToolbar2QT as NavigationToolbar2  # noqa: F401
+
+matplotlib.use('Qt5Agg')
+
+
+class MplCanvas(FigureCanvasQTAgg):
+    '''
+    Графики погружения с отрисовкой через blitting.
+    Оси, подписи и сетка рисуются полностью только при изменении границ графиков;
+    на каждом кадре поверх уже нарисованного изображения дорисовывается лишь
+    новый участок линий, поэтому время кадра не зависит от длительности погружения.
+    Если задан источник данных (`set_source`), при изменении границ по времени
+    (масштабирование панелью инструментов) линии заменяются данными видимого окна из источника.
+    Измеренная глубина (`set_measured`) рисуется на графике глубины неанимированной линией,
+    то есть вместе с фоном, и тоже подгружается по видимому окну.
+    '''
+
+    def __init__(self, parent=None):
+        subplots = 3
+        self.fig, self.axarr = plt.subplots(subplots, sharex=True)
+        self.labels_enable()
+        self.fig.subplots_adjust(
+            left=.1,
+            bottom=.08,
+            right=.96,
+            top=.96,
+            hspace=0.4,
+        )
+        self.grid_enable()
+        super(MplCanvas, self).__init__(self.fig)
+
+        for i in range(subplots):
+            self.axarr[i].spines['top'].set_visible(False)
+            self.axarr[i].spines['right'].set_visible(False)
+
+        # анимируемые линии: видимая часть данных и новый участок кадра
+        self.lines = []
+        self.segments = []
+        self.t = np.empty(0)
+        self.series = ()
+        self.data_min = []
+        self.data_max = []
+        self.drawn = 0  # количество отображённых точек данных
+        self.view_start = 0  # первая точка, попадающая в видимую область по времени
+        self.tracking = False
+        self.background = None
+        self.source = None
+        self.source_points = 0
+        self.source_window = None
+        self.measured = None
+        self.measured_line, = self.axarr[0].plot([], [], color='k', linestyle='--', linewidth=1)
+        self.mpl_connect('draw_event', self.on_draw)
+        for ax in self.axarr:
+            ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+    def grid_enable(self):
+        for x in self.axarr:
+            x.grid(True)
+
+    def labels_enable(self):
+        self.axarr[0].set_title(r'$x(t)$ - глубина погружения, м')
+        self.axarr[1].set_title(r'$\omega$ - количество оборотов в секунду')
+        self.axarr[2].set_title(r'$\Sigma$ - импульс')
+        self.axarr[2].set_xlabel('Время (сек.)')
+        # self.axarr[3].set_title(r'$\Sigma$ - импульс с шумом')
+
+    def add_line(self, index, **kwargs):
+        line, = self.axarr[index].plot([], [], animated=True, **kwargs)
+        segment, = self.axarr[index].plot([], [], animated=True, **kwargs)
+        self.lines.append(line)
+        self.segments.append(segment)
+        return line
+
+    def set_series(self, t, *series):
+        '''
+        Задаёт данные линий (по одному массиву на линию) и очищает графики.
+        '''
+        self.t = t
+        self.series = series
+        self.data_min = [np.inf] * len(series)
+        self.data_max = [-np.inf] * len(series)
+        self.drawn = 0
+        self.view_start = 0
+        if self.background is not None:
+            self.restore_region(self.background)
+            self.blit(self.fig.bbox)
+
+    def set_source(self, source, n_points=2 * 2700):
+        '''
+        Задаёт источник данных для подробного отображения: функцию `source(t_start, t_stop, n_points)`,
+        возвращающую данные линий в окне времени (например, `archive.Archive.window`),
+        None -- отключает подгрузку.
+        '''
+        self.source = source
+        self.source_points = n_points
+        self.source_window = None
+        if source is not None:
+            self.on_xlim_changed(self.axarr[0])
+
+    def set_measured(self, source, n_points=2 * 2700):
+        '''
+        Задаёт измеренную глубину: функцию `source(t_start, t_stop, n_points)`, возвращающую
+        t, x записи в окне времени (например, `drive_log.DriveLog.window`), None -- убирает линию.
+        '''
+        self.measured = source
+        self.measured_points = n_points
+        if source is not None and not self.drawn:
+            # графики пусты -- границы по всей записи
+            t, x = source(-np.inf, np.inf, n_points)
+            if len(t):
+                self.axarr[0].set_xlim(0, max(t[-1], 1.0))
+                span = max(x.max() - x.min(), 1e-3)
+                self.axarr[0].set_ylim(x.min() - .05 * span, x.max() + .05 * span)
+        self.update_measured(self.axarr[0].get_xlim())
+        self.draw_idle()
+
+    def update_measured(self, window):
+        if self.measured is None:
+            self.measured_line.set_data([], [])
+            return
+        self.measured_line.set_data(*self.measured(*window, self.measured_points))
+
+    def on_xlim_changed(self, ax):
+        if ax is self.axarr[0]:
+            self.update_measured(ax.get_xlim())
+        if self.source is None:
+            return
+        window = ax.get_xlim()
+        if window == self.source_window:
+            return
+        self.source_window = window
+        x, t, w, impulse = self.source(*window, self.source_points)
+        self.t = t
+        self.series = (x, w, impulse)[:len(self.lines)]
+        self.drawn = len(t)
+        self.view_start = 0
+        self.tracking = False
+        self.draw_idle()
+
+    def clear_lines(self):
+        self.set_series(np.empty(0), *(np.empty(0) for _ in self.lines))
+
+    def on_draw(self, event):
+        # полная отрисовка: запоминаем статичный фон и рисуем на нём видимую часть линий
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        for line, y in zip(self.lines, self.series):
+            line.set_data(self.t[self.view_start:self.drawn], y[self.view_start:self.drawn])
+            line.axes.draw_artist(line)
+
+    def show_until(self, n, xlim=None):
+        '''
+        Отображает первые `n` точек данных.
+        xlim -- границы по времени при слежении за погружением, по умолчанию
+                границы расширяются, когда данные выходят за видимую область.
+        '''
+        n = min(n, len(self.t))
+        if n <= self.drawn and xlim is None and not self.tracking:
+            return
+        start = max(self.drawn - 1, 0)
+        inside = self.update_data_limits(start, n)
+        self.drawn = max(n, self.drawn)
+
+        if xlim is not None:
+            # при слежении граница по времени меняется каждый кадр -- рисуем только видимое окно
+            self.tracking = True
+            self.axarr[0].set_xlim(*xlim)
+            if not inside:
+                self.fit_limits(x=False)
+            self.view_start = max(int(np.searchsorted(self.t, xlim[0])) - 1, 0)
+            self.draw()
+            return
+
+        if self.tracking or not inside or self.background is None:
+            self.tracking = False
+            self.view_start = 0
+            self.fit_limits()
+            self.draw()
+            return
+
+        for segment, y in zip(self.segments, self.series):
+            segment.set_data(self.t[start:n], y[start:n])
+            segment.axes.draw_artist(segment)
+        self.blit(self.fig.bbox)
+
+    def update_data_limits(self, start, n):
+        '''
+        Учитывает точки [`start`, `n`) в границах данных и проверяет,
+        что они попадают в текущие границы графиков.
+        '''
+        if n <= start:
+            return True
+        inside = self.t[n - 1] <= self.axarr[0].get_xlim()[1]
+        for k, y in enumerate(self.series):
+            lo = y[start:n].min()
+            hi = y[start:n].max()
+            self.data_min[k] = min(self.data_min[k], lo)
+            self.data_max[k] = max(self.data_max[k], hi)
+            y_lo, y_hi = self.lines[k].axes.get_ylim()
+            inside = inside and y_lo <= lo and hi <= y_hi
+        return inside
+
+    def fit_limits(self, x=True):
+        '''
+        Расширяет границы графиков по данным с запасом, чтобы следующая
+        перерисовка понадобилась не раньше, чем данные вырастут в полтора раза.
+        '''
+        if x and self.drawn:
+            self.axarr[0].set_xlim(0, max(self.t[self.drawn - 1] * 1.5, self.t[self.drawn - 1] + 1))
+        for k, line in enumerate(self.lines):
+            lo = self.data_min[k]
+            hi = self.data_max[k]
+            if k == 0 and len(self.measured_line.get_ydata()):
+                lo = min(lo, np.min(self.measured_line.get_ydata()))
+                hi = max(hi, np.max(self.measured_line.get_ydata()))
+            if lo > hi:
+                continue
+            span = max(hi - lo, abs(hi), 1e-3)
+            line.axes.set_ylim(lo - .25 * span if lo < 0 else lo - .05 * span, hi + .5 * span)
@@ -0,0 +1,85 @@
+'''
+Счётчиковый генератор случайных чисел для шумов расчёта.
+
+Равномерное число номер `counter` потока `key` -- значение смешивающей функции
+SplitMix64 от пары (key, counter), у генератора нет общего изменяемого состояния.
+Поэтому каждая реализация расчёта получает собственный поток по своему зерну,
+потоки не зависят от того, в каком потоке ОС и в каком порядке считаются
+реализации, а одно и то же зерно всегда даёт одни и те же числа.
+Нормальные числа получаются блоками (`fill_normals`, `reserve_normals`).
+'''
+import math
+
+import numpy as np
+from numba import jit
+
+# размер блока нормальных чисел (чётный: числа получаются парами)
+BLOCK = 1024
+
+GAMMA = np.uint64(0x9E3779B97F4A7C15)
+MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+@jit(nopython=True, cache=True)
+def mix64(z):
+    '''
+    Смешивающая функция SplitMix64: биективно переводит 64-битное число в «случайное».
+    '''
+    z = (z ^ (z >> np.uint64(30))) * MIX_1
+    z = (z ^ (z >> np.uint64(27))) * MIX_2
+    return z ^ (z >> np.uint64(31))
+
+
+@jit(nopython=True, cache=True)
+def stream_key(seed):
+    '''
+    Возвращает ключ потока случайных чисел по зерну `seed` (неотрицательное целое).
+    '''
+    return mix64(np.uint64(seed) * GAMMA + GAMMA)
+
+
+@jit(nopython=True, cache=True)
+def uniform(key, counter):
+    '''
+    Возвращает равномерно распределённое на (0, 1] число номер `counter` потока `key`.
+    '''
+    bits = mix64(np.uint64(key) + np.uint64(counter) * GAMMA) >> np.uint64(11)
+    return (float(bits) + 1.0) * 2.0 ** -53
+
+
+@jit(nopython=True, cache=True)
+def fill_normals(key, counter, out):
+    '''
+    Заполняет `out` (чётной длины) стандартными нормальными числами из равномерных
+    чисел потока `key`, начиная с номера `counter` (полярный метод Марсальи),
+    и возвращает номер первого неиспользованного равномерного числа.
+    '''
+    key = np.uint64(key)
+    counter = np.uint64(counter)
+    j = 0
+    while j < out.shape[0]:
+        u = 2 * uniform(key, counter) - 1
+        v = 2 * uniform(key, counter + np.uint64(1)) - 1
+        counter += np.uint64(2)
+        r = u * u + v * v
+        if 0 < r < 1:
+            factor = math.sqrt(-2 * math.log(r) / r)
+            out[j] = u * factor
+            out[j + 1] = v * factor
+            j += 2
+    return counter
+
+
+@jit(nopython=True, cache=True)
+def reserve_normals(rng, noise, pos, count):
+    '''
+    Возвращает номер, начиная с которого в блоке `noise` есть `count` неиспользованных
+    нормальных чисел. Если их не хватает, остаток блока пропускается и блок заполняется
+    следующими числами потока (`rng` -- ключ потока и номер следующего равномерного числа).
+    pos -- номер первого неиспользованного числа блока.
+    '''
+    if pos + count > noise.shape[0]:
+        rng[1] = fill_normals(rng[0], rng[1], noise)
+        return 0
+    return pos
@@ -0,0 +1,172 @@
+'''
+Прореживание траекторий погружения для отображения и экспорта.
+
+Сила импульса быстро колеблется, поэтому простая выборка каждого k-го момента
+теряет огибающую колебаний. Здесь моменты времени разбиваются на группы, и от
+каждой группы остаются два момента -- с наименьшей и наибольшей силой импульса
+(в порядке времени), либо моменты выбираются методом LTTB
+(largest-triangle-three-buckets). Глубина, время и обороты берутся в те же моменты.
+'''
+import numpy as np
+from numba import jit
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def minmax_append(x, t, w, impulse, start, stop, bucket, out_x, out_t, out_w, out_impulse, out_size):
+    '''
+    Добавляет в выходные буферы `out_*`, начиная с ячейки `out_size`, по два момента времени
+    на каждую группу из `bucket` моментов отрезка [`start`, `stop`): с наименьшей и наибольшей
+    силой импульса. Возвращает количество заполненных ячеек выходных буферов.
+    '''
+    for j in range(start, stop, bucket):
+        end = min(j + bucket, stop)
+        lo = j
+        hi = j
+        for k in range(j + 1, end):
+            if impulse[k] < impulse[lo]:
+                lo = k
+            if impulse[k] > impulse[hi]:
+                hi = k
+        for k in (min(lo, hi), max(lo, hi)):
+            out_x[out_size] = x[k]
+            out_t[out_size] = t[k]
+            out_w[out_size] = w[k]
+            out_impulse[out_size] = impulse[k]
+            out_size += 1
+    return out_size
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def minmax_merge(x, t, w, impulse, size):
+    '''
+    Объединяет на месте соседние пары групп `minmax_append` (по четыре момента) в одну группу
+    из двух моментов, уменьшая количество точек вдвое. Возвращает новое количество точек.
+    '''
+    m = 0
+    for j in range(0, size, 4):
+        end = min(j + 4, size)
+        lo = j
+        hi = j
+        for k in range(j + 1, end):
+            if impulse[k] < impulse[lo]:
+                lo = k
+            if impulse[k] > impulse[hi]:
+                hi = k
+        for k in (min(lo, hi), max(lo, hi)):
+            x[m] = x[k]
+            t[m] = t[k]
+            w[m] = w[k]
+            impulse[m] = impulse[k]
+            m += 1
+    return m
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def drop_repeats(x, t, w, impulse, size):
+    '''
+    Удаляет на месте повторы моментов времени: группа, в которой наименьшая и наибольшая
+    сила импульса приходятся на один момент, даёт его в `minmax_append` дважды.
+    Возвращает новое количество точек.
+    '''
+    m = 0
+    for k in range(size):
+        if m and t[k] == t[m - 1]:
+            continue
+        x[m] = x[k]
+        t[m] = t[k]
+        w[m] = w[k]
+        impulse[m] = impulse[k]
+        m += 1
+    return m
+
+
+@jit(nopython=True, cache=True)
+def minmax_indices(y, n_buckets):
+    '''
+    Возвращает номера моментов с наименьшим и наибольшим `y` в каждой из `n_buckets`
+    равных групп (в порядке времени, без повторов). Первый и последний моменты сохраняются,
+    поэтому номеров не больше `2 * n_buckets + 2`.
+    '''
+    n = y.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    n_buckets = max(min(n_buckets, n), 1)
+    indices = np.empty(2 * n_buckets + 2, dtype=np.int64)
+    indices[0] = 0
+    size = 1
+    for b in range(n_buckets):
+        start = b * n // n_buckets
+        end = (b + 1) * n // n_buckets
+        lo = start
+        hi = start
+        for k in range(start + 1, end):
+            if y[k] < y[lo]:
+                lo = k
+            if y[k] > y[hi]:
+                hi = k
+        for k in (min(lo, hi), max(lo, hi)):
+            if k != indices[size - 1]:
+                indices[size] = k
+                size += 1
+    if indices[size - 1] != n - 1:
+        indices[size] = n - 1
+        size += 1
+    return indices[:size]
+
+
+@jit(nopython=True, cache=True)
+def lttb_indices(t, y, n_out):
+    '''
+    Возвращает номера `n_out` моментов, выбранных методом largest-triangle-three-buckets:
+    из каждой группы берётся точка, образующая наибольший треугольник с предыдущей
+    выбранной точкой и средней точкой следующей группы. Первая и последняя точки сохраняются.
+    '''
+    n = t.shape[0]
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[n_out - 1] = n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for b in range(n_out - 2):
+        start = int(b * every) + 1
+        end = int((b + 1) * every) + 1
+        next_start = end
+        next_end = min(int((b + 2) * every) + 1, n)
+        if b == n_out - 3:
+            next_start = n - 1
+            next_end = n
+        t_avg = 0.0
+        y_avg = 0.0
+        for k in range(next_start, next_end):
+            t_avg += t[k]
+            y_avg += y[k]
+        t_avg /= next_end - next_start
+        y_avg /= next_end - next_start
+        best = start
+        best_area = -1.0
+        for k in range(start, end):
+            area = abs((t[a] - t_avg) * (y[k] - y[a]) - (t[a] - t[k]) * (y_avg - y[a]))
+            if area > best_area:
+                best_area = area
+                best = k
+        indices[b + 1] = best
+        a = best
+    return indices
+
+
+def decimate(x, t, w, impulse, n_out: int, method: str = 'minmax') -> tuple:
+    '''
+    Возвращает прореженные x, t, w, impulse не более чем из `n_out` моментов времени.
+    Моменты выбираются по силе импульса, первый и последний моменты сохраняются всегда:
+    method -- `minmax` (наименьшее и наибольшее значение в группе) или `lttb`.
+    '''
+    if method == 'minmax':
+        # два номера -- на первый и последний моменты
+        indices = minmax_indices(np.asarray(impulse), max((n_out - 2) // 2, 1))
+    elif method == 'lttb':
+        indices = lttb_indices(np.asarray(t), np.asarray(impulse), n_out)
+    else:
+        raise ValueError(f'Неизвестный метод прореживания `{method}`')
+    return x[indices], t[indices], w[indices], impulse[indices]
@@ -0,0 +1,193 @@
+'''
+Загрузка больших записей погружения с машинки.
+
+Запись -- моменты времени `t` (с), измеренная глубина `x` (м) и обороты `w` (об./с),
+миллионы строк на погружение. Форматы:
+CSV -- заголовок с именами столбцов (`t`/`time`, `x`/`depth`, `w`/`rpm`, остальные
+пропускаются), разделитель `,`, `;` или табуляция; файл читается блоками по `BLOCK` байт,
+каждый блок разбирается `np.loadtxt` сразу в массив, строки в объекты Python не превращаются;
+`.npy` -- структурированный массив со столбцами с теми же именами или матрица (t, x, w);
+двоичный файл без заголовка (любое другое расширение) -- записи little-endian float64
+из столбцов `columns` (по умолчанию t, x, w).
+Двоичные файлы открываются через `np.memmap` и копируются в компактные массивы порциями.
+
+Загруженная запись (`DriveLog`) приводится к табличному управлению расчёта (`control_table`)
+и прореживается для отображения (`window`, `decimation.minmax_indices`).
+'''
+import io
+import os
+
+import numpy as np
+
+import decimation
+
+BLOCK = 2 ** 24  # байт CSV, разбираемых за раз
+ROWS = 2 ** 20  # записей двоичного файла, копируемых за раз
+COLUMNS = ('t', 'x', 'w')
+# имена столбцов CSV и структурированных массивов для каждой величины
+ALIASES = {'t': ('t', 'time'), 'x': ('x', 'depth'), 'w': ('w', 'rpm')}
+DISPLAY_POINTS = 2 * 2700  # моментов прореженной записи для отображения (как `main.xolm.trace_points`)
+
+
+def find_columns(names: list) -> dict:
+    '''
+    Возвращает номера столбцов величин t, x, w среди имён `names` (отсутствующие -- None).
+    '''
+    names = [name.strip().strip('"').lower() for name in names]
+    found = {}
+    for quantity, aliases in ALIASES.items():
+        found[quantity] = next((k for k, name in enumerate(names) if name in aliases), None)
+    if found['t'] is None or found['x'] is None and found['w'] is None:
+        raise ValueError(f'Нет столбца времени и глубины или оборотов среди {", ".join(names)}')
+    return found
+
+
+def read_csv(path: str) -> dict:
+    '''
+    Читает CSV `path` блоками и возвращает словарь массивов t, x, w (отсутствующие -- None).
+    '''
+    with open(path, 'rb') as f:
+        header = f.readline().decode('utf-8-sig')
+        delimiter = max((',', ';', '\t'), key=header.count)
+        found = find_columns(header.split(delimiter))
+        usecols = [k for k in found.values() if k is not None]
+        chunks = []
+        tail = b''
+        while True:
+            data = f.read(BLOCK)
+            if not data:
+                break
+            # блок разбирается до последнего перевода строки, остаток -- со следующим блоком
+            data = tail + data
+            end = data.rfind(b'\n') + 1
+            tail = data[end:]
+            if end:
+                chunks.append(parse_block(data[:end], delimiter, usecols))
+        if tail.strip():
+            chunks.append(parse_block(tail, delimiter, usecols))
+    table = np.concatenate(chunks) if chunks else np.empty((0, len(usecols)))
+    return {
+        quantity: np.ascontiguousarray(table[:, usecols.index(k)]) if k is not None else None
+        for quantity, k in found.items()
+    }
+
+
+def parse_block(data: bytes, delimiter: str, usecols: list) -> np.ndarray:
+    return np.loadtxt(
+        io.StringIO(data.decode('utf-8')), delimiter=delimiter, usecols=usecols, ndmin=2, dtype=np.float64
+    )
+
+
+def copy_column(source, out: np.ndarray):
+    '''
+    Копирует столбец `source` (в том числе из `np.memmap`) в массив `out` порциями по `ROWS` записей.
+    '''
+    for start in range(0, len(out), ROWS):
+        out[start:start + ROWS] = source[start:start + ROWS]
+    return out
+
+
+def read_binary(path: str, columns: tuple = COLUMNS) -> dict:
+    '''
+    Открывает `.npy` или двоичный файл записей `path` через `np.memmap` и возвращает
+    словарь массивов t, x, w (отсутствующие -- None).
+    '''
+    if path.endswith('.npy'):
+        records = np.load(path, mmap_mode='r')
+        if records.dtype.names:
+            names = list(records.dtype.names)
+            fields = [records[name] for name in names]
+        else:
+            names = list(columns[:records.shape[1]])
+            fields = [records[:, k] for k in range(records.shape[1])]
+    else:
+        records = np.memmap(path, np.dtype([(name, '<f8') for name in columns]), 'r')
+        names = list(columns)
+        fields = [records[name] for name in names]
+    found = find_columns(names)
+    return {
+        quantity: copy_column(fields[k], np.empty(len(records))) if k is not None else None
+        for quantity, k in found.items()
+    }
+
+
+class DriveLog:
+    '''
+    Запись погружения: массивы t, x, w (x или w -- None, если не записаны).
+    '''
+
+    def __init__(self, t: np.ndarray, x: np.ndarray = None, w: np.ndarray = None, path: str = None):
+        self.t = t
+        self.x = x
+        self.w = w
+        self.path = path
+        if len(t) and (np.diff(t) < 0).any():
+            raise ValueError('Время записи должно не убывать')
+
+    @classmethod
+    def load(cls, path: str, columns: tuple = COLUMNS) -> 'DriveLog':
+        '''
+        Загружает запись из файла `path` (формат -- по расширению, см. описание модуля;
+        columns -- столбцы двоичного файла без заголовка).
+        '''
+        if os.path.splitext(path)[1].lower() in ('.csv', '.txt'):
+            data = read_csv(path)
+        else:
+            data = read_binary(path, columns)
+        return cls(data['t'], data['x'], data['w'], path)
+
+    def __len__(self):
+        return len(self.t)
+
+    def control_table(self, step: float = 1.0, resolution: float = 0.0) -> tuple:
+        '''
+        Возвращает табличное управление расчёта `t_table`, `w_table` по оборотам записи:
+        средние обороты на отрезках по `step` секунд (отрезки без отсчётов получают обороты
+        предыдущего), строки, в которых обороты изменились не больше чем на `resolution`,
+        пропускаются; последняя строка -- в конце записи.
+        Расчёт применяет не больше одной строки таблицы на проверку оборотов (раз в секунду),
+        поэтому `step` не меньше 1 с -- иначе обороты расчёта отставали бы от записи.
+        '''
+        if self.w is None:
+            raise ValueError('В записи нет оборотов')
+        if step < 1.0:
+            raise ValueError('Шаг таблицы оборотов должен быть не меньше 1 с')
+        bins = ((self.t - self.t[0]) // step).astype(np.int64)
+        counts = np.bincount(bins)
+        sums = np.bincount(bins, weights=self.w)
+        filled = counts > 0
+        # отрезки без отсчётов -- обороты последнего отрезка с отсчётами
+        last = np.maximum.accumulate(np.where(filled, np.arange(len(counts)), 0))
+        w_table = sums[last] / counts[last]
+        t_table = self.t[0] + step * np.arange(len(counts))
+        keep = np.ones(len(w_table), dtype=bool)
+        changed = w_table[0]
+        for k in range(1, len(w_table)):
+            keep[k] = abs(w_table[k] - changed) > resolution
+            if keep[k]:
+                changed = w_table[k]
+        t_table = np.append(t_table[keep], self.t[-1])
+        w_table = np.append(w_table[keep], w_table[-1])
+        return t_table, w_table
+
+    def window(self, t_start: float, t_stop: float, n_points: int = DISPLAY_POINTS) -> tuple:
+        '''
+        Возвращает t, x моментов записи из интервала [`t_start`, `t_stop`] (и по одному моменту
+        за его границами), прореженные до `n_points` моментов: по два момента (наименьшая
+        и наибольшая глубина) на группу (`decimation.minmax_indices`).
+        '''
+        lo = max(int(np.searchsorted(self.t, t_start)) - 1, 0)
+        hi = min(int(np.searchsorted(self.t, t_stop, 'right')) + 1, len(self.t))
+        t = self.t[lo:hi]
+        x = self.x[lo:hi]
+        if len(t) > n_points:
+            indices = decimation.minmax_indices(x, max((n_points - 2) // 2, 1))
+            t = t[indices]
+            x = x[indices]
+        return t, x
+
+    def overview(self, n_points: int = DISPLAY_POINTS) -> tuple:
+        '''
+        Возвращает t, x всей записи, прореженные до `n_points` моментов (см. `window`).
+        '''
+        return self.window(-np.inf, np.inf, n_points)
@@ -0,0 +1,231 @@
+'''
+Ансамбль реализаций погружения с шумами (метод Монте-Карло).
+
+Реализации считаются параллельно на всех ядрах (`prange`). У каждой реализации
+собственный поток случайных чисел (`counter_rng`) со своим зерном, поэтому
+результат не зависит от количества потоков и порядка расчёта.
+Траектории сразу приводятся к общей сетке времени и не хранятся целиком;
+поломка сваи в одной реализации не прерывает остальные.
+'''
+import numpy as np
+from numba import jit, prange
+
+import pogruzhatel_jit
+
+PERCENTILES = (5, 50, 95)
+
+
+# ячейки положения на сетке при приведении траектории к ней порциями (`resample_chunk`)
+CURSOR_NODE = 0  # номер следующего незаполненного узла
+CURSOR_PEAK = 1  # максимум модуля силы импульса начиная с момента, записанного в предыдущий узел
+CURSOR_T = 2  # время, глубина, обороты и сила импульса в последний просмотренный момент
+CURSOR_X = 3
+CURSOR_W = 4
+CURSOR_IMPULSE = 5
+CURSOR_SIZE = 6
+
+
+@jit(nopython=True, cache=True)
+def resample_to_grid(t, x, w, impulse, t_grid, out_x, out_w, out_impulse):
+    '''
+    Приводит одну траекторию к сетке `t_grid`:
+    out_x, out_w -- значения глубины и оборотов в последний момент времени не позже узла;
+    out_impulse -- максимум модуля силы импульса на отрезке между соседними узлами.
+    После окончания расчёта глубина и обороты сохраняют последнее значение, импульс -- nan.
+    '''
+    cursor = np.zeros(CURSOR_SIZE)
+    resample_chunk(t, x, w, impulse, t.shape[0], t_grid, out_x, out_w, out_impulse, cursor)
+    resample_finish(t_grid, out_x, out_w, out_impulse, cursor)
+
+
+@jit(nopython=True, cache=True)
+def resample_chunk(t, x, w, impulse, size, t_grid, out_x, out_w, out_impulse, cursor):
+    '''
+    Приводит к сетке `t_grid` очередную порцию траектории (первые `size` моментов буферов)
+    так же, как `resample_to_grid`, не храня траекторию целиком: узел заполняется, как только
+    пройден первый момент после него. Положение на сетке -- в `cursor` (ячейки `CURSOR_*`,
+    перед первой порцией -- нули); после последней порции вызывается `resample_finish`.
+    '''
+    n_grid = t_grid.shape[0]
+    j = int(cursor[CURSOR_NODE])
+    peak = cursor[CURSOR_PEAK]
+    for k in range(size):
+        while j < n_grid and t_grid[j] < t[k]:
+            out_x[j] = cursor[CURSOR_X]
+            out_w[j] = cursor[CURSOR_W]
+            out_impulse[j] = peak
+            peak = abs(cursor[CURSOR_IMPULSE])
+            j += 1
+        peak = max(peak, abs(impulse[k]))
+        cursor[CURSOR_T] = t[k]
+        cursor[CURSOR_X] = x[k]
+        cursor[CURSOR_W] = w[k]
+        cursor[CURSOR_IMPULSE] = impulse[k]
+    cursor[CURSOR_NODE] = j
+    cursor[CURSOR_PEAK] = peak
+
+
+@jit(nopython=True, cache=True)
+def resample_finish(t_grid, out_x, out_w, out_impulse, cursor):
+    '''
+    Заполняет узлы сетки, оставшиеся после последней порции `resample_chunk`.
+    '''
+    n_grid = t_grid.shape[0]
+    j = int(cursor[CURSOR_NODE])
+    peak = cursor[CURSOR_PEAK]
+    while j < n_grid:
+        out_x[j] = cursor[CURSOR_X]
+        out_w[j] = cursor[CURSOR_W]
+        if t_grid[j] <= cursor[CURSOR_T]:
+            out_impulse[j] = peak
+            peak = abs(cursor[CURSOR_IMPULSE])
+        else:
+            out_impulse[j] = np.nan
+        j += 1
+    cursor[CURSOR_NODE] = j
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def ensemble_kernel(
+    g, dt, l_pile, P, S, M,
+    gamma_cr, gamma_cf,
+    fi,
+    m_debs, R_debs,
+    m_debs_custom_noise, R_debs_custom_noise,
+    theta_noise,
+    rpm_noise_scale,
+    m_debs_noise_scale,
+    R_debs_noise_scale,
+    dw,
+    t_table, w_table,
+    tol,
+    soil_depth, soil_tip, soil_side,
+    seeds, t_grid
+):
+    '''
+    Считает `len(seeds)` реализаций `pogruzhatel_jit.main` и возвращает их на сетке `t_grid`:
+    grid_x, grid_w, grid_impulse -- матрицы (реализация, узел сетки), см. `resample_to_grid`;
+    t_full -- время полного погружения каждой реализации (nan, если свая не погружена);
+    status -- причина окончания расчёта каждой реализации (`pogruzhatel_jit.STATUS_*`).
+    Каждая реализация считается порциями по секунде модельного времени, которые сразу
+    приводятся к сетке, поэтому память не зависит от длительности погружения.
+    Поломка сваи не прерывает ансамбль: реализация оканчивается с причиной `STATUS_BROKEN`,
+    на сетке -- моменты до поломки.
+    '''
+    n_real = seeds.shape[0]
+    n_grid = t_grid.shape[0]
+    grid_x = np.empty((n_real, n_grid))
+    grid_w = np.empty((n_real, n_grid))
+    grid_impulse = np.empty((n_real, n_grid))
+    t_full = np.empty(n_real)
+    status = np.empty(n_real, dtype=np.int64)
+    for r in prange(n_real):
+        state = pogruzhatel_jit.init_state(
+            g, dt, l_pile, P, S, M,
+            gamma_cr, gamma_cf,
+            fi,
+            m_debs, R_debs,
+            m_debs_custom_noise, R_debs_custom_noise,
+            theta_noise,
+            rpm_noise_scale,
+            m_debs_noise_scale,
+            R_debs_noise_scale,
+            dw,
+            t_table, w_table,
+            tol,
+            soil_depth, soil_tip, soil_side,
+            seeds[r]
+        )
+        period = int(state.scal[pogruzhatel_jit.S_PERIOD])
+        x = np.empty(period)
+        t = np.empty(period)
+        w = np.empty(period)
+        impulse = np.empty(period)
+        cursor = np.zeros(CURSOR_SIZE)
+        while state.scal[pogruzhatel_jit.S_STATUS] == pogruzhatel_jit.STATUS_RUNNING:
+            size = pogruzhatel_jit.advance_into(state, x, t, w, impulse, 0, period)
+            resample_chunk(t, x, w, impulse, size, t_grid, grid_x[r], grid_w[r], grid_impulse[r], cursor)
+        resample_finish(t_grid, grid_x[r], grid_w[r], grid_impulse[r], cursor)
+        status[r] = int(state.scal[pogruzhatel_jit.S_STATUS])
+        t_full[r] = cursor[CURSOR_T] if cursor[CURSOR_X] >= l_pile else np.nan
+    return grid_x, grid_w, grid_impulse, t_full, status
+
+
+def default_grid(params: dict, n_grid: int = 1001) -> np.ndarray:
+    '''
+    Возвращает равномерную сетку времени, покрывающую весь расчёт.
+    При табличном управлении расчёт заканчивается сразу после `t_table[-1]`.
+    При управлении шагом `dw` за каждую секунду либо обороты растут на `dw`
+    (до критических 50 об./с), либо свая погружается больше чем на 1 см.
+    '''
+    dw = params.get('dw', 0.0)
+    if dw:
+        t_end = 50 / dw + params['l_pile'] / 0.01 + 1
+    else:
+        t_end = float(np.asarray(params.get('t_table', (0.0,)))[-1]) + 2
+    return np.linspace(0.0, t_end, n_grid)
+
+
+def band(values: np.ndarray) -> dict:
+    '''
+    Возвращает среднее и процентили (p5, p50, p95) по реализациям (ось 0), пропуская nan.
+    '''
+    stats = {'mean': np.full(values.shape[1:], np.nan)}
+    finite = ~np.isnan(values).all(axis=0)
+    stats['mean'][finite] = np.nanmean(values[:, finite], axis=0)
+    for q in PERCENTILES:
+        stats[f'p{q}'] = np.full(values.shape[1:], np.nan)
+        stats[f'p{q}'][finite] = np.nanpercentile(values[:, finite], q, axis=0)
+    return stats
+
+
+def ensemble(params: dict, n_realizations: int, seed: int, t_grid: np.ndarray = None) -> dict:
+    '''
+    Считает `n_realizations` реализаций погружения с шумами, заданными в `params`
+    (`rpm_noise_scale`, `m_debs_noise_scale`, `R_debs_noise_scale`, `theta_noise`).
+
+    Возвращает словарь:
+    t -- общая сетка времени;
+    x, w, impulse -- статистика глубины, оборотов и огибающей силы импульса на сетке
+                     (`mean`, `p5`, `p50`, `p95`);
+    t_full_depth -- время полного погружения каждой реализации (nan, если не погружена);
+    t_full_depth_stats -- статистика `t_full_depth` по погруженным реализациям;
+    full_depth_share -- доля реализаций, в которых свая погружена полностью;
+    status -- причина окончания расчёта каждой реализации (`pogruzhatel_jit.STATUS_*`);
+    broken_share -- доля реализаций, в которых свая сломалась.
+
+    Параметры:
+    params -- параметры `pogruzhatel_jit.main` (см. `pogruzhatel_jit.MAIN_PARAMS`);
+    n_realizations -- количество реализаций;
+    seed -- зерно, из которого выводятся независимые зёрна реализаций
+            (параметр `seed` в `params` не используется);
+    t_grid -- сетка времени, по умолчанию `default_grid(params)`.
+    '''
+    if t_grid is None:
+        t_grid = default_grid(params)
+    t_grid = np.ascontiguousarray(t_grid, dtype=np.float64)
+    seeds = np.random.SeedSequence(seed).generate_state(n_realizations).astype(np.int64)
+
+    # зерно -- последний параметр `main`, у каждой реализации оно своё
+    grid_x, grid_w, grid_impulse, t_full, status = ensemble_kernel(
+        *pogruzhatel_jit.main_args(params)[:-1], seeds, t_grid
+    )
+
+    reached = t_full[~np.isnan(t_full)]
+    t_full_stats = {'mean': np.nan, **{f'p{q}': np.nan for q in PERCENTILES}}
+    if reached.size:
+        t_full_stats['mean'] = reached.mean()
+        for q in PERCENTILES:
+            t_full_stats[f'p{q}'] = np.percentile(reached, q)
+
+    return {
+        't': t_grid,
+        'x': band(grid_x),
+        'w': band(grid_w),
+        'impulse': band(grid_impulse),
+        't_full_depth': t_full,
+        't_full_depth_stats': t_full_stats,
+        'full_depth_share': reached.size / n_realizations,
+        'status': status,
+        'broken_share': np.count_nonzero(status == pogruzhatel_jit.STATUS_BROKEN) / n_realizations,
+    }
@@ -1,58 +1,213 @@
 # -*- coding: utf-8 -*-
 
-import sys
-
-import matplotlib
-import matplotlib.pyplot as plt
-import numpy as np
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.backends.backend_qt5agg import \
-    NavigationToolbar2QT as NavigationToolbar2
-from PyQt5 import QtCore, QtGui, QtWidgets
-
-import mainwindow
-import pogruzhatel_jit
-
-matplotlib.use('Qt5Agg')
-
-
-class MplCanvas(FigureCanvasQTAgg):
-
-    def __init__(self, parent=None):
-        subplots = 3
-        self.fig, self.axarr = plt.subplots(subplots, sharex=True)
-        self.labels_enable()
-        self.fig.subplots_adjust(
-            left=.1,
-            bottom=.08,
-            right=.96,
-            top=.96,
-            hspace=0.4,
+from time import perf_counter
+
+STARTED = perf_counter()  # начало импорта модуля, для --profile-startup
+
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+
+from PyQt5 import QtCore, QtGui, QtWidgets  # noqa: E402
+
+import mainwindow  # noqa: E402
+
+
+class FrameMeter:
+    '''
+    Частота кадров анимации и время отрисовки кадра (экспоненциальное скользящее среднее).
+    '''
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.fps = 0.0
+        self.frame_ms = 0.0
+        self.last = None
+
+    def frame(self, started):
+        '''
+        Учитывает кадр, отрисовка которого началась в момент `started` (`perf_counter`).
+        '''
+        now = perf_counter()
+        a = self.smoothing
+        self.frame_ms = (1 - a) * self.frame_ms + a * (now - started) * 1000 if self.last else (now - started) * 1000
+        if self.last is not None:
+            self.fps = (1 - a) * self.fps + a / (now - self.last) if self.fps else 1 / (now - self.last)
+        self.last = now
+
+
+class StartupProfile:
+    '''
+    Время этапов запуска окна (режим --profile-startup).
+    '''
+
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.phases = []
+
+    def mark(self, phase, duration=None):
+        '''
+        Отмечает окончание этапа `phase`. Длительность этапа -- `duration` (для этапов
+        в фоновом потоке) или время от окончания предыдущего этапа.
+        '''
+        now = perf_counter()
+        if duration is None:
+            duration = now - self.last
+            self.last = now
+        self.phases.append((phase, duration, now - self.started))
+
+    def report(self):
+        lines = [f'{"этап":<44} {"длительность, с":>16} {"от начала, с":>13}']
+        for phase, duration, elapsed in self.phases:
+            lines.append(f'{phase:<44} {duration:>16.3f} {elapsed:>13.3f}')
+        return '\n'.join(lines)
+
+
+class KernelLoader(QtCore.QThread):
+    '''
+    Импорт модуля расчёта `pogruzhatel_jit` (numba и компиляция или чтение из кэша ядра)
+    в фоновом потоке, пока окно уже показано.
+    '''
+    loaded = QtCore.pyqtSignal(float)  # длительность загрузки, сек.
+    failed = QtCore.pyqtSignal(str)
+
+    def run(self):
+        started = perf_counter()
+        try:
+            import pogruzhatel_jit  # noqa: F401
+        except Exception as e:
+            self.failed.emit(f'Модуль расчёта не загружен: {e}')
+            return
+        self.loaded.emit(perf_counter() - started)
+
+
+class SimulationThread(QtCore.QThread):
+    '''
+    Расчёт погружения в отдельном потоке.
+    Ядро `pogruzhatel_jit.simulate` не держит GIL, поэтому окно остаётся отзывчивым.
+    Текущие глубина и время читаются из массива управления по таймеру и передаются
+    сигналом `progress`, отмена -- через `cancel`. По окончании расчёта в `stats` --
+    счётчики расчёта (`pogruzhatel_jit.counters`) и его длительность wall (сек.).
+    '''
+    progress = QtCore.pyqtSignal(float, float)  # глубина (м), время (сек.)
+    result_ready = QtCore.pyqtSignal(object)  # x, t, w, all_impulse
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, args, parent=None):
+        import numpy as np
+        import pogruzhatel_jit
+
+        super().__init__(parent)
+        self.args = args
+        self.kernel = pogruzhatel_jit
+        self.control = np.zeros(pogruzhatel_jit.CONTROL_SIZE)
+        self.stats = None
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(100)
+        self.progress_timer.timeout.connect(self.report_progress)
+        self.started.connect(self.progress_timer.start)
+        self.finished.connect(self.progress_timer.stop)
+
+    def run(self):
+        started = perf_counter()
+        try:
+            result = self.kernel.get_simulate()(*self.args, self.control)
+        except ZeroDivisionError:
+            self.failed.emit('Свая сломалась')
+            return
+        self.stats = self.kernel.counters(self.control)
+        self.stats['wall'] = perf_counter() - started
+        if not self.control[self.kernel.CONTROL_CANCEL]:
+            self.result_ready.emit(result)
+
+    def report_progress(self):
+        self.progress.emit(
+            self.control[self.kernel.CONTROL_X],
+            self.control[self.kernel.CONTROL_T],
         )
-        self.grid_enable()
-        super(MplCanvas, self).__init__(self.fig)
 
-        for i in range(subplots):
-            self.axarr[i].spines['top'].set_visible(False)
-            self.axarr[i].spines['right'].set_visible(False)
+    def cancel(self):
+        self.control[self.kernel.CONTROL_CANCEL] = 1
+
+
+class ArchiveThread(QtCore.QThread):
+    '''
+    Полный расчёт прогона с записью всех моментов времени в архив (`archive.save_run`)
+    в отдельном потоке. Прогресс -- сигналом `progress`, как у `SimulationThread`.
+    '''
+    progress = QtCore.pyqtSignal(float, float)  # глубина (м), время (сек.)
+    saved = QtCore.pyqtSignal(str)  # путь к архиву
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, path, params, parent=None):
+        import numpy as np
+        import pogruzhatel_jit
+
+        super().__init__(parent)
+        self.path = path
+        self.params = params
+        self.kernel = pogruzhatel_jit
+        self.control = np.zeros(pogruzhatel_jit.CONTROL_SIZE)
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(100)
+        self.progress_timer.timeout.connect(self.report_progress)
+        self.started.connect(self.progress_timer.start)
+        self.finished.connect(self.progress_timer.stop)
+
+    def run(self):
+        import archive
+
+        try:
+            archive.save_run(self.path, self.params, self.control)
+        except InterruptedError:
+            return
+        except (OSError, ZeroDivisionError) as e:
+            self.failed.emit(f'Прогон не сохранён: {e}')
+            return
+        self.saved.emit(self.path)
+
+    def report_progress(self):
+        self.progress.emit(
+            self.control[self.kernel.CONTROL_X],
+            self.control[self.kernel.CONTROL_T],
+        )
+
+    def cancel(self):
+        self.control[self.kernel.CONTROL_CANCEL] = 1
+
+
+class DriveLogThread(QtCore.QThread):
+    '''
+    Загрузка записи погружения (`drive_log.DriveLog.load`) и её таблицы оборотов в отдельном потоке.
+    '''
+    loaded = QtCore.pyqtSignal(object, object)  # запись, таблица оборотов (t_table, w_table) или None
+    failed = QtCore.pyqtSignal(str)
 
-    def grid_enable(self):
-        for x in self.axarr:
-            x.grid(True)
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
 
-    def labels_enable(self):
-        self.axarr[0].set_title(r'$x(t)$ - глубина погружения, м')
-        self.axarr[1].set_title(r'$\omega$ - количество оборотов в секунду')
-        self.axarr[2].set_title(r'$\Sigma$ - импульс')
-        self.axarr[2].set_xlabel('Время (сек.)')
-        # self.axarr[3].set_title(r'$\Sigma$ - импульс с шумом')
+    def run(self):
+        import drive_log
+
+        try:
+            log = drive_log.DriveLog.load(self.path)
+            table = log.control_table() if log.w is not None and len(log) else None
+        except (OSError, ValueError) as e:
+            self.failed.emit(f'Запись не открыта: {e}')
+            return
+        self.loaded.emit(log, table)
 
 
 class xolm(QtWidgets.QMainWindow, mainwindow.Ui_MainWindow):
 
-    def __init__(self):
+    def __init__(self, profile=None):
         super().__init__()
         self.setupUi(self)
+        self.profile = profile
 
         self.start_button.clicked.connect(self.start_draw)
         self.stop_button.clicked.connect(self.stop_draw)
@@ -79,15 +234,48 @@ class xolm(QtWidgets.QMainWindow, mainwindow.Ui_MainWindow):
         self.tracking_toggle_box.currentIndexChanged.connect(self.tracking_mode)
         self.speed_slider.valueChanged.connect(self.speed_boost)
 
-        self.sc = MplCanvas(self)
-        self.draw_box_layout.addWidget(self.sc)
-        self.draw_box_layout.addWidget(NavigationToolbar2(self.sc, self))
-        self.axarr_0, = self.sc.axarr[0].plot(0, 0, linewidth=2, color='r')
-        self.axarr_1, = self.sc.axarr[1].plot(0, 0, linewidth=2, color='g')
-        self.axarr_2, = self.sc.axarr[2].plot(0, 0, linewidth=2, color='b')
-        # self.axarr_3, = self.sc.axarr[3].plot(0, 0, linewidth=2, color='m')
+        # графики (matplotlib) создаются сразу после появления окна, модуль расчёта (numba) --
+        # в фоновом потоке; «Старт» до окончания загрузки запускает расчёт по её окончании.
+        # При --profile-startup загрузка модуля расчёта начинается после графиков, чтобы
+        # строки `-X importtime` двух потоков не перемешивались
+        self.sc = None
+        self.kernel_ready = False
+        self.start_pending = False
+        QtCore.QTimer.singleShot(0, self.build_canvas)
+        self.kernel_loader = KernelLoader(self)
+        self.kernel_loader.loaded.connect(self.kernel_loaded)
+        self.kernel_loader.failed.connect(self.params_group_box.setTitle)
+        if not self.profile:
+            self.kernel_loader.start()
+
+        self.frame_meter = FrameMeter()
+        self.fps_label = QtWidgets.QLabel()
+        self.perf_label = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self.perf_label)
+        self.statusBar().addPermanentWidget(self.fps_label)
+        self.kernel_load_time = None
 
         self.started_status = 'STOP'
+        self.simulation = None
+
+        # архив прогона: параметры последнего расчёта (с зерном шумов) и открытый архив
+        self.run_params = None
+        self.run_key = None
+        self.result_cache = None  # кэш результатов (result_cache), создаётся при первом расчёте
+        self.replay = None
+        self.saving = None
+        file_menu = self.menuBar().addMenu('Файл')
+        self.save_action = file_menu.addAction('Сохранить прогон...', self.save_run)
+        self.save_action.setEnabled(False)
+        file_menu.addAction('Открыть прогон...', self.open_run)
+        file_menu.addSeparator()
+        # запись погружения с машинки: измеренная глубина на графике, обороты -- управление расчёта
+        self.drive_log = None
+        self.drive_log_table = None
+        self.log_loader = None
+        file_menu.addAction('Открыть запись погружения...', self.open_drive_log)
+        self.close_log_action = file_menu.addAction('Закрыть запись погружения', self.close_drive_log)
+        self.close_log_action.setEnabled(False)
 
         self.timer = QtCore.QTimer()
         self.timer_ms = 75
@@ -95,6 +283,8 @@ class xolm(QtWidgets.QMainWindow, mainwindow.Ui_MainWindow):
 
         self.param_change(True)
 
+        # сохраняемые точки траектории: по две (наименьшая и наибольшая сила импульса) на 2700 столбцов графика
+        self.trace_points = 2 * 2700
         self.default_line_step = 0
         self.dynamic_line_step = 0
         self.current_step = 0
@@ -114,16 +304,53 @@ class xolm(QtWidgets.QMainWindow, mainwindow.Ui_MainWindow):
             4,
         ))
 
+    def build_canvas(self):
+        import canvas
+
+        self.sc = canvas.MplCanvas(self)
+        self.draw_box_layout.addWidget(self.sc)
+        self.draw_box_layout.addWidget(canvas.NavigationToolbar2(self.sc, self))
+        self.axarr_0 = self.sc.add_line(0, linewidth=2, color='r')
+        self.axarr_1 = self.sc.add_line(1, linewidth=2, color='g')
+        self.axarr_2 = self.sc.add_line(2, linewidth=2, color='b')
+        # self.axarr_3 = self.sc.add_line(3, linewidth=2, color='m')
+        if self.profile:
+            self.profile.mark('графики (matplotlib)')
+            self.kernel_loader.start()
+
+    def kernel_loaded(self, duration):
+        self.kernel_ready = True
+        self.kernel_load_time = duration
+        self.perf_label.setText(f'Загрузка ядра: {duration:.2f} с')
+        if self.profile:
+            self.profile.mark('модуль расчёта (numba, фоновый поток)', duration)
+            self.startup_done()
+        if self.start_pending:
+            self.start_pending = False
+            self.start_draw()
+
+    def startup_done(self):
+        # в режиме --profile-startup окно закрывается, когда загружено всё
+        if self.sc is not None and self.kernel_ready:
+            print(self.profile.report())
+            self.kernel_loader.wait()
+            QtWidgets.QApplication.quit()
+
     def set_time_limit_garps(self, time, factor):
+        '''
+        Возвращает границы графиков по времени для режима слежения (None -- без слежения).
+        '''
         index = self.tracking_toggle_box.currentIndex()
         if index == 1:  # Фиксированное
-            self.sc.axarr[0].set_xlim(time - .1, time + .01)
+            return time - .1, time + .01
         elif index == 2:  # Динамическое
-            self.sc.axarr[0].set_xlim(time - .05 * factor, time + .005 * factor)
+            factor = max(factor, 1)
+            return time - .05 * factor, time + .005 * factor
+        return None
 
     def tracking_mode(self, i):
-        if not i:
-            self.sc.axarr[0].set_xlim(auto='auto')
+        if not i and self.sc.drawn:
+            self.sc.show_until(self.sc.drawn)
 
     def move_pogr(self, down):
         self.pogr_label.move(
@@ -135,34 +362,29 @@ class xolm(QtWidgets.QMainWindow, mainwindow.Ui_MainWindow):
         self.dynamic_line_step = self.default_line_step * s
 
     def draw_tick(self):
+        frame_started = perf_counter()
         self.current_step += self.dynamic_line_step
-        cut_t = self.t[:self.current_step]
-        cut_x = self.x[:self.current_step]
-        cut_w = self.w[:self.current_step]
-        cut_impulse = self.impulse[:self.current_step]
-        # cut_impulse_noise = self.impulse_noise[:self.current_step]
         if len(self.t) >= self.current_step - self.dynamic_line_step:
-            self.axarr_0.set_data(cut_t, cut_x)
-            self.axarr_1.set_data(cut_t, cut_w)
-            self.axarr_2.set_data(cut_t, cut_impulse)
-            # self.axarr_3.set_data(cut_t, cut_impulse_noise)
-            for a in range(3):
-                self.sc.axarr[a].relim()
-                self.sc.axarr[a].autoscale_view()
-            self.set_time_limit_garps(cut_t[-1], cut_w[-1])
-            self.time_edit.setText(str(round(cut_t[-1], 2)))
-            self.depth_edit.setText(str(round(cut_x[-1], 2)))
-            self.speed_edit.setText(str(round(cut_w[-1], 2)))
-            self.impulse_edit.setText(str(round(cut_impulse[-1], 2)))
-            # self.impulse_noise_edit.setText(str(round(cut_impulse_noise[-1], 2)))
-            if cut_x[-1]:
-                self.progress_bar.setValue(int(cut_x[-1] / self.l * 100))
+            last = min(self.current_step, len(self.t)) - 1
+            self.sc.show_until(last + 1, self.set_time_limit_garps(self.t[last], self.w[last]))
+            self.time_edit.setText(str(round(self.t[last], 2)))
+            self.depth_edit.setText(str(round(self.x[last], 2)))
+            self.speed_edit.setText(str(round(self.w[last], 2)))
+            self.impulse_edit.setText(str(round(self.impulse[last], 2)))
+            # self.impulse_noise_edit.setText(str(round(self.impulse_noise[last], 2)))
+            if self.x[last]:
+                self.progress_bar.setValue(int(self.x[last] / self.l * 100))
                 self.move_pogr(self.progress_bar.value())
-            self.sc.fig.canvas.draw()
-            self.sc.fig.canvas.flush_events()
+            self.frame_meter.frame(frame_started)
+            self.fps_label.setText(
+                f'Кадр: {self.frame_meter.frame_ms:.1f} мс, {self.frame_meter.fps:.0f} кадр/с'
+            )
         else:
             self.timer.stop()
             self.started_status = 'STOP'
+            if self.replay is not None:
+                # по окончании воспроизведения масштабирование подгружает подробные данные из архива
+                self.sc.set_source(self.replay.window, self.trace_points)
             if self.progress_bar.value() != 100:
                 self.params_group_box.setTitle('Свая погружена не полностью')
             else:
@@ -240,62 +462,326 @@ class xolm(QtWidgets.QMainWindow, mainwindow.Ui_MainWindow):
             self.sender().setText('0')
 
     def start_draw(self):
+        if self.started_status == 'CALC':
+            return
+        if not self.kernel_ready or self.sc is None:
+            self.start_pending = True
+            self.params_group_box.setTitle('Загрузка модуля расчета...')
+            return
         if self.started_status == 'START':
             self.timer.stop()
             self.started_status = 'PAUSE'
             self.start_button.setText('Старт')
             self.params_group_box.setTitle('Погружение приостановлено')
         elif self.started_status == 'STOP':
-            self.started_status = 'START'
-            self.start_button.setText('Пауза')
+            self.started_status = 'CALC'
             self.params_group_box.setTitle('Расчет данных...')
-            self.axarr_0.set_data(0, 0)
-            self.axarr_1.set_data(0, 0)
-            self.axarr_2.set_data(0, 0)
-            # self.axarr_3.set_data(0, 0)
+            self.sc.clear_lines()
             self.progress_bar.setValue(0)
             self.move_pogr(0)
             self.scan_param()
-            self.x, self.t, self.w, self.impulse, self.impulse_noise = pogruzhatel_jit.main(
-                self.g,
-                self.dt,
-                self.l,
-                self.pile_perimeter,
-                self.pile_area,
-                self.M,
-                self.gamma_cr,
-                self.gamma_cf,
-                self.fi,
-                np.array(self.m_debs),
-                np.array(self.R_debs),
-                rpm_noise_scale=self.noise_coef,
-                dw=self.speed_step
-            )
-            if len(self.x) < 2700:
-                self.default_line_step = 1
-            else:
-                self.default_line_step = len(self.x) // 2700
-            self.params_group_box.setTitle('Погружение...')
-            self.dynamic_line_step = self.default_line_step * self.speed_slider.value()
-            self.timer.start(self.timer_ms)
+            self.close_replay()
+            import pogruzhatel_jit
+            # зерно шумов задаётся явно (по остальным параметрам), чтобы расчёт можно было повторить
+            # при сохранении прогона, а повторный расчёт с теми же параметрами брался из кэша
+            self.run_params = {
+                'g': self.g,
+                'dt': self.dt,
+                'l_pile': self.l,
+                'P': self.pile_perimeter,
+                'S': self.pile_area,
+                'M': self.M,
+                'gamma_cr': self.gamma_cr,
+                'gamma_cf': self.gamma_cf,
+                'fi': self.fi,
+                'm_debs': self.m_debs,
+                'R_debs': self.R_debs,
+                'rpm_noise_scale': self.noise_coef,
+                'dw': self.speed_step,
+            }
+            if self.drive_log_table is not None:
+                # обороты -- по открытой записи погружения
+                self.run_params.update(dw=0.0, t_table=self.drive_log_table[0], w_table=self.drive_log_table[1])
+            import result_cache
+            self.run_params['seed'] = result_cache.params_seed(self.run_params)
+            self.save_action.setEnabled(False)
+            if self.result_cache is None:
+                self.result_cache = result_cache.ResultCache(path=result_cache.default_path())
+            self.run_key = result_cache.params_key(self.run_params, self.trace_points)
+            result = self.result_cache.get(self.run_key)
+            if result is not None:
+                self.save_action.setEnabled(True)
+                self.show_perf(None, result)
+                self.start_playback(*result)
+                return
+            args = pogruzhatel_jit.main_args(self.run_params) + (self.trace_points,)
+            self.simulation = SimulationThread(args, self)
+            self.simulation.finished.connect(self.simulation.deleteLater)
+            self.simulation.progress.connect(self.calc_progress)
+            self.simulation.result_ready.connect(self.calc_done)
+            self.simulation.failed.connect(self.calc_failed)
+            self.simulation.start()
         elif self.started_status == 'PAUSE':
+            self.frame_meter.reset()
             self.timer.start(self.timer_ms)
             self.started_status = 'START'
             self.start_button.setText('Пауза')
             self.params_group_box.setTitle('Погружение...')
 
+    def calc_progress(self, depth, time):
+        if self.sender() is not self.simulation:
+            return
+        self.progress_bar.setValue(int(depth / self.l * 100))
+        self.params_group_box.setTitle(f'Расчет данных... {round(time, 1)} сек.')
+
+    def calc_done(self, result):
+        if self.sender() is not self.simulation:
+            return
+        stats = self.simulation.stats
+        self.simulation = None
+        result = self.result_cache.put(self.run_key, result)
+        self.save_action.setEnabled(True)
+        self.show_perf(stats, result)
+        self.start_playback(*result)
+
+    def start_playback(self, x, t, w, impulse):
+        '''
+        Начинает анимацию погружения по траекториям x, t, w, impulse.
+        '''
+        self.x, self.t, self.w, self.impulse = x, t, w, impulse
+        if len(self.x) < 2700:
+            self.default_line_step = 1
+        else:
+            self.default_line_step = len(self.x) // 2700
+        self.sc.set_series(self.t, self.x, self.w, self.impulse)
+        self.frame_meter.reset()
+        self.progress_bar.setValue(0)
+        self.started_status = 'START'
+        self.start_button.setText('Пауза')
+        self.params_group_box.setTitle('Погружение...')
+        self.dynamic_line_step = self.default_line_step * self.speed_slider.value()
+        self.timer.start(self.timer_ms)
+
+    def show_perf(self, stats, result):
+        '''
+        Показывает в строке состояния скорость расчёта, время загрузки ядра
+        и память сохранённой траектории `result` (счётчики `stats` -- см. `SimulationThread`,
+        None -- результат взят из кэша), а также счётчики кэша результатов.
+        '''
+        trace_mb = sum(a.nbytes for a in result) / 2 ** 20
+        if stats is None:
+            text = f'Расчёт: из кэша, траектория: {trace_mb:.2f} МБ'
+        else:
+            wall = stats['wall']
+            speed = stats['steps'] / wall if wall > 0 else 0.0
+            text = f'Расчёт: {wall:.2f} с, {speed / 1e6:.1f} млн шаг/с, траектория: {trace_mb:.2f} МБ'
+        if self.kernel_load_time is not None:
+            text += f', загрузка ядра: {self.kernel_load_time:.2f} с'
+        cache = self.result_cache.stats()
+        hits = cache['memory_hits'] + cache['disk_hits']
+        text += f', кэш: {hits} из {hits + cache["misses"] + cache["uncacheable"]}'
+        self.perf_label.setText(text)
+        tooltip = (
+            f'Кэш: в памяти {cache["memory_hits"]}, на диске {cache["disk_hits"]}, '
+            f'промахов {cache["misses"]}, расчётов с шумами без повтора {cache["uncacheable"]}, '
+            f'вытеснено {cache["evictions"]}'
+        )
+        if stats is not None:
+            tooltip = (
+                f'Шагов: {stats["steps"]} (простой сваи: {stats["stalled"]}), '
+                f'сохранено моментов: {stats["samples"]}, '
+                f'проверок оборотов: {stats["ticks"]}, смен оборотов: {stats["rpm_changes"]}\n'
+            ) + tooltip
+        self.perf_label.setToolTip(tooltip)
+
+    def calc_failed(self, message):
+        if self.sender() is not self.simulation:
+            return
+        self.simulation = None
+        self.started_status = 'STOP'
+        self.start_button.setText('Старт')
+        self.params_group_box.setTitle(message)
+
+    def save_run(self):
+        if self.run_params is None or self.saving is not None:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Сохранить прогон', 'run.xarc', 'Архив прогона (*.xarc)'
+        )
+        if not path:
+            return
+        self.saving = ArchiveThread(path, self.run_params, self)
+        self.saving.finished.connect(self.saving.deleteLater)
+        self.saving.progress.connect(self.save_progress)
+        self.saving.saved.connect(self.save_done)
+        self.saving.failed.connect(self.save_failed)
+        self.save_action.setEnabled(False)
+        self.saving.start()
+
+    def save_progress(self, depth, time):
+        self.statusBar().showMessage(f'Сохранение прогона... {round(time, 1)} сек.')
+
+    def save_done(self, path):
+        self.save_failed(f'Прогон сохранён: {path}')
+
+    def save_failed(self, message):
+        self.saving = None
+        self.save_action.setEnabled(self.run_params is not None)
+        self.statusBar().showMessage(message)
+
+    def open_run(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Открыть прогон', '', 'Архив прогона (*.xarc)'
+        )
+        if path:
+            self.load_run(path)
+
+    def load_run(self, path):
+        '''
+        Открывает архив прогона `path` и воспроизводит его самым грубым уровнем прореживания;
+        по окончании воспроизведения при масштабировании подгружаются подробные данные окна.
+        '''
+        if not self.kernel_ready or self.sc is None:
+            self.params_group_box.setTitle('Загрузка модуля расчета...')
+            return
+        import archive
+
+        try:
+            replay = archive.Archive(path)
+        except (OSError, ValueError) as e:
+            self.params_group_box.setTitle(f'Прогон не открыт: {e}')
+            return
+        self.stop_draw()
+        self.replay = replay
+        self.run_params = None
+        self.save_action.setEnabled(False)
+        self.l = replay.params['l_pile']
+        self.sc.clear_lines()
+        self.move_pogr(0)
+        self.perf_label.setText(f'Архив: {len(replay)} моментов, {replay.status}')
+        self.start_playback(*replay.overview(self.trace_points))
+
+    def open_drive_log(self):
+        if self.sc is None or self.log_loader is not None:
+            return
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Открыть запись погружения', '',
+            'Запись погружения (*.csv *.txt *.npy *.bin);;Все файлы (*)'
+        )
+        if path:
+            self.load_drive_log(path)
+
+    def load_drive_log(self, path):
+        '''
+        Загружает запись погружения `path` в фоновом потоке (см. `drive_log_loaded`).
+        '''
+        self.log_loader = DriveLogThread(path, self)
+        self.log_loader.finished.connect(self.log_loader.deleteLater)
+        self.log_loader.loaded.connect(self.drive_log_loaded)
+        self.log_loader.failed.connect(self.drive_log_failed)
+        self.statusBar().showMessage('Загрузка записи погружения...')
+        self.log_loader.start()
+
+    def drive_log_loaded(self, log, table):
+        '''
+        Показывает измеренную глубину записи на графике глубины (прореженную по видимому окну);
+        обороты записи становятся управлением следующих расчётов.
+        '''
+        self.log_loader = None
+        self.drive_log = log
+        self.drive_log_table = table
+        self.sc.set_measured(log.window if log.x is not None else None, self.trace_points)
+        self.close_log_action.setEnabled(True)
+        message = f'Запись погружения: моментов -- {len(log)}'
+        if table is not None:
+            message += f', строк таблицы оборотов -- {len(table[0])}'
+        self.statusBar().showMessage(message)
+
+    def drive_log_failed(self, message):
+        self.log_loader = None
+        self.statusBar().showMessage(message)
+
+    def close_drive_log(self):
+        self.drive_log = None
+        self.drive_log_table = None
+        self.sc.set_measured(None)
+        self.close_log_action.setEnabled(False)
+        self.statusBar().clearMessage()
+
+    def close_replay(self):
+        if self.replay is not None:
+            self.sc.set_source(None)
+            self.replay.close()
+            self.replay = None
+
     def stop_draw(self):
+        self.start_pending = False
+        if self.simulation is not None:
+            self.simulation.cancel()
+            self.simulation = None
         self.timer.stop()
         self.started_status = 'STOP'
         self.start_button.setText('Старт')
         self.params_group_box.setTitle('Погружение не начато')
         self.current_step = 0
 
+    def closeEvent(self, event):
+        if self.simulation is not None:
+            self.simulation.cancel()
+            self.simulation.wait()
+        if self.saving is not None:
+            self.saving.cancel()
+            self.saving.wait()
+        self.kernel_loader.wait()
+        super().closeEvent(event)
+
+
+def profile_startup():
+    '''
+    Перезапускает приложение с `-X importtime` и печатает время этапов запуска
+    и время импорта по пакетам (собственное время всех модулей пакета).
+    '''
+    started = perf_counter()
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', __file__, '--profile-startup'],
+        capture_output=True, text=True,
+    )
+    total = perf_counter() - started
+    print(child.stdout.rstrip())
+    print(f'{"всего от запуска процесса":<44} {total:>16.3f}')
+
+    packages = {}
+    for line in child.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    print()
+    print(f'{"пакет":<44} {"импорт, с":>16}')
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:15]:
+        print(f'{package:<44} {self_us / 1e6:>16.3f}')
+    if child.returncode:
+        print(child.stderr[-2000:], file=sys.stderr)
+
 
 def main():
+    profile = None
+    if '--profile-startup' in sys.argv:
+        if 'importtime' not in sys._xoptions:
+            profile_startup()
+            return
+        profile = StartupProfile(STARTED)
+        profile.mark('импорт PyQt5 и формы')
     app = QtWidgets.QApplication(sys.argv)
-    main_window = xolm()
+    if profile:
+        profile.mark('QApplication')
+    main_window = xolm(profile)
+    if profile:
+        profile.mark('окно (setupUi)')
     main_window.show()
+    if profile:
+        profile.mark('окно показано')
     app.exec_()
 
 
@@ -1,9 +1,16 @@
+import hashlib
 import math
+import os
+import time
+from collections import namedtuple
 
-import matplotlib.pyplot as plt
+import numba
 import numpy as np
 from numba import jit
 
+import counter_rng
+import decimation
+
 
 @jit(nopython=True, cache=True)
 def resist(x: float, gamma_cr: float, S: float) -> float:
@@ -29,22 +36,96 @@ def resist(x: float, gamma_cr: float, S: float) -> float:
     return 6900 * 1000 * gamma_cr * S
 
 
+@jit(nopython=True, cache=True)
+def soil_profile(soil_depth, soil_tip, soil_side, gamma_cr, S, P, fi):
+    '''
+    Возвращает массивы слоёв грунта для ядра расчёта (см. `soil_layer`):
+    глубины кровли слоёв (м), лобовое сопротивление сваи в каждом слое (Н),
+    трение по боковой поверхности на кровле слоя (Н) и его прирост на метр глубины (Н/м).
+    Трение на кровле слоя -- сумма трения по всем вышележащим слоям, поэтому трение
+    на любой глубине считается без суммирования по слоям.
+    Без профиля (пустой `soil_depth`) грунт однороден: лобовое сопротивление `resist`,
+    трение `P * fi * x`.
+    soil_depth -- глубины кровли слоёв по возрастанию (м), первая -- 0;
+    soil_tip -- расчётное сопротивление грунта под нижним концом сваи в каждом слое
+                (в тех же единицах, что и у `resist`);
+    soil_side -- расчётное сопротивление по боковой поверхности в каждом слое (как `fi`).
+    '''
+    if soil_depth.shape[0] == 0:
+        return np.zeros(1), np.array([resist(0.0, gamma_cr, S)]), np.zeros(1), np.array([P * fi])
+
+    n = soil_depth.shape[0]
+    if soil_tip.shape[0] != n or soil_side.shape[0] != n:
+        raise ValueError('Длины soil_depth, soil_tip и soil_side должны совпадать')
+    if soil_depth[0] != 0.0 or (soil_depth[1:] <= soil_depth[:-1]).any():
+        raise ValueError('Глубины слоёв грунта должны возрастать, начиная с 0')
+    tip = np.empty(n)
+    cum = np.empty(n)
+    rate = np.empty(n)
+    for k in range(n):
+        tip[k] = soil_tip[k] * gamma_cr * S
+        rate[k] = P * soil_side[k]
+        if k == 0:
+            cum[k] = 0.0
+        else:
+            cum[k] = cum[k - 1] + rate[k - 1] * (soil_depth[k] - soil_depth[k - 1])
+    return soil_depth.copy(), tip, cum, rate
+
+
+@jit(nopython=True, cache=True)
+def soil_layer(depth: np.ndarray, x: float, layer: int) -> int:
+    '''
+    Возвращает номер слоя грунта (см. `soil_profile`), в котором находится глубина `x`.
+    Поиск начинается со слоя `layer` (слоя на предыдущем шаге), а за шаг расчёта свая
+    проходит не больше одного слоя, поэтому время поиска не зависит от количества слоёв.
+    Лобовое сопротивление на глубине `x` -- `tip[layer]`,
+    трение по боковой поверхности -- `cum[layer] + rate[layer] * (x - depth[layer])`.
+    '''
+    while layer + 1 < depth.shape[0] and x >= depth[layer + 1]:
+        layer += 1
+    while layer > 0 and x < depth[layer]:
+        layer -= 1
+    return layer
+
+
 @jit(nopython=True, cache=True)
 def xi(x, i, fimp, P, ft, dtm, fi, fls):
     '''
     Считает глубину погружения в момент времени `i`.
     '''
-    f = x[i - 1] - x[i - 2] + ft * dtm + fimp * dtm
-    fbs = P * fi * x[i - 1]
+    return xi_next(x[i - 1], x[i - 2], i, fimp, P, ft, dtm, fi, fls)
+
+
+@jit(nopython=True, cache=True)
+def xi_next(x_1, x_2, i, fimp, P, ft, dtm, fi, fls):
+    '''
+    Считает глубину погружения в момент времени `i` по глубинам
+    в два предыдущих момента: `x_1 = x[i - 1]`, `x_2 = x[i - 2]`.
+    '''
+    x_i = depth_step(x_1, x_2, fimp, ft, dtm, fls, P * fi * x_1)
+    if x_i != x_i:
+        raise ZeroDivisionError('Свая сломалась на итерации', i)
+    return x_i
+
+
+@jit(nopython=True, cache=True)
+def depth_step(x_1, x_2, fimp, ft, dtm, fls, fbs):
+    '''
+    Шаг `xi_next` с сопротивлением грунта, заданным явно (см. `soil_layer`).
+    x_1, x_2 -- глубины в два предыдущих момента;
+    fls, fbs -- лобовое сопротивление и трение по боковой поверхности на глубине `x_1`.
+    Если свая сломалась, возвращает nan (исключение в ядре не отличить от других ошибок,
+    см. `check_broken`).
+    '''
+    f = x_1 - x_2 + ft * dtm + fimp * dtm
 
     if f > 0:
-        return x[i - 1] + max(max(f - fls * dtm, 0) - fbs * dtm, 0)
+        return x_1 + max(max(f - fls * dtm, 0) - fbs * dtm, 0)
 
     if f + ft + fbs * dtm < 0:
-        print('Свая сломалась на', i, 'итерации :(')
-        1 / 0
+        return math.nan
 
-    return x[i - 1] + min(f + fbs * dtm, 0)
+    return x_1 + min(f + fbs * dtm, 0)
 
 
 @jit(nopython=True, cache=True)
@@ -53,6 +134,193 @@ def get_fimp_el(m: float, R: float, w0: float, k: float, theta: float, theta_noi
 
 
 @jit(nopython=True, cache=True)
+def debalance_amplitudes(m_debs: np.ndarray, R_debs: np.ndarray) -> np.ndarray:
+    '''
+    Возвращает постоянные множители силы каждой пары дебалансов `m_k * R_k * (2π(k + 1))^2`.
+    Сила пары при оборотах `w0` равна множителю, умноженному на `w0^2 * cos(фаза)`.
+    m_debs -- массы дебалансов (с учётом шумов);
+    R_debs -- радиусы дебалансов (с учётом шумов).
+    '''
+    n = min(len(m_debs), len(R_debs))
+    amp = np.empty(n)
+    for k in range(n):
+        amp[k] = m_debs[k] * R_debs[k] * (2 * math.pi * (k + 1)) ** 2
+    return amp
+
+
+@jit(nopython=True, cache=True)
+def phase_rotation(w0: float, dt: float, rot_re: np.ndarray, rot_im: np.ndarray) -> None:
+    '''
+    Заполняет `rot_re`, `rot_im` косинусами и синусами приращения фазы каждой пары
+    дебалансов за шаг `dt` при оборотах `w0`. Пересчитывается только при смене `w0`.
+    '''
+    for k in range(rot_re.shape[0]):
+        d_theta = w0 * (k + 1) * dt * 2 * math.pi
+        rot_re[k] = math.cos(d_theta)
+        rot_im[k] = math.sin(d_theta)
+
+
+@jit(nopython=True, cache=True)
+def fimp_step(amp: np.ndarray, w0: float, ph_re: np.ndarray, ph_im: np.ndarray,
+              rot_re: np.ndarray, rot_im: np.ndarray) -> float:
+    '''
+    Поворачивает фазоры пар дебалансов (`ph_re`, `ph_im`) на один шаг и возвращает
+    суммарную силу импульса. Не выделяет память и не вызывает `cos` на каждом шаге.
+    amp -- множители из `debalance_amplitudes`;
+    w0 -- текущее количество оборотов в секунду;
+    rot_re, rot_im -- поворот фазы за шаг из `phase_rotation`.
+    '''
+    fimp = 0.0
+    for k in range(amp.shape[0]):
+        re = ph_re[k] * rot_re[k] - ph_im[k] * rot_im[k]
+        im = ph_re[k] * rot_im[k] + ph_im[k] * rot_re[k]
+        ph_re[k] = re
+        ph_im[k] = im
+        fimp += amp[k] * re
+    return fimp * w0 * w0
+
+
+@jit(nopython=True, cache=True)
+def normalize_phasors(ph_re: np.ndarray, ph_im: np.ndarray) -> None:
+    '''
+    Возвращает фазоры на единичную окружность, компенсируя накопление ошибки округления.
+    '''
+    for k in range(ph_re.shape[0]):
+        norm = math.sqrt(ph_re[k] * ph_re[k] + ph_im[k] * ph_im[k])
+        ph_re[k] /= norm
+        ph_im[k] /= norm
+
+
+@jit(nopython=True, cache=True)
+def fimp_at(amp: np.ndarray, w0: float, ph_re: np.ndarray, ph_im: np.ndarray, theta: float) -> float:
+    '''
+    Возвращает суммарную силу импульса в момент, когда фаза первой пары дебалансов
+    повернётся на `theta` от текущей (фаза пары `k` -- на `(k + 1) * theta`). Фазоры не меняются.
+    '''
+    c = math.cos(theta)
+    s = math.sin(theta)
+    re_k = c
+    im_k = s
+    fimp = 0.0
+    for k in range(amp.shape[0]):
+        fimp += amp[k] * (ph_re[k] * re_k - ph_im[k] * im_k)
+        re_k, im_k = re_k * c - im_k * s, re_k * s + im_k * c
+    return fimp * w0 * w0
+
+
+@jit(nopython=True, cache=True)
+def rotate_phasors(ph_re: np.ndarray, ph_im: np.ndarray, theta: float) -> None:
+    '''
+    Поворачивает фазоры пар дебалансов: фазу пары `k` -- на `(k + 1) * theta`.
+    '''
+    c = math.cos(theta)
+    s = math.sin(theta)
+    re_k = c
+    im_k = s
+    for k in range(ph_re.shape[0]):
+        re = ph_re[k] * re_k - ph_im[k] * im_k
+        im = ph_re[k] * im_k + ph_im[k] * re_k
+        ph_re[k] = re
+        ph_im[k] = im
+        re_k, im_k = re_k * c - im_k * s, re_k * s + im_k * c
+
+
+@jit(nopython=True, cache=True)
+def fimp_bounds(amp: np.ndarray, w0: float, ph_re: np.ndarray, ph_im: np.ndarray):
+    '''
+    Возвращает скорость изменения силы импульса в текущий момент и оценку сверху
+    модуля её второй производной по времени при оборотах `w0`.
+    '''
+    rate = 0.0
+    curvature = 0.0
+    for k in range(amp.shape[0]):
+        omega = 2 * math.pi * (k + 1) * w0
+        rate -= amp[k] * omega * ph_im[k]
+        curvature += abs(amp[k]) * omega * omega
+    return rate * w0 * w0, curvature * w0 * w0
+
+
+@jit(nopython=True, cache=True)
+def trajectory_capacity(dt: float, dw: float, t_table: np.ndarray, tol: float = 0.0) -> int:
+    '''
+    Возвращает начальную ёмкость буферов траектории (количество моментов времени).
+    При табличном управлении расчёт заканчивается вскоре после `t_table[-1]`,
+    поэтому ёмкость оценивается сверху; при управлении шагом `dw` и при переменном
+    шаге (`tol`) количество моментов заранее неизвестно, и буферы растут удвоением
+    (см. `grow_buffer`).
+    dt -- шаг по времени;
+    dw -- шаг по количеству оборотов в секунду;
+    t_table -- табличные данные времени;
+    tol -- допустимая погрешность расчёта с переменным шагом (см. `main`).
+    '''
+    period = int(1 / dt)
+    if tol:
+        return period
+    if dw:
+        return 64 * period
+    return int(t_table[-1] / dt) + 2 * period + 3
+
+
+@jit(nopython=True, cache=True)
+def grow_buffer(buf: np.ndarray, size: int) -> np.ndarray:
+    '''
+    Возвращает буфер удвоенной ёмкости, в который скопированы первые `size` значений `buf`.
+    '''
+    new_buf = np.empty(buf.shape[0] * 2, dtype=buf.dtype)
+    new_buf[:size] = buf[:size]
+    return new_buf
+
+
+# ячейки массива управления расчётом `control` (см. `simulate`)
+CONTROL_CANCEL = 0  # признак отмены, выставляется вызывающей стороной
+CONTROL_X = 1  # текущая глубина погружения, обновляется ядром
+CONTROL_T = 2  # текущее время расчёта, обновляется ядром
+CONTROL_PROFILE = 3  # признак замера времени этапов расчёта, выставляется вызывающей стороной
+# счётчики расчёта, обновляются ядром вместе с глубиной и временем (см. `update_counters`)
+CONTROL_STEPS = 4  # пройдено моментов времени (шагов)
+CONTROL_STALLED = 5  # из них пропущено как простой неподвижной сваи (`fill_stalled`)
+CONTROL_SAMPLES = 6  # сохранено моментов времени (остальные отброшены прореживанием `max_points`)
+CONTROL_TICKS = 7  # проверок оборотов
+CONTROL_RPM_CHANGES = 8  # смен оборотов
+CONTROL_GROWTHS = 9  # увеличений буферов траектории (`grow_buffer`)
+# время этапов (с), замеряется только при `control[CONTROL_PROFILE]`
+CONTROL_TIME_STEPS = 10  # расчёт шагов (`advance_into`)
+CONTROL_TIME_STORE = 11  # прореживание, увеличение и копирование буферов траектории
+CONTROL_SIZE = 12
+
+
+@jit(nopython=True, cache=True)
+def clock() -> float:
+    '''
+    Возвращает `time.perf_counter()` (с). Вызов захватывает GIL, поэтому
+    используется только для замеров времени этапов (`CONTROL_PROFILE`), раз на порцию шагов.
+    В AOT-модуле переход в objmode на порядки медленнее, поэтому замеры -- только в JIT-версии
+    (см. `instrumented`).
+    '''
+    with numba.objmode(now='float64'):
+        now = time.perf_counter()
+    return now
+
+
+@jit(nopython=True, cache=True)
+def update_counters(state, control, size):
+    '''
+    Записывает в `control` счётчики расчёта из состояния `state` (`CONTROL_STEPS` и далее).
+    size -- количество сохранённых моментов времени.
+    '''
+    scal = state.scal
+    i = int(scal[S_I])
+    control[CONTROL_STEPS] = i
+    control[CONTROL_STALLED] = scal[S_STALLED]
+    control[CONTROL_SAMPLES] = size
+    if scal[S_TOL]:
+        control[CONTROL_TICKS] = scal[S_TICK]
+    else:
+        control[CONTROL_TICKS] = max(i - 1, 0) // int(scal[S_PERIOD])
+    control[CONTROL_RPM_CHANGES] = scal[S_RPM_CHANGES]
+
+
+@jit(nopython=True, nogil=True, cache=True)
 def main(
     g, dt, l_pile, P, S, M,
     gamma_cr, gamma_cf,
@@ -64,10 +332,14 @@ def main(
     m_debs_noise_scale=0.0,
     R_debs_noise_scale=0.0,
     dw=0.0,
-    t_table=np.array([0.0]), w_table=np.array([0.0])
+    t_table=np.array([0.0]), w_table=np.array([0.0]),
+    tol=0.0,
+    soil_depth=np.zeros(0), soil_tip=np.zeros(0), soil_side=np.zeros(0),
+    seed=-1,
+    max_points=0
 ):
     '''
-    Получение данных по погружению:
+    Получение данных по погружению (массивы float64 одинаковой длины):
     x -- глубина погружения;
     t -- время погружения;
     w -- количество оборотов в секунду;
@@ -93,91 +365,1459 @@ def main(
     R_debs_noise_scale -- шумы (cлучайные выборки из нормального (гауссовского) распределения) для радиусов дебалансов, по умолчанию не используется;
     dw -- шаг по количеству оборотов в секунду, по умолчанию не используется;
     t_table -- табличные данные времени, по умолчанию не используется;
-    w_table -- табличные данные оборотов, по умолчанию не используется.
+    w_table -- табличные данные оборотов, по умолчанию не используется;
+    tol -- допустимая погрешность глубины погружения за шаг (м) для расчёта с переменным шагом,
+           по умолчанию (0) расчёт идёт с постоянным шагом `dt`. Иначе шаг выбирается по оценке
+           погрешности, а моменты переключения оборотов и достижения глубины `l_pile`
+           находятся точно (см. `advance_adaptive_into`); моменты времени неравномерны;
+    soil_depth -- глубины кровли слоёв грунта по возрастанию (м), первая -- 0, по умолчанию
+                  грунт однороден (`resist` и `fi`). Ниже последней глубины -- последний слой;
+    soil_tip -- расчётное сопротивление грунта под нижним концом сваи в каждом слое (как в `resist`),
+                умножается на `gamma_cr * S`;
+    soil_side -- расчётное сопротивление по боковой поверхности в каждом слое (как `fi`);
+    seed -- зерно потока случайных чисел для шумов (см. `counter_rng`), по умолчанию (-1)
+            выбирается случайно. С одним и тем же зерном расчёт повторяется в точности;
+    max_points -- наибольшее количество сохраняемых моментов времени, по умолчанию (0) сохраняются все.
+                  Иначе моменты группируются и от каждой группы сохраняются моменты с наименьшей
+                  и наибольшей силой импульса (см. `decimation`), так что огибающая колебаний
+                  импульса сохраняется, а объём данных не зависит от длительности расчёта.
     '''
 
-    n = max(len(m_debs), len(R_debs))
+    return simulate(
+        g, dt, l_pile, P, S, M,
+        gamma_cr, gamma_cf,
+        fi,
+        m_debs, R_debs,
+        m_debs_custom_noise, R_debs_custom_noise,
+        theta_noise,
+        rpm_noise_scale,
+        m_debs_noise_scale,
+        R_debs_noise_scale,
+        dw,
+        t_table, w_table,
+        tol,
+        soil_depth, soil_tip, soil_side,
+        seed,
+        max_points,
+        np.zeros(CONTROL_SIZE)
+    )
+
+
+# состояние расчёта, см. `init_state`:
+# scal -- скалярные параметры и переменные состояния (ячейки `S_*`);
+# amp -- постоянные множители сил пар дебалансов (`debalance_amplitudes`);
+# ph_re, ph_im -- фазоры пар дебалансов;
+# rot_re, rot_im -- поворот фазоров за шаг при текущих оборотах;
+# t_table, w_table -- табличные данные времени и оборотов;
+# soil_depth, soil_tip, soil_cum, soil_rate -- слои грунта (`soil_profile`);
+# rng -- ключ потока случайных чисел и номер следующего равномерного числа (uint64, см. `counter_rng`);
+# noise -- текущий блок нормальных чисел (следующее -- `noise[scal[S_NOISE_POS]]`).
+SimState = namedtuple('SimState', (
+    'scal', 'amp', 'ph_re', 'ph_im', 'rot_re', 'rot_im', 't_table', 'w_table',
+    'soil_depth', 'soil_tip', 'soil_cum', 'soil_rate', 'rng', 'noise'
+))
+
+# ячейки `SimState.scal`
+S_G = 0
+S_DT = 1
+S_L_PILE = 2
+S_P = 3
+S_S = 4
+S_GAMMA_CR = 5
+S_FI = 6
+S_RPM_NOISE_SCALE = 7
+S_DW = 8
+S_DTM = 9
+S_FT = 10
+S_PERIOD = 11
+S_N = 12  # количество пар дебалансов
+S_I = 13  # порядковый номер следующего момента времени
+S_X_1 = 14  # глубина в момент `i - 1`
+S_X_2 = 15  # глубина в момент `i - 2`
+S_X_CHECK = 16  # глубина в момент последней проверки оборотов (`i - period`)
+S_W0 = 17  # текущее количество оборотов в секунду
+S_T_INDEX = 18  # номер следующей строки табличных данных
+S_STATUS = 19  # причина окончания расчёта (`STATUS_*`)
+# расчёт с переменным шагом (`tol`), см. `advance_adaptive_into`
+S_TOL = 20
+S_M = 21
+S_T = 22  # время в момент `i - 1`
+S_V = 23  # скорость погружения в момент `i - 1`
+S_H = 24  # пробный размер следующего шага
+S_TICK = 25  # количество пройденных проверок оборотов (раз в `period * dt` секунд)
+S_MODE = 26  # направление движения сваи: 1 -- вниз, -1 -- вверх, 0 -- свая неподвижна
+S_LAYER = 27  # слой грунта на глубине `x[i - 1]` (см. `soil_layer`)
+S_NOISE_POS = 28  # номер следующего числа в блоке `SimState.noise`
+S_STALLED = 29  # количество шагов, пропущенных как простой сваи (`fill_stalled`)
+S_RPM_CHANGES = 30  # количество смен оборотов
+S_SIZE = 31
+
+# причины окончания расчёта
+STATUS_RUNNING = 0  # расчёт не окончен
+STATUS_FULL_DEPTH = 1  # свая погружена на всю длину
+STATUS_REFUSAL = 2  # обороты достигли критических 50 об./с
+STATUS_TABLE_END = 3  # закончились табличные данные
+STATUS_BROKEN = 4  # свая сломалась (только в итогах `run_summary`)
+STATUS_NAMES = {
+    STATUS_RUNNING: 'cancelled',
+    STATUS_FULL_DEPTH: 'full_depth',
+    STATUS_REFUSAL: 'refusal',
+    STATUS_TABLE_END: 'table_end',
+    STATUS_BROKEN: 'broken',
+}
+
+# ячейки итогов расчёта без траектории (`run_summary`)
+SUMMARY_STATUS = 0  # причина окончания расчёта (`STATUS_*`)
+SUMMARY_T_END = 1  # время в конце расчёта
+SUMMARY_X_END = 2  # глубина в конце расчёта
+SUMMARY_W_END = 3  # обороты в конце расчёта
+SUMMARY_IMPULSE_MAX = 4  # наибольший модуль силы импульса
+SUMMARY_IMPULSE_RMS = 5  # среднеквадратичная по времени сила импульса
+SUMMARY_W_REFUSAL = 6  # обороты при отказе (nan, если отказа не было)
+SUMMARY_STEPS = 7  # пройдено моментов времени (шагов)
+SUMMARY_SIZE = 8
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def simulate(
+    g, dt, l_pile, P, S, M,
+    gamma_cr, gamma_cf,
+    fi,
+    m_debs, R_debs,
+    m_debs_custom_noise, R_debs_custom_noise,
+    theta_noise,
+    rpm_noise_scale,
+    m_debs_noise_scale,
+    R_debs_noise_scale,
+    dw,
+    t_table, w_table,
+    tol,
+    soil_depth, soil_tip, soil_side,
+    seed,
+    max_points,
+    control
+):
+    '''
+    Расчёт погружения `main` с управлением из другого потока (ядро не держит GIL).
+    Все параметры `main` обязательны, дополнительно:
+    control -- массив из `CONTROL_SIZE` элементов. Раз в секунду модельного времени ядро
+               записывает в `control[CONTROL_X]` и `control[CONTROL_T]` текущие глубину и время,
+               а в `control[CONTROL_STEPS]` и далее -- счётчики расчёта (см. `update_counters`),
+               и прекращает расчёт, если `control[CONTROL_CANCEL]` не равен нулю.
+               Возвращаются данные, посчитанные до отмены. Если `control[CONTROL_PROFILE]`
+               не равен нулю, в `control[CONTROL_TIME_STEPS]` и `control[CONTROL_TIME_STORE]`
+               накапливается время этапов расчёта (см. `counters`).
+    '''
+    state = init_state(
+        g, dt, l_pile, P, S, M,
+        gamma_cr, gamma_cf,
+        fi,
+        m_debs, R_debs,
+        m_debs_custom_noise, R_debs_custom_noise,
+        theta_noise,
+        rpm_noise_scale,
+        m_debs_noise_scale,
+        R_debs_noise_scale,
+        dw,
+        t_table, w_table,
+        tol,
+        soil_depth, soil_tip, soil_side,
+        seed
+    )
+    if max_points:
+        return run_minmax(state, max_points, control)
+    return run_full(state, control)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def run_full(state, control):
+    '''
+    Доводит расчёт из состояния `state` до конца, сохраняя все моменты времени (см. `simulate`).
+    '''
+    dt = state.scal[S_DT]
+    period = int(state.scal[S_PERIOD])
+
+    # буферы траектории, по окончании расчёта обрезаются до фактической длины
+    capacity = max(
+        trajectory_capacity(dt, state.scal[S_DW], state.t_table, state.scal[S_TOL]),
+        period
+    )
+    x = np.empty(capacity)  # глубина погружения в каждый момент времени
+    t = np.empty(capacity)  # моменты времени
+    w = np.empty(capacity)  # количество оборотов в секунду в каждый момент времени
+    all_impulse = np.empty(capacity)  # сила импульса в каждый момент времени
+
+    profile = control[CONTROL_PROFILE] != 0
+    size = 0
+    while state.scal[S_STATUS] == STATUS_RUNNING:
+        if profile:
+            clock_0 = clock()
+        if size + period > x.shape[0]:
+            x = grow_buffer(x, size)
+            t = grow_buffer(t, size)
+            w = grow_buffer(w, size)
+            all_impulse = grow_buffer(all_impulse, size)
+            control[CONTROL_GROWTHS] += 1
+        if profile:
+            clock_1 = clock()
+            control[CONTROL_TIME_STORE] += clock_1 - clock_0
+        size = advance_into(state, x, t, w, all_impulse, size, size + period)
+        if profile:
+            control[CONTROL_TIME_STEPS] += clock() - clock_1
+        control[CONTROL_X] = x[size - 1]
+        control[CONTROL_T] = t[size - 1]
+        update_counters(state, control, size)
+        if control[CONTROL_CANCEL]:
+            break
+    check_broken(state)
+
+    if profile:
+        clock_0 = clock()
+    x, t, w, all_impulse = x[:size].copy(), t[:size].copy(), w[:size].copy(), all_impulse[:size].copy()
+    if profile:
+        control[CONTROL_TIME_STORE] += clock() - clock_0
+    return x, t, w, all_impulse
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def run_minmax(state, max_points, control):
+    '''
+    Доводит расчёт из состояния `state` до конца, сохраняя не более `max_points` (но не меньше 6)
+    моментов времени:
+    по два момента (наименьшая и наибольшая сила импульса) на группу из `bucket` шагов.
+    Когда буферы заполняются, соседние группы объединяются, а размер группы удваивается.
+    Первый и последний моменты расчёта сохраняются всегда, повторы моментов удаляются.
+    '''
+    period = int(state.scal[S_PERIOD])
+    # объединение групп не сокращает две последние точки, поэтому в буферах не меньше четырёх
+    capacity = max(max_points, 6) // 2 * 2 - 2
+    x = np.empty(capacity)
+    t = np.empty(capacity)
+    w = np.empty(capacity)
+    all_impulse = np.empty(capacity)
+
+    # промежуточные буферы одной порции шагов
+    chunk_x = np.empty(period)
+    chunk_t = np.empty(period)
+    chunk_w = np.empty(period)
+    chunk_impulse = np.empty(period)
+
+    profile = control[CONTROL_PROFILE] != 0
+    bucket = 1
+    size = 0
+    first = True
+    first_x = first_t = first_w = first_impulse = 0.0
+    while state.scal[S_STATUS] == STATUS_RUNNING:
+        chunk = bucket * max(period // bucket, 1)
+        if chunk > chunk_x.shape[0]:
+            chunk_x = np.empty(chunk)
+            chunk_t = np.empty(chunk)
+            chunk_w = np.empty(chunk)
+            chunk_impulse = np.empty(chunk)
+            control[CONTROL_GROWTHS] += 1
+        if profile:
+            clock_0 = clock()
+        filled = advance_into(state, chunk_x, chunk_t, chunk_w, chunk_impulse, 0, chunk)
+        if profile:
+            clock_1 = clock()
+            control[CONTROL_TIME_STEPS] += clock_1 - clock_0
+        if first:
+            first_x = chunk_x[0]
+            first_t = chunk_t[0]
+            first_w = chunk_w[0]
+            first_impulse = chunk_impulse[0]
+            first = False
+        while size + 2 * ((filled + bucket - 1) // bucket) > capacity:
+            size = decimation.minmax_merge(x, t, w, all_impulse, size)
+            bucket *= 2
+        size = decimation.minmax_append(
+            chunk_x, chunk_t, chunk_w, chunk_impulse, 0, filled, bucket,
+            x, t, w, all_impulse, size
+        )
+        if profile:
+            control[CONTROL_TIME_STORE] += clock() - clock_1
+        control[CONTROL_X] = chunk_x[filled - 1]
+        control[CONTROL_T] = chunk_t[filled - 1]
+        update_counters(state, control, size)
+        if control[CONTROL_CANCEL]:
+            break
+    check_broken(state)
+
+    size = decimation.drop_repeats(x, t, w, all_impulse, size)
+    # первый и последний моменты расчёта сохраняются всегда
+    head = 1 if t[0] != first_t else 0
+    tail = 1 if t[size - 1] != chunk_t[filled - 1] else 0
+    out_x = np.empty(head + size + tail)
+    out_t = np.empty(head + size + tail)
+    out_w = np.empty(head + size + tail)
+    out_impulse = np.empty(head + size + tail)
+    if head:
+        out_x[0] = first_x
+        out_t[0] = first_t
+        out_w[0] = first_w
+        out_impulse[0] = first_impulse
+    out_x[head:head + size] = x[:size]
+    out_t[head:head + size] = t[:size]
+    out_w[head:head + size] = w[:size]
+    out_impulse[head:head + size] = all_impulse[:size]
+    if tail:
+        out_x[head + size] = chunk_x[filled - 1]
+        out_t[head + size] = chunk_t[filled - 1]
+        out_w[head + size] = chunk_w[filled - 1]
+        out_impulse[head + size] = chunk_impulse[filled - 1]
+    control[CONTROL_SAMPLES] = head + size + tail
+    return out_x, out_t, out_w, out_impulse
+
+
+@jit(nopython=True, cache=True)
+def next_control_event(state, n_cycle, per_second):
+    '''
+    Возвращает номер шага ближайшей проверки оборотов, на которой обороты могут измениться
+    или расчёт окончиться (расчёт с постоянным шагом). При табличном управлении это первая
+    проверка после очередного `t_table`; при управлении шагом `dw` -- ближайшая проверка,
+    если только свая не погружается за секунду заведомо больше чем на 1 см
+    (`per_second` -- ожидаемое погружение за секунду, м).
+    '''
+    scal = state.scal
+    dt = scal[S_DT]
+    period = int(scal[S_PERIOD])
+    i = int(scal[S_I])
+    tick = (i + period - 1) // period
+    if scal[S_DW]:
+        if per_second >= 0.02:
+            # за время перескока обороты не меняются; ограничение -- погрешность осреднения
+            return (tick + 1000) * period
+        return tick * period
+    curr_t_index = int(scal[S_T_INDEX])
+    if curr_t_index >= len(state.t_table):
+        return tick * period
+    while dt * (tick * period) <= state.t_table[curr_t_index]:
+        tick += 1
+    return tick * period
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def run_envelope(state, cycle_tol, control):
+    '''
+    Доводит расчёт с постоянным шагом из состояния `state` до конца, перескакивая целые
+    периоды силы импульса. При постоянных оборотах сила импульса периодична, и за каждый
+    период свая погружается почти на ту же величину, что и за предыдущий; из-за роста трения
+    по боковой поверхности с глубиной погружение за период убывает почти геометрически.
+    Периоды считаются полностью по одному. По двум последним посчитанным периодам расчёт
+    перескакивает через K периодов: погружение за период и приращение глубины за последний
+    шаг периода (скорость сваи) экстраполируются геометрическими прогрессиями, фазы
+    дебалансов поворачиваются на время перескока. Период после перескока снова считается
+    полностью; по расхождению с экстраполяцией оценивается погрешность перескока -- она
+    прибавляется к оценке погрешности осреднения, и по ней выбирается следующий K
+    (так, чтобы погрешность перескока была около `cycle_tol`, м).
+    Перед ближайшей проверкой оборотов, на которой обороты могут измениться
+    (`next_control_event`), и перед достижением глубины `l_pile` всегда остаются полностью
+    посчитанные периоды. При нулевых оборотах «периодом» считается десятая доля секунды,
+    при шумах оборотов перескоков нет.
+    Возвращает x, t, w, all_impulse (см. `main`; после перескока сохраняется один момент)
+    и err -- накопленную оценку погрешности осреднения глубины (м) в каждый момент.
+    '''
+    scal = state.scal
+    dt = scal[S_DT]
+    period = int(scal[S_PERIOD])
+    l_pile = scal[S_L_PILE]
+    capacity = 64 * period
+    x = np.empty(capacity)
+    t = np.empty(capacity)
+    w = np.empty(capacity)
+    all_impulse = np.empty(capacity)
+    err = np.empty(capacity)
+
+    err_total = 0.0
+    k_next = 4  # количество периодов следующего перескока
+    # последний полностью посчитанный период: шаг его окончания, обороты,
+    # погружение за период и приращение глубины за последний шаг
+    last_i = -1
+    last_w0 = 0.0
+    last_delta = 0.0
+    last_d = 0.0
+    # последний перескок, ещё не проверенный расчётом следующего периода
+    pending_k = 0
+    pending_delta = 0.0  # ожидаемое погружение за период после перескока
+    pending_d = 0.0  # ожидаемое приращение глубины за шаг в конце этого периода
+    pending_correction = 0.0
+    size = 0
+    while scal[S_STATUS] == STATUS_RUNNING:
+        if size + 2 * period + 1 > x.shape[0]:
+            x = grow_buffer(x, size)
+            t = grow_buffer(t, size)
+            w = grow_buffer(w, size)
+            all_impulse = grow_buffer(all_impulse, size)
+            err = grow_buffer(err, size)
+            control[CONTROL_GROWTHS] += 1
+        start = size
+        i = int(scal[S_I])
+        w0 = scal[S_W0]
+        n_cycle = int(round(1 / (w0 * dt))) if w0 > 0 else period // 10
+        remaining = next_control_event(state, n_cycle, 0.0) - i + 1
+
+        if i < 2 or scal[S_RPM_NOISE_SCALE] or n_cycle > period or n_cycle > remaining:
+            size = advance_into(state, x, t, w, all_impulse, size, size + min(remaining, period))
+        else:
+            x_a = scal[S_X_1]
+            size = advance_into(state, x, t, w, all_impulse, size, size + n_cycle)
+            delta = scal[S_X_1] - x_a
+            d = scal[S_X_1] - scal[S_X_2]
+            # изменение погружения за период: знаменатель геометрической прогрессии `ratio`
+            # или, если погружения разных знаков либо растут, разность `slope`
+            cycles = 0
+            if pending_k:
+                # проверка перескока: расхождение погружения за период и скорости в конце периода
+                err_jump = pending_k * abs(delta - pending_delta) / 2 + abs(d - pending_d) * n_cycle
+                err_total += err_jump
+                if err_jump > 0:
+                    factor = 0.9 * (cycle_tol / err_jump) ** (1 / 3)
+                    k_next = max(int(pending_k * min(4.0, max(0.25, factor))), 1)
+                else:
+                    k_next = 4 * pending_k
+                cycles = pending_k + 1
+                pending_k = 0
+            elif last_i == i and last_w0 == w0:
+                cycles = 1
+            ratio = 0.0
+            slope = 0.0
+            if cycles and delta * last_delta > 0 and abs(delta) <= abs(last_delta):
+                ratio = (delta / last_delta) ** (1 / cycles)
+            elif cycles:
+                slope = (delta - last_delta) / cycles
+            # приращение глубины за шаг в конце периода (скорость сваи) -- своя прогрессия
+            d_ratio = 1.0
+            if cycles and d * last_d > 0 and abs(d) <= abs(last_d):
+                d_ratio = (d / last_d) ** (1 / cycles)
+            i = int(scal[S_I])
+            last_i = i
+            last_w0 = w0
+            last_delta = delta
+            last_d = d
+
+            if cycles and scal[S_STATUS] == STATUS_RUNNING:
+                event = next_control_event(state, n_cycle, delta * period / n_cycle)
+                # перескок -- на целое число периодов, не ближе двух периодов к событию
+                k = min(k_next, (event - i + 1) // n_cycle - 2)
+                if delta > 0:
+                    k = min(k, int((l_pile - scal[S_X_1]) / delta) - 3)
+                if k >= 1:
+                    d_jump = d * d_ratio ** k
+                    pending_d = d_jump * d_ratio
+                    if ratio and abs(ratio - 1) > 1e-12:
+                        dx = delta * ratio * (1 - ratio ** k) / (1 - ratio)
+                        pending_delta = delta * ratio ** (k + 1)
+                    else:
+                        dx = k * delta + k * (k + 1) / 2 * slope
+                        pending_delta = delta + (k + 1) * slope
+                    pending_correction = dx - k * delta
+                    m = k * n_cycle
+                    x_c = scal[S_X_1]
+                    scal[S_X_1] += dx
+                    scal[S_X_2] = scal[S_X_1] - d_jump
+                    # проверки оборотов внутри перескока: обороты не меняются, глубина запоминается
+                    last_tick = (i + m - 1) // period * period
+                    if last_tick >= i:
+                        scal[S_X_CHECK] = x_c + dx * (last_tick - i + 1) / m
+                    scal[S_I] = i + m
+                    rotate_phasors(state.ph_re, state.ph_im, 2 * math.pi * w0 * m * dt)
+                    normalize_phasors(state.ph_re, state.ph_im)
+                    pending_k = k
+
+                    x[size] = scal[S_X_1]
+                    t[size] = dt * (i + m - 1)
+                    w[size] = w0
+                    all_impulse[size] = fimp_at(state.amp, w0, state.ph_re, state.ph_im, 0.0)
+                    size += 1
 
-    dtm = dt ** 2 / M
-    fls = resist(0, gamma_cr, S)
-    ft = M * g
+        err[start:size] = err_total
+        control[CONTROL_X] = x[size - 1]
+        control[CONTROL_T] = t[size - 1]
+        update_counters(state, control, size)
+        if control[CONTROL_CANCEL]:
+            break
+    check_broken(state)
 
-    theta = [0.0] * n
+    if pending_k:
+        # последний перескок не проверен -- оценка по величине поправки
+        err_total += abs(pending_correction)
+        err[size - 1] = err_total
 
-    # инициализируем списки данными первых двух итераций
-    x0 = 0.0
-    x1 = max(g * dt ** 2 - fls * dtm, 0.0)
-    x = [x0, x1]  # глубина погружения в каждый момент времени
-    t = [0, dt]  # моменты времени
-    w0 = 0.0  # количество оборотов в секунду в текущий момент времени
-    w = [w0, w0]  # количество оборотов в секунду в каждый момент времени
-    i = 2  # порядковый номер момента времени
+    return x[:size].copy(), t[:size].copy(), w[:size].copy(), all_impulse[:size].copy(), err[:size].copy()
 
-    rpm_noise = np.random.normal(1, rpm_noise_scale, n)
+
+@jit(nopython=True, nogil=True, cache=True)
+def run_summary(state, depths, control):
+    '''
+    Доводит расчёт из состояния `state` до конца, не сохраняя траекторию: моменты времени
+    считаются порциями по `period` шагов в буферы постоянного размера и сразу сворачиваются в итоги,
+    поэтому память не зависит от длительности погружения.
+    depths -- глубины (м, по возрастанию), для которых определяется время первого достижения;
+    control -- см. `simulate`.
+    Возвращает массив итогов из `SUMMARY_SIZE` ячеек (`SUMMARY_*`) и время достижения каждой
+    глубины `depths` (линейная интерполяция между соседними моментами, nan -- не достигнута).
+    Поломка сваи не прерывает расчёт исключением: причина окончания -- `STATUS_BROKEN`,
+    итоги -- по моментам до поломки (см. `advance_into`); другие ошибки не перехватываются.
+    '''
+    scal = state.scal
+    period = int(scal[S_PERIOD])
+    x = np.empty(period)
+    t = np.empty(period)
+    w = np.empty(period)
+    all_impulse = np.empty(period)
+    out = np.full(SUMMARY_SIZE, np.nan)
+    t_depths = np.full(depths.shape[0], np.nan)
+
+    n_depths = depths.shape[0]
+    reached = 0  # количество достигнутых глубин
+    x_prev = 0.0
+    t_prev = 0.0
+    x_end = 0.0
+    t_end = 0.0
+    w_end = 0.0
+    impulse_max = 0.0
+    impulse_sq = 0.0  # интеграл квадрата силы импульса по времени
+    while scal[S_STATUS] == STATUS_RUNNING:
+        size = advance_into(state, x, t, w, all_impulse, 0, period)
+        for k in range(size):
+            while reached < n_depths and x[k] >= depths[reached]:
+                if x[k] > x_prev:
+                    t_depths[reached] = t_prev + (t[k] - t_prev) * (depths[reached] - x_prev) / (x[k] - x_prev)
+                else:
+                    t_depths[reached] = t[k]
+                reached += 1
+            impulse = abs(all_impulse[k])
+            if impulse > impulse_max:
+                impulse_max = impulse
+            impulse_sq += all_impulse[k] * all_impulse[k] * (t[k] - t_prev)
+            x_prev = x[k]
+            t_prev = t[k]
+        if size:
+            x_end = x[size - 1]
+            t_end = t[size - 1]
+            w_end = w[size - 1]
+        control[CONTROL_X] = x_end
+        control[CONTROL_T] = t_end
+        update_counters(state, control, 0)
+        if control[CONTROL_CANCEL]:
+            break
+    status = int(scal[S_STATUS])
+
+    out[SUMMARY_STATUS] = status
+    out[SUMMARY_T_END] = t_end
+    out[SUMMARY_X_END] = x_end
+    out[SUMMARY_W_END] = w_end
+    out[SUMMARY_IMPULSE_MAX] = impulse_max
+    out[SUMMARY_IMPULSE_RMS] = math.sqrt(impulse_sq / t_end) if t_end > 0 else impulse_max
+    if status == STATUS_REFUSAL:
+        out[SUMMARY_W_REFUSAL] = w_end
+    out[SUMMARY_STEPS] = scal[S_I]
+    return out, t_depths
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def simulate_summary(
+    g, dt, l_pile, P, S, M,
+    gamma_cr, gamma_cf,
+    fi,
+    m_debs, R_debs,
+    m_debs_custom_noise, R_debs_custom_noise,
+    theta_noise,
+    rpm_noise_scale,
+    m_debs_noise_scale,
+    R_debs_noise_scale,
+    dw,
+    t_table, w_table,
+    tol,
+    soil_depth, soil_tip, soil_side,
+    seed,
+    depths,
+    control
+):
+    '''
+    Расчёт погружения без траектории, только итоги (см. `run_summary`).
+    Параметры -- как у `simulate`, вместо `max_points` -- глубины `depths`.
+    '''
+    state = init_state(
+        g, dt, l_pile, P, S, M,
+        gamma_cr, gamma_cf,
+        fi,
+        m_debs, R_debs,
+        m_debs_custom_noise, R_debs_custom_noise,
+        theta_noise,
+        rpm_noise_scale,
+        m_debs_noise_scale,
+        R_debs_noise_scale,
+        dw,
+        t_table, w_table,
+        tol,
+        soil_depth, soil_tip, soil_side,
+        seed
+    )
+    return run_summary(state, depths, control)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def init_state(
+    g, dt, l_pile, P, S, M,
+    gamma_cr, gamma_cf,
+    fi,
+    m_debs, R_debs,
+    m_debs_custom_noise, R_debs_custom_noise,
+    theta_noise,
+    rpm_noise_scale,
+    m_debs_noise_scale,
+    R_debs_noise_scale,
+    dw,
+    t_table, w_table,
+    tol,
+    soil_depth, soil_tip, soil_side,
+    seed
+):
+    '''
+    Возвращает начальное состояние расчёта `SimState` для пошагового расчёта `advance`.
+    Параметры те же, что у `main`, все обязательны. Шумы масс, радиусов и фаз дебалансов
+    выбираются здесь, шумы оборотов -- на каждом шаге; все -- из потока случайных чисел
+    `SimState.rng` (см. `counter_rng`). Выключенные шумы (нулевой масштаб) чисел не расходуют.
+    '''
+    n = max(len(m_debs), len(R_debs))
+    if seed < 0:
+        seed = np.random.randint(0, 2 ** 62)
+
+    scal = np.zeros(S_SIZE)
+    scal[S_G] = g
+    scal[S_DT] = dt
+    scal[S_L_PILE] = l_pile
+    scal[S_P] = P
+    scal[S_S] = S
+    scal[S_GAMMA_CR] = gamma_cr
+    scal[S_FI] = fi
+    scal[S_RPM_NOISE_SCALE] = rpm_noise_scale
+    scal[S_DW] = dw
+    scal[S_DTM] = dt ** 2 / M
+    scal[S_FT] = M * g
+    scal[S_PERIOD] = int(1 / dt)
+    scal[S_N] = n
+    scal[S_STATUS] = STATUS_RUNNING
+    scal[S_TOL] = tol
+    scal[S_M] = M
+    scal[S_H] = dt
+
+    rng = np.empty(2, dtype=np.uint64)
+    rng[0] = counter_rng.stream_key(seed)
+    rng[1] = 0
+    noise = np.empty(counter_rng.BLOCK)
+    pos = noise.shape[0]
 
     if m_debs_noise_scale == 0.0 and (m_debs_custom_noise != np.array([0.0])).any():
         m_debs_noise = m_debs_custom_noise
     else:
-        m_debs_noise = np.random.normal(1, m_debs_noise_scale, n)
+        m_debs_noise = np.ones(n)
+        if m_debs_noise_scale:
+            pos = counter_rng.reserve_normals(rng, noise, pos, n)
+            m_debs_noise += m_debs_noise_scale * noise[pos:pos + n]
+            pos += n
 
     if R_debs_noise_scale == 0.0 and (R_debs_custom_noise != np.array([0.0])).any():
         R_debs_noise = R_debs_custom_noise
     else:
-        R_debs_noise = np.random.normal(1, R_debs_noise_scale, n)
+        R_debs_noise = np.ones(n)
+        if R_debs_noise_scale:
+            pos = counter_rng.reserve_normals(rng, noise, pos, n)
+            R_debs_noise += R_debs_noise_scale * noise[pos:pos + n]
+            pos += n
 
-    theta_noise_coef = np.random.normal(0, theta_noise, n)
+    theta_noise_coef = np.zeros(n)
+    if theta_noise:
+        pos = counter_rng.reserve_normals(rng, noise, pos, n)
+        theta_noise_coef += theta_noise * noise[pos:pos + n]
+        pos += n
+    scal[S_NOISE_POS] = pos
 
-    m_debs = [x * noise for x, noise in zip(m_debs, m_debs_noise)]
-    R_debs = [x * noise for x, noise in zip(R_debs, R_debs_noise)]
+    soil = soil_profile(soil_depth, soil_tip, soil_side, gamma_cr, S, P, fi)
 
-    fimp_0 = np.sum(np.array([get_fimp_el(m_debs[k], R_debs[k], w0, k, theta[k], theta_noise_coef[k]) for k in range(n)]))
-    for k in range(n):
-        theta[k] += w0 * (k + 1) * rpm_noise[k] * dt * 2 * math.pi
-    fimp_1 = np.sum(np.array([get_fimp_el(m_debs[k], R_debs[k], w0, k, theta[k], theta_noise_coef[k]) for k in range(n)]))
+    # постоянные множители сил пар дебалансов и фазоры exp(i * (theta + theta_noise_coef))
+    return SimState(
+        scal,
+        debalance_amplitudes(m_debs * m_debs_noise[:n], R_debs * R_debs_noise[:n]),
+        np.cos(theta_noise_coef),
+        np.sin(theta_noise_coef),
+        np.ones(n),
+        np.zeros(n),
+        t_table.copy(),
+        w_table.copy(),
+        soil[0],
+        soil[1],
+        soil[2],
+        soil[3],
+        rng,
+        noise,
+    )
 
-    # # лобовое сопротивление в каждый момент времени
-    # all_fls = [resist(x0), resist(x1)]
-    # # боковое сопротивление в каждый момент времени
-    # all_fbs = [0, P * fi * x1]
 
-    # сила импульса в каждый момент времени
-    all_impulse = [fimp_0, fimp_1]
-    # сила импульса с шумом в каждый момент времени
-    # noise_plot = [0, 0]
+@jit(nopython=True, cache=True)
+def check_broken(state):
+    '''
+    Бросает ZeroDivisionError, если свая сломалась (`state.scal[S_STATUS] == STATUS_BROKEN`).
+    '''
+    scal = state.scal
+    if scal[S_STATUS] == STATUS_BROKEN:
+        if scal[S_TOL]:
+            raise ZeroDivisionError('Свая сломалась на секунде', scal[S_T])
+        raise ZeroDivisionError('Свая сломалась на итерации', int(scal[S_I]))
 
-    period = int(1 / dt)
 
-    curr_t_index = 0
+@jit(nopython=True, nogil=True, cache=True)
+def advance(state, n_steps):
+    '''
+    Продолжает расчёт из состояния `state` не более чем на `n_steps` моментов времени
+    и возвращает новые x, t, w, all_impulse (см. `main`). Состояние обновляется на месте.
+    Если расчёт окончен (`state.scal[S_STATUS] != STATUS_RUNNING`), возвращаются пустые массивы.
+    Если свая сломалась, бросает ZeroDivisionError.
+    '''
+    x = np.empty(n_steps)
+    t = np.empty(n_steps)
+    w = np.empty(n_steps)
+    all_impulse = np.empty(n_steps)
+    size = advance_into(state, x, t, w, all_impulse, 0, n_steps)
+    check_broken(state)
+    return x[:size], t[:size], w[:size], all_impulse[:size]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def advance_into(state, x, t, w, all_impulse, start, stop):
+    '''
+    Продолжает расчёт из состояния `state`, записывая моменты времени в ячейки
+    `start`, `start + 1`, ... буферов `x`, `t`, `w`, `all_impulse`, пока не будет
+    заполнена ячейка `stop - 1` или не окончится расчёт.
+    Возвращает номер ячейки, следующей за последней записанной.
+    Поломка сваи не бросает исключение: расчёт оканчивается с причиной `STATUS_BROKEN`
+    (момент поломки не записывается), исключение бросает вызывающая функция (`check_broken`).
+    '''
+    if state.scal[S_TOL]:
+        return advance_adaptive_into(state, x, t, w, all_impulse, start, stop)
+
+    scal = state.scal
+    amp = state.amp
+    ph_re = state.ph_re
+    ph_im = state.ph_im
+    rot_re = state.rot_re
+    rot_im = state.rot_im
+    t_table = state.t_table
+    w_table = state.w_table
+    soil_depth = state.soil_depth
+    soil_tip = state.soil_tip
+    soil_cum = state.soil_cum
+    soil_rate = state.soil_rate
+    rng = state.rng
+    noise = state.noise
+
+    g = scal[S_G]
+    dt = scal[S_DT]
+    l_pile = scal[S_L_PILE]
+    rpm_noise_scale = scal[S_RPM_NOISE_SCALE]
+    dw = scal[S_DW]
+    dtm = scal[S_DTM]
+    ft = scal[S_FT]
+    period = int(scal[S_PERIOD])
+    n = int(scal[S_N])
+
+    i = int(scal[S_I])
+    x_1 = scal[S_X_1]
+    x_2 = scal[S_X_2]
+    x_check = scal[S_X_CHECK]
+    w0 = scal[S_W0]
+    curr_t_index = int(scal[S_T_INDEX])
+    status = int(scal[S_STATUS])
+    layer = int(scal[S_LAYER])
+    noise_pos = int(scal[S_NOISE_POS])
+
+    # наибольшая возможная амплитуда вынуждающей силы при единичных оборотах
+    amp_peak = 0.0
+    for k in range(n):
+        amp_peak += abs(amp[k])
+    # глубина и обороты, при которых остановку сваи доказать не удалось
+    stall_x = -1.0
+    stall_w0 = -1.0
+
+    p = start
     # пока количество оборотов меньше критического и глубина погружения меньше длины сваи
-    while w0 < 50 and x[i - 1] < l_pile:
-        rpm_noise = np.random.normal(1, rpm_noise_scale, n)
-        for k in range(n):
-            theta[k] += w0 * (k + 1) * rpm_noise[k] * dt * 2 * math.pi
-        fimp = np.sum(np.array([get_fimp_el(m_debs[k], R_debs[k], w0, k, theta[k], theta_noise_coef[k]) for k in range(n)]))
-        fls = resist(x[i - 1], gamma_cr, S)
-        xi_ = xi(x, i, fimp, P, ft, dtm, fi, fls)  # проверка на поломку
-        x.append(xi_)
-        t.append(dt * i)
-        all_impulse.append(fimp)
-        if dw and not i % period:  # Выбор способа увеличения оборотов. Если dw=0, идем другим путем
-            # если за текущую итерацию свая погрузилась меньше, чем на 1 см
-            if abs(x[i] - x[i - period]) <= 0.01:
-                # увеличиваем обороты погружателя
-                w0 += dw
-        elif not i % period:
-            if curr_t_index >= len(t_table):
-                w.append(w0)
+    while p < stop and status == STATUS_RUNNING:
+        if x_1 == x_2 and (x_1 != stall_x or w0 != stall_w0) and i >= 2 and i % period:
+            # свая стоит: если ни при какой фазе сила не преодолевает сопротивление,
+            # она простоит до следующей проверки оборотов (шаг `i % period == 0`)
+            peak = amp_peak * w0 * w0
+            layer = soil_layer(soil_depth, x_1, layer)
+            fls = soil_tip[layer]
+            fbs = soil_cum[layer] + soil_rate[layer] * (x_1 - soil_depth[layer])
+            margin = 1e-9 * (ft + peak + fls + fbs)
+            if ft + peak <= fls + fbs - margin and ft - peak + fbs >= margin:
+                end = min(stop, p + period - i % period)
+                noise_pos = fill_stalled(state, x, t, w, all_impulse, p, end, i, x_1, w0, noise_pos)
+                scal[S_STALLED] += end - p
+                i += end - p
+                p = end
+                continue
+            stall_x = x_1
+            stall_w0 = w0
+        if i == 0:
+            fimp = 0.0
+            for k in range(amp.shape[0]):
+                fimp += amp[k] * ph_re[k]
+            fimp *= w0 * w0
+            x_i = 0.0
+        elif i == 1:
+            fimp = fimp_step(amp, w0, ph_re, ph_im, rot_re, rot_im)
+            x_i = max(g * dt ** 2 - soil_tip[soil_layer(soil_depth, 0.0, 0)] * dtm, 0.0)
+        else:
+            if rpm_noise_scale:
+                # при шумах оборотов приращение фазы своё на каждом шаге
+                noise_pos = counter_rng.reserve_normals(rng, noise, noise_pos, n)
+                for k in range(n):
+                    d_theta = w0 * (k + 1) * (1 + rpm_noise_scale * noise[noise_pos + k]) * dt * 2 * math.pi
+                    rot_re[k] = math.cos(d_theta)
+                    rot_im[k] = math.sin(d_theta)
+                noise_pos += n
+            fimp = fimp_step(amp, w0, ph_re, ph_im, rot_re, rot_im)
+            layer = soil_layer(soil_depth, x_1, layer)
+            fls = soil_tip[layer]
+            fbs = soil_cum[layer] + soil_rate[layer] * (x_1 - soil_depth[layer])
+            x_i = depth_step(x_1, x_2, fimp, ft, dtm, fls, fbs)  # проверка на поломку
+            if x_i != x_i:
+                status = STATUS_BROKEN
                 break
-            if t[-1] > t_table[curr_t_index]:
+        x[p] = x_i
+        t[p] = dt * i
+        all_impulse[p] = fimp
+        if i and not i % period:
+            normalize_phasors(ph_re, ph_im)
+            if dw:  # Выбор способа увеличения оборотов. Если dw=0, идем другим путем
+                # если за текущую итерацию свая погрузилась меньше, чем на 1 см
+                if abs(x_i - x_check) <= 0.01:
+                    # увеличиваем обороты погружателя
+                    w0 += dw
+                    phase_rotation(w0, dt, rot_re, rot_im)
+                    scal[S_RPM_CHANGES] += 1
+            elif curr_t_index >= len(t_table):
+                status = STATUS_TABLE_END
+            elif t[p] > t_table[curr_t_index]:
                 w0 = w_table[curr_t_index]
                 curr_t_index += 1
-        w.append(w0)
+                phase_rotation(w0, dt, rot_re, rot_im)
+                scal[S_RPM_CHANGES] += 1
+            x_check = x_i
+        w[p] = w0
+        x_2 = x_1
+        x_1 = x_i
         i += 1
+        p += 1
+        if status == STATUS_RUNNING and i >= 2:
+            if w0 >= 50:
+                status = STATUS_REFUSAL
+            elif x_1 >= l_pile:
+                status = STATUS_FULL_DEPTH
 
-    return x, t, w, all_impulse
+    scal[S_I] = i
+    scal[S_X_1] = x_1
+    scal[S_X_2] = x_2
+    scal[S_X_CHECK] = x_check
+    scal[S_W0] = w0
+    scal[S_T_INDEX] = curr_t_index
+    scal[S_STATUS] = status
+    scal[S_LAYER] = layer
+    scal[S_NOISE_POS] = noise_pos
+    return p
+
+
+@jit(nopython=True, cache=True)
+def fill_stalled(state, x, t, w, all_impulse, start, stop, i, x_1, w0, noise_pos):
+    '''
+    Записывает в ячейки `start`, ..., `stop - 1` буферов моменты `i`, `i + 1`, ...
+    неподвижной сваи (глубина `x_1`, обороты `w0`), поворачивая фазоры `state`
+    так же, как `advance_into`, чтобы сила импульса не отличалась от посчитанной по шагам.
+    Возвращает номер следующего неиспользованного числа блока `state.noise`
+    (`noise_pos` -- номер первого).
+    '''
+    amp = state.amp
+    ph_re = state.ph_re
+    ph_im = state.ph_im
+    rot_re = state.rot_re
+    rot_im = state.rot_im
+    dt = state.scal[S_DT]
+    rpm_noise_scale = state.scal[S_RPM_NOISE_SCALE]
+    n = amp.shape[0]
+    for p in range(start, stop):
+        if rpm_noise_scale:
+            noise_pos = counter_rng.reserve_normals(state.rng, state.noise, noise_pos, n)
+            for k in range(n):
+                d_theta = w0 * (k + 1) * (1 + rpm_noise_scale * state.noise[noise_pos + k]) * dt * 2 * math.pi
+                rot_re[k] = math.cos(d_theta)
+                rot_im[k] = math.sin(d_theta)
+            noise_pos += n
+        x[p] = x_1
+        t[p] = dt * (i + p - start)
+        all_impulse[p] = fimp_step(amp, w0, ph_re, ph_im, rot_re, rot_im)
+        w[p] = w0
+    return noise_pos
+
+
+@jit(nopython=True, cache=True)
+def slip_acceleration(x, fimp, mode, ft, M, state):
+    '''
+    Возвращает ускорение сваи, движущейся вниз (`mode = 1`) или вверх (`mode = -1`).
+    При движении вниз движению препятствуют лобовое сопротивление и трение по боковой
+    поверхности, при движении вверх -- только трение (как в `depth_step`).
+    Слои грунта -- из `state` (поиск слоя начинается со слоя `state.scal[S_LAYER]`).
+    '''
+    layer = soil_layer(state.soil_depth, x, int(state.scal[S_LAYER]))
+    fbs = state.soil_cum[layer] + state.soil_rate[layer] * (x - state.soil_depth[layer])
+    if mode > 0:
+        return (ft + fimp - state.soil_tip[layer] - fbs) / M
+    return (ft + fimp + fbs) / M
+
+
+@jit(nopython=True, cache=True)
+def slip_step(x_0, v_0, h, mode, amp, w0, ph_re, ph_im, ft, M, state):
+    '''
+    Шаг `h` метода Дормана -- Принса 5(4) для движущейся сваи, фазоры -- в начале шага.
+    Возвращает глубину и скорость в конце шага, оценки их погрешности и ускорения
+    в начале и в конце шага (для поиска событий внутри шага, см. `hermite_root`).
+    '''
+    theta = 2 * math.pi * w0 * h
+    k1x = v_0
+    k1v = slip_acceleration(x_0, fimp_at(amp, w0, ph_re, ph_im, 0.0), mode, ft, M, state)
+
+    xs = x_0 + h * (k1x / 5)
+    k2x = v_0 + h * (k1v / 5)
+    k2v = slip_acceleration(xs, fimp_at(amp, w0, ph_re, ph_im, theta / 5), mode, ft, M, state)
+
+    xs = x_0 + h * (3 / 40 * k1x + 9 / 40 * k2x)
+    k3x = v_0 + h * (3 / 40 * k1v + 9 / 40 * k2v)
+    k3v = slip_acceleration(xs, fimp_at(amp, w0, ph_re, ph_im, theta * 3 / 10), mode, ft, M, state)
+
+    xs = x_0 + h * (44 / 45 * k1x - 56 / 15 * k2x + 32 / 9 * k3x)
+    k4x = v_0 + h * (44 / 45 * k1v - 56 / 15 * k2v + 32 / 9 * k3v)
+    k4v = slip_acceleration(xs, fimp_at(amp, w0, ph_re, ph_im, theta * 4 / 5), mode, ft, M, state)
+
+    xs = x_0 + h * (19372 / 6561 * k1x - 25360 / 2187 * k2x + 64448 / 6561 * k3x - 212 / 729 * k4x)
+    k5x = v_0 + h * (19372 / 6561 * k1v - 25360 / 2187 * k2v + 64448 / 6561 * k3v - 212 / 729 * k4v)
+    k5v = slip_acceleration(xs, fimp_at(amp, w0, ph_re, ph_im, theta * 8 / 9), mode, ft, M, state)
+
+    xs = x_0 + h * (9017 / 3168 * k1x - 355 / 33 * k2x + 46732 / 5247 * k3x + 49 / 176 * k4x
+                    - 5103 / 18656 * k5x)
+    k6x = v_0 + h * (9017 / 3168 * k1v - 355 / 33 * k2v + 46732 / 5247 * k3v + 49 / 176 * k4v
+                     - 5103 / 18656 * k5v)
+    k6v = slip_acceleration(xs, fimp_at(amp, w0, ph_re, ph_im, theta), mode, ft, M, state)
+
+    x_1 = x_0 + h * (35 / 384 * k1x + 500 / 1113 * k3x + 125 / 192 * k4x - 2187 / 6784 * k5x + 11 / 84 * k6x)
+    v_1 = v_0 + h * (35 / 384 * k1v + 500 / 1113 * k3v + 125 / 192 * k4v - 2187 / 6784 * k5v + 11 / 84 * k6v)
+    k7v = slip_acceleration(x_1, fimp_at(amp, w0, ph_re, ph_im, theta), mode, ft, M, state)
+
+    # разность решений пятого и четвёртого порядков
+    err_x = h * (71 / 57600 * k1x - 71 / 16695 * k3x + 71 / 1920 * k4x - 17253 / 339200 * k5x
+                 + 22 / 525 * k6x - 1 / 40 * v_1)
+    err_v = h * (71 / 57600 * k1v - 71 / 16695 * k3v + 71 / 1920 * k4v - 17253 / 339200 * k5v
+                 + 22 / 525 * k6v - 1 / 40 * k7v)
+    return x_1, v_1, err_x, err_v, k1v, k7v
+
+
+@jit(nopython=True, cache=True)
+def hermite_root(y_0, dy_0, y_1, dy_1, h, level):
+    '''
+    Возвращает долю шага `h` (от 0 до 1), на которой кубический интерполянт Эрмита
+    по значениям `y_0`, `y_1` и производным `dy_0`, `dy_1` на концах шага достигает `level`.
+    Значения на концах шага должны лежать по разные стороны от `level`.
+    '''
+    lo = 0.0
+    hi = 1.0
+    below = y_0 < level
+    for _ in range(50):
+        s = (lo + hi) / 2
+        s2 = s * s
+        s3 = s2 * s
+        y = ((2 * s3 - 3 * s2 + 1) * y_0 + (s3 - 2 * s2 + s) * h * dy_0
+             + (3 * s2 - 2 * s3) * y_1 + (s3 - s2) * h * dy_1)
+        if (y < level) == below:
+            lo = s
+        else:
+            hi = s
+    return hi
+
+
+@jit(nopython=True, cache=True)
+def stick_step(h_max, dt, fimp, lower, upper, amp, w0, ph_re, ph_im):
+    '''
+    Возвращает длину шага неподвижной сваи (не больше `h_max`) и силу импульса в конце шага.
+    Пока сила импульса остаётся в пределах [`lower`, `upper`], свая не двигается. Шаг
+    выбирается по оценке второй производной силы так, чтобы сила заведомо не вышла за пределы
+    раньше его конца; если такой шаг короче `dt`, делается шаг `dt`, а момент выхода
+    за пределы внутри него находится делением пополам.
+    '''
+    rate, curvature = fimp_bounds(amp, w0, ph_re, ph_im)
+    h = h_max
+    if curvature > 0:
+        # fimp(t + h) <= fimp + rate * h + curvature * h^2 / 2
+        h = min(h, (-rate + math.sqrt(rate * rate + 2 * curvature * max(upper - fimp, 0.0))) / curvature)
+        h = min(h, (rate + math.sqrt(rate * rate + 2 * curvature * max(fimp - lower, 0.0))) / curvature)
+    if h < dt:
+        h = min(dt, h_max)
+    f = fimp_at(amp, w0, ph_re, ph_im, 2 * math.pi * w0 * h)
+    if lower <= f <= upper:
+        return h, f
+    lo = 0.0
+    hi = h
+    f_hi = f
+    for _ in range(50):
+        mid = (lo + hi) / 2
+        f = fimp_at(amp, w0, ph_re, ph_im, 2 * math.pi * w0 * mid)
+        if lower <= f <= upper:
+            lo = mid
+        else:
+            hi = mid
+            f_hi = f
+    return hi, f_hi
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def advance_adaptive_into(state, x, t, w, all_impulse, start, stop):
+    '''
+    То же, что `advance_into`, для расчёта с переменным шагом (`state.scal[S_TOL] > 0`).
+
+    Модель та же, что у `depth_step` при `dt -> 0`: свая движется вниз, когда сумма веса и силы
+    импульса превышает сумму лобового сопротивления и трения по боковой поверхности, вверх --
+    когда сила импульса, направленная вверх, превышает вес и трение, иначе стоит на месте.
+    При движении сваи шаг выбирается методом Дормана -- Принса 5(4) по оценке погрешности
+    глубины (`tol`, м) и скорости (`tol` на круговую частоту старшей пары дебалансов);
+    остановка сваи и достижение глубины `l_pile` находятся внутри шага. Пока свая неподвижна,
+    шаг ограничен только моментом, когда сила импульса может выйти за пределы трения (`stick_step`).
+    Шаги заканчиваются точно в моменты проверки оборотов (раз в `period * dt` секунд), где
+    обороты меняются так же, как в `advance_into`.
+    Шумы оборотов добавляются к фазам дебалансов после каждого шага с дисперсией,
+    равной дисперсии суммы шумов `h / dt` шагов расчёта с постоянным шагом.
+    '''
+    scal = state.scal
+    amp = state.amp
+    ph_re = state.ph_re
+    ph_im = state.ph_im
+    t_table = state.t_table
+    w_table = state.w_table
+
+    dt = scal[S_DT]
+    l_pile = scal[S_L_PILE]
+    rpm_noise_scale = scal[S_RPM_NOISE_SCALE]
+    dw = scal[S_DW]
+    dtm = scal[S_DTM]
+    ft = scal[S_FT]
+    period = int(scal[S_PERIOD])
+    n = int(scal[S_N])
+    tol = scal[S_TOL]
+    M = scal[S_M]
+
+    i = int(scal[S_I])
+    t_i = scal[S_T]
+    x_i = scal[S_X_1]
+    v = scal[S_V]
+    h = scal[S_H]
+    tick = int(scal[S_TICK])
+    mode = int(scal[S_MODE])
+    x_check = scal[S_X_CHECK]
+    w0 = scal[S_W0]
+    curr_t_index = int(scal[S_T_INDEX])
+    status = int(scal[S_STATUS])
+    h_min = dt * 1e-6
+
+    p = start
+    while p < stop and status == STATUS_RUNNING:
+        if i:
+            t_tick = dt * ((tick + 1) * period)
+            h_max = t_tick - t_i
+            layer = soil_layer(state.soil_depth, x_i, int(scal[S_LAYER]))
+            scal[S_LAYER] = layer
+            fls = state.soil_tip[layer]
+            fbs = state.soil_cum[layer] + state.soil_rate[layer] * (x_i - state.soil_depth[layer])
+            fimp = fimp_at(amp, w0, ph_re, ph_im, 0.0)
+            # пределы силы импульса, в которых неподвижная свая остаётся на месте
+            lower = -fbs - ft
+            upper = fls + fbs - ft
+            if mode == 0:
+                if fimp > upper:
+                    mode = 1
+                elif fimp < lower:
+                    mode = -1
+
+            if mode == 0:
+                step, fimp_end = stick_step(h_max, dt, fimp, lower, upper, amp, w0, ph_re, ph_im)
+                # направление движения -- по силе, найденной в конце шага
+                if fimp_end > upper:
+                    mode = 1
+                elif fimp_end < lower:
+                    mode = -1
+            else:
+                omega = 2 * math.pi * max(n * w0, 1.0)
+                h = min(max(h, h_min), h_max)
+                while True:
+                    x_new, v_new, err_x, err_v, a_0, a_1 = slip_step(
+                        x_i, v, h, mode, amp, w0, ph_re, ph_im, ft, M, state
+                    )
+                    err = max(abs(err_x), abs(err_v) / omega) / tol
+                    if err <= 1 or h <= h_min:
+                        break
+                    h = max(h * max(0.2, 0.9 * err ** -0.2), h_min)
+                step = h
+
+                if mode > 0 and x_new > l_pile + tol:
+                    # глубина `l_pile` достигнута внутри шага
+                    step = h * hermite_root(x_i, v, x_new, v_new, h, l_pile) * (1 + 1e-9)
+                    x_new, v_new, err_x, err_v, a_0, a_1 = slip_step(
+                        x_i, v, step, mode, amp, w0, ph_re, ph_im, ft, M, state
+                    )
+                if mode * v_new < 0:
+                    # свая остановилась внутри шага
+                    step = step * hermite_root(v, a_0, v_new, a_1, step, 0.0)
+                    x_new, v_new, err_x, err_v, a_0, a_1 = slip_step(
+                        x_i, v, step, mode, amp, w0, ph_re, ph_im, ft, M, state
+                    )
+                    if mode * v_new <= 0:
+                        v_new = 0.0
+                        mode = 0
+
+                if mode < 0:
+                    # проверка на поломку, как в `depth_step` с шагом `dt`
+                    f = v * dt + (ft + fimp) * dtm
+                    if f <= 0 and f + ft + fbs * dtm < 0:
+                        status = STATUS_BROKEN
+                        break
+
+                # следующий пробный шаг
+                if err > 0:
+                    h = h * min(5.0, max(0.2, 0.9 * err ** -0.2))
+                else:
+                    h = h * 5
+                x_i = x_new
+                v = v_new
+
+            rotate_phasors(ph_re, ph_im, 2 * math.pi * w0 * step)
+            if rpm_noise_scale:
+                # шумы оборотов за `step / dt` шагов расчёта с постоянным шагом
+                scale = 2 * math.pi * w0 * rpm_noise_scale * math.sqrt(step * dt)
+                noise_pos = counter_rng.reserve_normals(state.rng, state.noise, int(scal[S_NOISE_POS]), n)
+                for k in range(n):
+                    d_theta = (k + 1) * scale * state.noise[noise_pos + k]
+                    c = math.cos(d_theta)
+                    s = math.sin(d_theta)
+                    ph_re[k], ph_im[k] = ph_re[k] * c - ph_im[k] * s, ph_re[k] * s + ph_im[k] * c
+                scal[S_NOISE_POS] = noise_pos + n
+            if step >= h_max:
+                t_i = t_tick
+            else:
+                t_i += step
+
+        x[p] = x_i
+        t[p] = t_i
+        all_impulse[p] = fimp_at(amp, w0, ph_re, ph_im, 0.0)
+        if i and t_i == dt * ((tick + 1) * period):
+            tick += 1
+            normalize_phasors(ph_re, ph_im)
+            if dw:
+                if abs(x_i - x_check) <= 0.01:
+                    w0 += dw
+                    scal[S_RPM_CHANGES] += 1
+            elif curr_t_index >= len(t_table):
+                status = STATUS_TABLE_END
+            elif t_i > t_table[curr_t_index]:
+                w0 = w_table[curr_t_index]
+                curr_t_index += 1
+                scal[S_RPM_CHANGES] += 1
+            x_check = x_i
+        w[p] = w0
+        i += 1
+        p += 1
+        if status == STATUS_RUNNING and i >= 2:
+            if w0 >= 50:
+                status = STATUS_REFUSAL
+            elif x_i >= l_pile:
+                status = STATUS_FULL_DEPTH
+
+    scal[S_I] = i
+    scal[S_T] = t_i
+    scal[S_X_1] = x_i
+    scal[S_V] = v
+    scal[S_H] = h
+    scal[S_TICK] = tick
+    scal[S_MODE] = mode
+    scal[S_X_CHECK] = x_check
+    scal[S_W0] = w0
+    scal[S_T_INDEX] = curr_t_index
+    scal[S_STATUS] = status
+    return p
+
+
+# параметры `main` в порядке их передачи и значения необязательных параметров по умолчанию
+MAIN_PARAMS = (
+    'g', 'dt', 'l_pile', 'P', 'S', 'M',
+    'gamma_cr', 'gamma_cf',
+    'fi',
+    'm_debs', 'R_debs',
+    'm_debs_custom_noise', 'R_debs_custom_noise',
+    'theta_noise',
+    'rpm_noise_scale',
+    'm_debs_noise_scale',
+    'R_debs_noise_scale',
+    'dw',
+    't_table', 'w_table',
+    'tol',
+    'soil_depth', 'soil_tip', 'soil_side',
+    'seed',
+)
+MAIN_DEFAULTS = {
+    'm_debs_custom_noise': (0.0,),
+    'R_debs_custom_noise': (0.0,),
+    'theta_noise': 0.0,
+    'rpm_noise_scale': 0.0,
+    'm_debs_noise_scale': 0.0,
+    'R_debs_noise_scale': 0.0,
+    'dw': 0.0,
+    't_table': (0.0,),
+    'w_table': (0.0,),
+    'tol': 0.0,
+    'soil_depth': (),
+    'soil_tip': (),
+    'soil_side': (),
+    'seed': -1,
+}
+MAIN_ARRAYS = (
+    'm_debs', 'R_debs', 'm_debs_custom_noise', 'R_debs_custom_noise', 't_table', 'w_table',
+    'soil_depth', 'soil_tip', 'soil_side'
+)
+MAIN_INTS = ('seed',)
+
+
+def main_args(params: dict) -> tuple:
+    '''
+    Возвращает позиционные аргументы `main` из словаря параметров `params`.
+    Пропущенные необязательные параметры берутся из `MAIN_DEFAULTS`, списки
+    приводятся к массивам float64, зерно `seed` -- к int, остальные числа -- к float.
+    '''
+    unknown = set(params) - set(MAIN_PARAMS)
+    if unknown:
+        raise KeyError(f'Неизвестные параметры: {", ".join(sorted(unknown))}')
+    args = []
+    for name in MAIN_PARAMS:
+        if name in params:
+            value = params[name]
+        elif name in MAIN_DEFAULTS:
+            value = MAIN_DEFAULTS[name]
+        else:
+            raise KeyError(f'Не задан параметр `{name}`')
+        if name in MAIN_ARRAYS:
+            args.append(np.ascontiguousarray(value, dtype=np.float64))
+        elif name in MAIN_INTS:
+            args.append(int(value))
+        else:
+            args.append(float(value))
+    return tuple(args)
+
+
+# типы аргументов `main` в сигнатурах numba
+MAIN_SIGNATURE_ARGS = (
+    'float64, ' * 9  # g, dt, l_pile, P, S, M, gamma_cr, gamma_cf, fi
+    + 'float64[::1], ' * 4  # m_debs, R_debs, m_debs_custom_noise, R_debs_custom_noise
+    + 'float64, ' * 5  # theta_noise, rpm_noise_scale, m_debs_noise_scale, R_debs_noise_scale, dw
+    + 'float64[::1], ' * 2  # t_table, w_table
+    + 'float64, '  # tol
+    + 'float64[::1], ' * 3  # soil_depth, soil_tip, soil_side
+    + 'int64, '  # seed
+)
+# явные сигнатуры `simulate` и `simulate_summary`: для заблаговременной компиляции
+# и сборки AOT-модуля (см. build_aot.py)
+SIMULATE_SIGNATURE = (
+    'UniTuple(float64[::1], 4)('
+    + MAIN_SIGNATURE_ARGS
+    + 'int64, '  # max_points
+    + 'float64[::1])'  # control
+)
+SUMMARY_SIGNATURE = (
+    'UniTuple(float64[::1], 2)('
+    + MAIN_SIGNATURE_ARGS
+    + 'float64[::1], '  # depths
+    + 'float64[::1])'  # control
+)
+
+# исходные тексты ядра: их хэш встраивается в AOT-модуль и входит в ключ кэша результатов
+KERNEL_FILES = ('pogruzhatel_jit.py', 'counter_rng.py', 'decimation.py')
+
+
+def kernel_digest() -> str:
+    '''
+    Возвращает хэш исходных текстов ядра `KERNEL_FILES` (OSError, если их нет рядом с модулем).
+    '''
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in KERNEL_FILES:
+        with open(os.path.join(root, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def digest_word(digest: str) -> int:
+    '''
+    Возвращает начало хэша `digest` целым числом, которое помещается в int64 (для AOT-модуля).
+    '''
+    return int(digest[:15], 16)
+
+
+# модуль `simulate`, скомпилированный заранее (build_aot.py); XOLM_NO_AOT=1 отключает его.
+# Модуль, собранный из других исходных текстов ядра (хэш `kernel_digest` не совпадает),
+# не используется: его функции могут иметь другую сигнатуру или считать по-старому.
+try:
+    if os.environ.get('XOLM_NO_AOT'):
+        raise ImportError
+    import pogruzhatel_aot
+    try:
+        source_word = digest_word(kernel_digest())
+    except OSError:
+        source_word = None  # исходных текстов нет (сборка auto-py-to-exe) -- модуль собран вместе с ней
+    if source_word is not None and pogruzhatel_aot.kernel_digest() != source_word:
+        raise ImportError
+except (ImportError, AttributeError):
+    pogruzhatel_aot = None
+    # без AOT-модуля компилируем `simulate` при импорте (или читаем из кэша), а не при первом расчёте
+    simulate.compile(SIMULATE_SIGNATURE)
+
+
+def get_simulate():
+    '''
+    Возвращает функцию `simulate`: из AOT-модуля `pogruzhatel_aot`, если он собран из текущих
+    исходных текстов ядра, иначе JIT-версию.
+    Аргументы должны соответствовать `SIMULATE_SIGNATURE` (см. `main_args`).
+    '''
+    if pogruzhatel_aot is not None:
+        return pogruzhatel_aot.simulate
+    return simulate
+
+
+def get_summary():
+    '''
+    Возвращает функцию `simulate_summary`: из AOT-модуля `pogruzhatel_aot`, если он собран
+    из текущих исходных текстов ядра, иначе JIT-версию (компилируется при первом вызове).
+    Аргументы должны соответствовать `SUMMARY_SIGNATURE`.
+    '''
+    return getattr(pogruzhatel_aot, 'simulate_summary', simulate_summary)
+
+
+def default_depths(l_pile: float, step: float = 0.1) -> np.ndarray:
+    '''
+    Возвращает глубины через каждые `step` м до длины сваи `l_pile` включительно (для `summary`).
+    '''
+    return step * np.arange(1, int(l_pile / step + 1e-9) + 1)
+
+
+def summary(params: dict, depths=None, control: np.ndarray = None) -> dict:
+    '''
+    Расчёт погружения по словарю параметров `params` (см. `main_args`) без траектории,
+    только итоги (см. `run_summary`). Память не зависит от длительности погружения.
+    depths -- глубины (м) для времени их достижения, по умолчанию -- через 0.1 м (`default_depths`);
+    control -- массив управления (см. `simulate`).
+    Возвращает словарь:
+    status -- причина окончания: `full_depth`, `refusal`, `table_end`, `broken` (свая сломалась)
+              или `cancelled` (см. `STATUS_NAMES`);
+    t_end, x_end, w_end -- время, глубина и обороты в конце расчёта;
+    impulse_max, impulse_rms -- наибольший модуль и среднеквадратичное по времени значение силы импульса;
+    w_refusal -- обороты при отказе (nan, если отказа не было);
+    steps -- количество моментов времени;
+    depths, t_depths -- глубины и время их первого достижения (nan -- не достигнута).
+    '''
+    args = main_args(params)
+    if depths is None:
+        depths = default_depths(args[MAIN_PARAMS.index('l_pile')])
+    depths = np.sort(np.asarray(depths, dtype=np.float64))
+    if control is None:
+        control = np.zeros(CONTROL_SIZE)
+    out, t_depths = get_summary()(*args, depths, control)
+    return {
+        'status': STATUS_NAMES[int(out[SUMMARY_STATUS])],
+        't_end': float(out[SUMMARY_T_END]),
+        'x_end': float(out[SUMMARY_X_END]),
+        'w_end': float(out[SUMMARY_W_END]),
+        'impulse_max': float(out[SUMMARY_IMPULSE_MAX]),
+        'impulse_rms': float(out[SUMMARY_IMPULSE_RMS]),
+        'w_refusal': float(out[SUMMARY_W_REFUSAL]),
+        'steps': int(out[SUMMARY_STEPS]),
+        'depths': depths,
+        't_depths': t_depths,
+    }
+
+
+def start(params: dict) -> SimState:
+    '''
+    Возвращает начальное состояние расчёта по словарю параметров `main` (см. `main_args`).
+    '''
+    return init_state(*main_args(params))
+
+
+def envelope(params: dict, cycle_tol: float = 1e-5):
+    '''
+    Быстрый расчёт погружения с перескоком периодов силы импульса (см. `run_envelope`).
+    params -- параметры `main` (см. `main_args`), расчёт только с постоянным шагом (`tol` = 0);
+    cycle_tol -- допустимая оценка погрешности глубины (м) за один перескок.
+    Возвращает x, t, w, all_impulse и накопленную оценку погрешности осреднения err.
+    '''
+    if params.get('tol'):
+        raise ValueError('Расчёт с перескоком периодов -- только с постоянным шагом (tol = 0)')
+    return run_envelope(start(params), cycle_tol, np.zeros(CONTROL_SIZE))
+
+
+def counters(control: np.ndarray) -> dict:
+    '''
+    Возвращает счётчики расчёта из массива управления `control` (см. `simulate`) словарём:
+    steps -- пройдено шагов, stalled -- из них пропущено как простой сваи,
+    samples -- сохранено моментов времени, decimated -- отброшено прореживанием,
+    ticks -- проверок оборотов, rpm_changes -- смен оборотов,
+    growths -- увеличений буферов траектории,
+    time_steps, time_store -- время расчёта шагов и хранения траектории (с, только при профилировании).
+    '''
+    steps = int(control[CONTROL_STEPS])
+    samples = int(control[CONTROL_SAMPLES])
+    return {
+        'steps': steps,
+        'stalled': int(control[CONTROL_STALLED]),
+        'samples': samples,
+        'decimated': max(steps - samples, 0),
+        'ticks': int(control[CONTROL_TICKS]),
+        'rpm_changes': int(control[CONTROL_RPM_CHANGES]),
+        'growths': int(control[CONTROL_GROWTHS]),
+        'time_steps': float(control[CONTROL_TIME_STEPS]),
+        'time_store': float(control[CONTROL_TIME_STORE]),
+    }
+
+
+def instrumented(params: dict, max_points: int = 0, profile: bool = True):
+    '''
+    Расчёт `simulate` по словарю параметров `params` (см. `main_args`) со счётчиками.
+    max_points -- см. `main`; profile -- замерять время этапов расчёта (расчёт JIT-версией `simulate`,
+                  см. `clock`; без замеров -- функцией `get_simulate`).
+    Возвращает x, t, w, all_impulse и словарь счётчиков `counters`,
+    дополненный полным временем расчёта wall (с) и скоростью steps_per_s (шагов в секунду).
+    '''
+    control = np.zeros(CONTROL_SIZE)
+    control[CONTROL_PROFILE] = profile
+    if profile:
+        kernel = simulate
+        kernel.compile(SIMULATE_SIGNATURE)  # при AOT-модуле JIT-версия компилируется до замера
+    else:
+        kernel = get_simulate()
+    started = time.perf_counter()
+    x, t, w, all_impulse = kernel(*main_args(params), max_points, control)
+    wall = time.perf_counter() - started
+    stats = counters(control)
+    stats['wall'] = wall
+    stats['steps_per_s'] = stats['steps'] / wall if wall > 0 else 0.0
+    return x, t, w, all_impulse, stats
 
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     # параметры системы
     g = 9.81
     n = 6  # количество пар дебалансов
@@ -245,7 +1885,7 @@ if __name__ == '__main__':
         1.01,
     ]
 
-    # Получение данных погружения без погрешностей и шумов
+    # Получение данных погружения без погрешностей и шумов
     x, t, w, all_impulse = main(
         g, dt, l_pile, P, S, M,
         gamma_cr, gamma_cf,
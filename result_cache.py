@@ -0,0 +1,232 @@
+'''
+Кэш результатов расчёта по хэшу параметров.
+
+Расчёт `pogruzhatel_jit.main` детерминирован: одни и те же параметры (а при шумах --
+и одно и то же зерно `seed`) дают те же траектории. Поэтому результат можно взять
+из кэша по ключу -- хэшу всех аргументов `main`, количества сохраняемых моментов
+`max_points` и исходных текстов ядра (после изменения ядра старые результаты не находятся).
+Два уровня: в памяти (LRU с ограничением по объёму) и на диске (файлы `.npz`
+в каталоге с ограничением по объёму, вытесняются давно не использованные).
+'''
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import pogruzhatel_jit
+
+# параметры шумов: если все нулевые, зерно на результат не влияет
+NOISE_PARAMS = ('theta_noise', 'rpm_noise_scale', 'm_debs_noise_scale', 'R_debs_noise_scale')
+try:
+    KERNEL_DIGEST = pogruzhatel_jit.kernel_digest()
+except OSError:
+    # исходных текстов нет (сборка auto-py-to-exe): ядро сборки определяет хэш, встроенный
+    # в AOT-модуль, а без него -- постоянная строка
+    if pogruzhatel_jit.pogruzhatel_aot is not None:
+        KERNEL_DIGEST = f'aot:{pogruzhatel_jit.pogruzhatel_aot.kernel_digest()}'
+    else:
+        KERNEL_DIGEST = 'frozen'
+
+
+def params_key(params: dict, max_points: int = 0):
+    '''
+    Возвращает ключ кэша (hex-строку) для расчёта с параметрами `params` (см. `pogruzhatel_jit.main_args`)
+    и `max_points` или None, если расчёт не повторяется: при шумах без явного зерна `seed`.
+    Параметры приводятся так же, как для `main`, поэтому пропущенный параметр и его значение
+    по умолчанию, 1 и 1.0, список и массив дают один ключ; без шумов зерно в ключ не входит.
+    '''
+    args = dict(zip(pogruzhatel_jit.MAIN_PARAMS, pogruzhatel_jit.main_args(params)))
+    if any(args[name] for name in NOISE_PARAMS):
+        if args['seed'] < 0:
+            return None
+    else:
+        args['seed'] = 0
+    digest = hashlib.sha256(KERNEL_DIGEST.encode())
+    update_digest(digest, args)
+    digest.update(b'max_points=%d' % max_points)
+    return digest.hexdigest()
+
+
+def update_digest(digest, args: dict):
+    '''
+    Добавляет в хэш `digest` имена и значения аргументов `main` из словаря `args`.
+    '''
+    for name, value in args.items():
+        digest.update(name.encode())
+        if isinstance(value, np.ndarray):
+            digest.update(b'a%d:' % len(value))
+            digest.update(value.astype('<f8').tobytes())
+        else:
+            digest.update(repr(value).encode())
+
+
+def params_seed(params: dict) -> int:
+    '''
+    Возвращает зерно шумов, определяемое остальными параметрами `params` (зерно `seed`
+    не учитывается): повторный расчёт с теми же параметрами получает то же зерно
+    и берётся из кэша.
+    '''
+    digest = hashlib.sha256()
+    update_digest(digest, dict(zip(pogruzhatel_jit.MAIN_PARAMS, pogruzhatel_jit.main_args({**params, 'seed': 0}))))
+    return int(digest.hexdigest()[:15], 16)
+
+
+class ResultCache:
+    '''
+    Двухуровневый кэш результатов x, t, w, all_impulse (см. `main`).
+    memory_bytes -- наибольший объём результатов в памяти;
+    path -- каталог уровня на диске (None -- без диска), disk_bytes -- наибольший объём его файлов;
+            если каталог не создаётся или в него не записывается файл, кэш работает только в памяти.
+    Результаты из кэша -- массивы только для чтения, общие для всех получателей.
+    Счётчики обращений -- `stats`.
+    '''
+
+    def __init__(self, memory_bytes: int = 256 * 2 ** 20, path: str = None, disk_bytes: int = 2 ** 30):
+        self.memory_bytes = memory_bytes
+        self.path = path
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(('memory_hits', 'disk_hits', 'misses', 'uncacheable', 'evictions'), 0)
+        if path:
+            try:
+                os.makedirs(path, exist_ok=True)
+            except OSError:
+                self.path = None
+
+    def stats(self) -> dict:
+        '''
+        Возвращает счётчики: memory_hits, disk_hits -- попадания по уровням, misses -- промахи,
+        uncacheable -- расчёты без ключа, evictions -- вытесненные результаты;
+        memory_items, memory_bytes -- занятость уровня в памяти.
+        '''
+        with self.lock:
+            return {**self.counts, 'memory_items': len(self.memory), 'memory_bytes': self.memory_size}
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key: str):
+        '''
+        Возвращает результат по ключу `key` или None. Результат с диска переносится в память.
+        '''
+        if key is None:
+            with self.lock:
+                self.counts['uncacheable'] += 1
+            return None
+        with self.lock:
+            result = self.memory.get(key)
+            if result is not None:
+                self.memory.move_to_end(key)
+                self.counts['memory_hits'] += 1
+                return result
+        if self.path:
+            try:
+                with np.load(self.file(key)) as data:
+                    result = tuple(data[name] for name in ('x', 't', 'w', 'impulse'))
+                # время изменения файла -- время последнего использования (для вытеснения)
+                os.utime(self.file(key))
+            except (OSError, KeyError, ValueError):
+                result = None
+            if result is not None:
+                self.remember(key, result)
+                with self.lock:
+                    self.counts['disk_hits'] += 1
+                return result
+        with self.lock:
+            self.counts['misses'] += 1
+        return None
+
+    def put(self, key: str, result: tuple) -> tuple:
+        '''
+        Сохраняет результат `result` по ключу `key` в память и на диск.
+        Возвращает результат в виде массивов только для чтения.
+        '''
+        result = tuple(np.array(a, dtype=np.float64) for a in result)
+        if key is None:
+            return result
+        self.remember(key, result)
+        if self.path:
+            # запись через временный файл: параллельные читатели не видят недописанный файл
+            temp = self.file(key) + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(temp, 'wb') as f:
+                    np.savez(f, **dict(zip(('x', 't', 'w', 'impulse'), result)))
+                os.replace(temp, self.file(key))
+                self.evict_disk()
+            except OSError:
+                # каталог недоступен для записи или диск заполнен -- дальше только память
+                self.path = None
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+        return result
+
+    def remember(self, key: str, result: tuple):
+        for a in result:
+            a.setflags(write=False)
+        size = sum(a.nbytes for a in result)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return
+            self.memory[key] = result
+            self.memory_size += size
+            while self.memory_size > self.memory_bytes and len(self.memory) > 1:
+                _, old = self.memory.popitem(last=False)
+                self.memory_size -= sum(a.nbytes for a in old)
+                self.counts['evictions'] += 1
+
+    def evict_disk(self):
+        '''
+        Удаляет давно не использованные файлы, пока их объём больше `disk_bytes`.
+        '''
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self.lock:
+                self.counts['evictions'] += 1
+
+    def clear(self):
+        '''
+        Очищает оба уровня кэша.
+        '''
+        with self.lock:
+            self.memory.clear()
+            self.memory_size = 0
+        if self.path:
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.npz'):
+                    os.remove(entry.path)
+
+    def run(self, params: dict, max_points: int = 0) -> tuple:
+        '''
+        Возвращает результат расчёта `main` с параметрами `params` из кэша или считает его и сохраняет.
+        '''
+        key = params_key(params, max_points)
+        result = self.get(key)
+        if result is None:
+            result = self.put(key, pogruzhatel_jit.main(*pogruzhatel_jit.main_args(params), max_points))
+        return result
+
+
+def default_path() -> str:
+    '''
+    Каталог кэша на диске: переменная окружения XOLM_CACHE_DIR или ~/.cache/xolm3/results.
+    '''
+    return os.environ.get('XOLM_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'xolm3', 'results')
@@ -0,0 +1,204 @@
+'''
+Расчёт погружения всех свай площадки одной машинкой.
+
+Сваи площадки различаются длиной, сечением (`P`, `S`), массой `M` и грунтом
+(`gamma_cr`, `fi`, слои `soil_depth`/`soil_tip`/`soil_side`), а машинка и управление
+оборотами (дебалансы, `dw` или `t_table`/`w_table`, шумы, шаг `dt`) у них общие.
+Параметры свай передаются в ядро массивами по сваям (слои грунта всех свай -- подряд
+в общих массивах со смещениями), сваи считаются параллельно на всех ядрах (`prange`),
+каждая до своей причины окончания, без траекторий (`pogruzhatel_jit.run_summary`).
+Итоги возвращаются одной таблицей -- словарём столбцов по сваям.
+
+Запуск: `python site_plan.py PILES [PILES ...] --base FILE --out TABLE [--depths D ...] [--seed N]`,
+файлы свай -- в формате сценариев `batch.py` (JSON или CSV, `name` -- имя сваи),
+таблица -- `.csv` или `.npz`.
+'''
+import argparse
+import csv
+import json
+
+import numba
+import numpy as np
+from numba import jit, prange
+
+import batch
+import pogruzhatel_jit
+import sweep
+
+# параметры, которые у каждой сваи свои (остальные параметры `main` общие для площадки)
+PILE_PARAMS = ('l_pile', 'P', 'S', 'M', 'gamma_cr', 'fi', 'soil_depth', 'soil_tip', 'soil_side', 'seed')
+# столбцы таблицы итогов из параметров свай
+PILE_COLUMNS = ('l_pile', 'P', 'S', 'M', 'gamma_cr', 'fi', 'seed')
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def site_kernel(
+    g, dt, l_pile, P, S, M,
+    gamma_cr, gamma_cf,
+    fi,
+    m_debs, R_debs,
+    m_debs_custom_noise, R_debs_custom_noise,
+    theta_noise,
+    rpm_noise_scale,
+    m_debs_noise_scale,
+    R_debs_noise_scale,
+    dw,
+    t_table, w_table,
+    tol,
+    soil_offsets, soil_depth, soil_tip, soil_side,
+    seeds, depths
+):
+    '''
+    Считает погружение каждой сваи площадки и возвращает итоги:
+    out -- матрица (свая, ячейка `pogruzhatel_jit.SUMMARY_*`);
+    t_depths -- матрица (свая, глубина `depths`) времени достижения глубин (nan -- не достигнута).
+    Параметры -- как у `pogruzhatel_jit.main`, но `l_pile`, `P`, `S`, `M`, `gamma_cr`, `fi`
+    и зёрна `seeds` -- массивы по сваям, а слои грунта сваи `k` -- элементы
+    `soil_offsets[k]`...`soil_offsets[k + 1] - 1` массивов `soil_depth`, `soil_tip`, `soil_side`.
+    '''
+    n_piles = l_pile.shape[0]
+    out = np.empty((n_piles, pogruzhatel_jit.SUMMARY_SIZE))
+    t_depths = np.empty((n_piles, depths.shape[0]))
+    for k in prange(n_piles):
+        start = soil_offsets[k]
+        stop = soil_offsets[k + 1]
+        state = pogruzhatel_jit.init_state(
+            g, dt, l_pile[k], P[k], S[k], M[k],
+            gamma_cr[k], gamma_cf,
+            fi[k],
+            m_debs, R_debs,
+            m_debs_custom_noise, R_debs_custom_noise,
+            theta_noise,
+            rpm_noise_scale,
+            m_debs_noise_scale,
+            R_debs_noise_scale,
+            dw,
+            t_table, w_table,
+            tol,
+            soil_depth[start:stop], soil_tip[start:stop], soil_side[start:stop],
+            seeds[k]
+        )
+        control = np.zeros(pogruzhatel_jit.CONTROL_SIZE)
+        out[k], t_depths[k] = pogruzhatel_jit.run_summary(state, depths, control)
+    return out, t_depths
+
+
+def pile_arrays(base: dict, piles: list, seed: int = 0) -> dict:
+    '''
+    Возвращает параметры свай массивами по сваям (`PILE_PARAMS`, зёрна -- `seed`)
+    и слои грунта всех свай подряд со смещениями `soil_offsets`.
+    Непереданные параметры сваи берутся из общих параметров `base`; свае с шумами
+    без своего зерна назначается зерно `seed + номер сваи` (см. `batch.prepare`).
+    '''
+    columns = {name: [] for name in PILE_PARAMS}
+    soil_offsets = [0]
+    for index, pile in enumerate(piles):
+        shared = set(pile) - set(PILE_PARAMS) - {'name'}
+        if shared:
+            raise KeyError(f'Параметры общие для площадки, а не для сваи: {", ".join(sorted(shared))}')
+        args = dict(zip(pogruzhatel_jit.MAIN_PARAMS, pogruzhatel_jit.main_args(batch.prepare(pile, base, index, seed))))
+        # проверка слоёв грунта сваи до расчёта: в параллельном ядре ошибка не указала бы на сваю
+        pogruzhatel_jit.soil_profile(
+            args['soil_depth'], args['soil_tip'], args['soil_side'], args['gamma_cr'], args['S'], args['P'], args['fi']
+        )
+        for name in PILE_PARAMS:
+            columns[name].append(args[name])
+        soil_offsets.append(soil_offsets[-1] + len(args['soil_depth']))
+    arrays = {
+        name: np.concatenate(columns[name]) if name in pogruzhatel_jit.MAIN_ARRAYS else np.array(columns[name])
+        for name in PILE_PARAMS
+    }
+    arrays['seed'] = arrays['seed'].astype(np.int64)
+    arrays['soil_offsets'] = np.array(soil_offsets, dtype=np.int64)
+    return arrays
+
+
+def simulate_site(base: dict, piles: list, depths=None, seed: int = 0) -> dict:
+    '''
+    Считает погружение всех свай площадки и возвращает таблицу итогов -- словарь столбцов
+    (массивов по сваям): `pile` (имя сваи, см. `batch.scenario_ids`), параметры свай
+    `PILE_COLUMNS`, поля `sweep.SUMMARY_FIELDS` и время достижения глубин `depths`
+    (столбцы `sweep.depth_column`, nan -- глубина не достигнута).
+
+    Параметры:
+    base -- общие параметры `pogruzhatel_jit.main` (машинка, управление, шумы);
+    piles -- список словарей параметров свай (`PILE_PARAMS` и необязательное имя `name`);
+    depths -- глубины (м), по умолчанию -- через 0.1 м до длины самой длинной сваи;
+    seed -- начальное зерно свай с шумами без своего зерна.
+    '''
+    if not piles:
+        raise ValueError('Не задано ни одной сваи')
+    arrays = pile_arrays(base, piles, seed)
+    if depths is None:
+        depths = pogruzhatel_jit.default_depths(arrays['l_pile'].max())
+    depths = np.sort(np.asarray(depths, dtype=np.float64))
+    # общие параметры -- из параметров первой сваи, её собственные заменяются массивами по сваям
+    args = dict(zip(pogruzhatel_jit.MAIN_PARAMS, pogruzhatel_jit.main_args(batch.prepare(piles[0], base, 0, seed))))
+    args.update({name: arrays[name] for name in PILE_PARAMS})
+
+    # сваи разной длины считаются разное время, поэтому потоки берут сваи по одной
+    with numba.parallel_chunksize(1):
+        out, t_depths = site_kernel(
+            *(args[name] for name in pogruzhatel_jit.MAIN_PARAMS[:-4]),
+            arrays['soil_offsets'], *(args[name] for name in ('soil_depth', 'soil_tip', 'soil_side')),
+            arrays['seed'], depths
+        )
+
+    status = np.array([pogruzhatel_jit.STATUS_NAMES[int(code)] for code in out[:, pogruzhatel_jit.SUMMARY_STATUS]])
+    full_depth = status == 'full_depth'
+    t_end = out[:, pogruzhatel_jit.SUMMARY_T_END]
+    table = {'pile': np.array(batch.scenario_ids(piles))}
+    table.update({name: arrays[name] for name in PILE_COLUMNS})
+    table.update({
+        'status': status,
+        'full_depth': full_depth,
+        't_full_depth': np.where(full_depth, t_end, np.nan),
+        't_end': t_end,
+        'x_end': out[:, pogruzhatel_jit.SUMMARY_X_END],
+        'w_end': out[:, pogruzhatel_jit.SUMMARY_W_END],
+        'impulse_max': out[:, pogruzhatel_jit.SUMMARY_IMPULSE_MAX],
+        'impulse_rms': out[:, pogruzhatel_jit.SUMMARY_IMPULSE_RMS],
+        'w_refusal': out[:, pogruzhatel_jit.SUMMARY_W_REFUSAL],
+        'steps': out[:, pogruzhatel_jit.SUMMARY_STEPS].astype(np.int64),
+    })
+    for j, depth in enumerate(depths):
+        table[sweep.depth_column(depth)] = t_depths[:, j]
+    return table
+
+
+def write_table(path: str, table: dict):
+    '''
+    Записывает таблицу итогов `table` (см. `simulate_site`) в `.npz` или `.csv`.
+    '''
+    if path.endswith('.npz'):
+        np.savez(path, **table)
+        return
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(table)
+        writer.writerows(zip(*(column.tolist() for column in table.values())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('piles', nargs='+', help='файлы свай (JSON или CSV, см. batch.py)')
+    parser.add_argument('--base', required=True, help='общие параметры площадки (JSON)')
+    parser.add_argument('--out', required=True, help='таблица итогов (.csv или .npz)')
+    parser.add_argument('--depths', type=float, nargs='+', help='глубины для времени их достижения (м)')
+    parser.add_argument('--seed', type=int, default=0, help='начальное зерно свай с шумами без зерна')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    piles = [pile for path in args.piles for pile in batch.load_scenarios(path)]
+    try:
+        table = simulate_site(base, piles, args.depths, args.seed)
+    except (KeyError, ValueError) as e:
+        parser.exit(2, f'{parser.prog}: ошибка в параметрах свай: {e}\n')
+    write_table(args.out, table)
+    counts = {name: int((table['status'] == name).sum()) for name in np.unique(table['status'])}
+    print(f'Свай: {len(piles)}, ' + ', '.join(f'{name}: {count}' for name, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+'''
+Расчёт сетки параметров грунта и сваи на нескольких ядрах.
+
+Каждая точка -- полный расчёт без траектории `pogruzhatel_jit.summary`: ядро сразу
+сворачивает моменты времени в итоги, поэтому память на точку не зависит от длительности
+погружения. Ядро скомпилировано с `nogil=True`, поэтому точки считаются параллельно
+в пуле потоков без копирования данных между процессами. Итоги по точкам записываются в CSV по мере готовности,
+по окончании -- при необходимости в NPZ.
+'''
+import csv
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import pogruzhatel_jit
+
+# поля итогов расчёта одной точки
+SUMMARY_FIELDS = (
+    'status', 'full_depth', 't_full_depth', 't_end', 'x_end', 'w_end', 'impulse_max', 'impulse_rms',
+    'w_refusal', 'steps'
+)
+
+
+def grid_points(axes: dict) -> list:
+    '''
+    Возвращает список словарей всех сочетаний значений осей `axes`
+    (например, `{'gamma_cr': [1.0, 1.1], 'fi': [15000.0, 17000.0]}`).
+    '''
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def summarize(l_pile: float, x: np.ndarray, t: np.ndarray, w: np.ndarray, impulse: np.ndarray) -> dict:
+    '''
+    Возвращает итоги одного расчёта по его траекториям:
+    status -- причина окончания: `full_depth` (свая погружена), `refusal` (обороты достигли 50 об./с)
+              или `table_end` (закончились табличные данные);
+    full_depth -- свая погружена полностью;
+    t_full_depth -- время полного погружения (nan, если свая не погружена);
+    t_end, x_end, w_end -- время, глубина и обороты в конце расчёта;
+    impulse_max -- наибольший модуль силы импульса;
+    impulse_rms -- среднеквадратичная по времени сила импульса;
+    w_refusal -- обороты при отказе (nan, если отказа не было);
+    steps -- количество моментов времени.
+    '''
+    full_depth = bool(x[-1] >= l_pile)
+    if full_depth:
+        status = 'full_depth'
+    elif w[-1] >= 50:
+        status = 'refusal'
+    else:
+        status = 'table_end'
+    impulse_rms = np.sqrt(np.sum(impulse[1:] ** 2 * np.diff(t)) / t[-1]) if t[-1] > 0 else np.abs(impulse).max()
+    return {
+        'status': status,
+        'full_depth': full_depth,
+        't_full_depth': float(t[-1]) if full_depth else np.nan,
+        't_end': float(t[-1]),
+        'x_end': float(x[-1]),
+        'w_end': float(w[-1]),
+        'impulse_max': float(np.abs(impulse).max()),
+        'impulse_rms': float(impulse_rms),
+        'w_refusal': float(w[-1]) if status == 'refusal' else np.nan,
+        'steps': len(t),
+    }
+
+
+def depth_column(depth: float) -> str:
+    '''
+    Возвращает имя столбца времени достижения глубины `depth` (например, `t_x0.5`).
+    '''
+    return f't_x{depth:g}'
+
+
+def run_point(params: dict, depths=None) -> dict:
+    '''
+    Считает одну точку без траектории (`pogruzhatel_jit.summary`) и возвращает её итоги
+    (поля `SUMMARY_FIELDS`, см. `summarize`), а для глубин `depths` -- и время их достижения
+    (столбцы `depth_column`). Поломка сваи возвращается со статусом `broken` и итогами
+    до поломки.
+    '''
+    result = pogruzhatel_jit.summary(params, depths if depths is not None else ())
+    result['full_depth'] = result['status'] == 'full_depth'
+    result['t_full_depth'] = result['t_end'] if result['full_depth'] else np.nan
+    row = {name: result[name] for name in SUMMARY_FIELDS}
+    for depth, t_depth in zip(result['depths'], result['t_depths']):
+        row[depth_column(depth)] = float(t_depth)
+    return row
+
+
+def sweep(
+    base_params: dict, axes: dict = None, points: list = None, out: str = None, workers: int = None,
+    depths=None
+) -> list:
+    '''
+    Считает все точки сетки и возвращает список строк итогов в порядке точек.
+    Каждая строка -- номер точки `point`, значения изменяемых параметров, поля `SUMMARY_FIELDS`
+    и время достижения глубин `depths` (столбцы `depth_column`).
+
+    Параметры:
+    base_params -- общие параметры `pogruzhatel_jit.main` для всех точек;
+    axes -- оси сетки (см. `grid_points`);
+    points -- явный список изменений параметров для каждой точки, вместо `axes`;
+    out -- путь к таблице итогов: `.csv` дописывается по мере расчёта точек, `.npz` сохраняется в конце;
+    workers -- количество потоков, по умолчанию по количеству ядер;
+    depths -- глубины (м), время достижения которых добавляется в итоги (None -- без них).
+    '''
+    if (axes is None) == (points is None):
+        raise ValueError('Нужно задать либо `axes`, либо `points`')
+    if points is None:
+        points = grid_points(axes)
+    varied = sorted({name for point in points for name in point if np.ndim(point[name]) == 0})
+    if depths is not None:
+        depths = np.sort(np.asarray(depths, dtype=np.float64))
+    columns = ['point', *varied, *SUMMARY_FIELDS, *(depth_column(d) for d in (depths if depths is not None else ()))]
+    workers = workers or os.cpu_count()
+
+    rows = [None] * len(points)
+    csv_file = open(out, 'w', newline='') if out and out.endswith('.csv') else None
+    try:
+        writer = None
+        if csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+
+        def record(index: int, summary: dict):
+            params = {**pogruzhatel_jit.MAIN_DEFAULTS, **base_params, **points[index]}
+            row = {'point': index, **{name: params[name] for name in varied}}
+            row.update(summary)
+            rows[index] = row
+            if writer:
+                writer.writerow(row)
+                csv_file.flush()
+
+        # пустая сетка -- пустые итоги (в таблице `.csv` только заголовок)
+        if points:
+            # первая точка компилирует ядро или читает его из кэша, не занимая пул
+            record(0, run_point({**base_params, **points[0]}, depths))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(run_point, {**base_params, **points[index]}, depths): index
+                    for index in range(1, len(points))
+                }
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    if out and out.endswith('.npz'):
+        np.savez(out, **{name: np.array([row[name] for row in rows]) for name in columns})
+    return rows
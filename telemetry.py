@@ -0,0 +1,267 @@
+'''
+Расчёт погружения одновременно с работой машинки по поступающим оборотам.
+
+Вместо таблицы `t_table`/`w_table` обороты поступают отсчётами `t,w[,x]` (время, с;
+обороты, об./с; необязательно -- измеренная глубина, м), по строке на отсчёт:
+из дописываемого файла, из канала (стандартный ввод) или через локальный сокет TCP.
+По каждой порции отсчётов расчёт продолжается (`pogruzhatel_jit.advance_into`) до времени
+последнего отсчёта, и сразу публикуются рассчитанные глубина, обороты и сила импульса.
+Обороты меняются, как и при табличном управлении, только на проверках оборотов
+(раз в секунду модельного времени): на проверке устанавливаются обороты последнего
+отсчёта, полученного раньше неё. Задержка публикации ограничена временем расчёта шагов
+между отсчётами (при частоте отсчётов 1 кГц и `dt` = 1 мс -- один шаг на отсчёт);
+если отсчёты приходят быстрее, чем считаются, накопившиеся отсчёты считаются одной
+порцией и публикуются одной записью. Расчёт только с постоянным шагом (`tol` = 0).
+
+Запуск: `python telemetry.py SOURCE --base FILE [--out FILE]`, SOURCE -- путь к файлу
+(читается по мере дописывания), `-` (стандартный ввод) или `tcp://HOST:PORT`
+(ожидание подключения источника).
+'''
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import pogruzhatel_jit
+
+BUFFER = 2 ** 16  # байт за одно чтение источника
+POLL = 0.0005  # период опроса дописываемого файла (с)
+CHUNK = 4096  # наибольшее количество шагов за один вызов ядра
+# поля публикуемой записи
+FIELDS = ('t', 'x', 'w', 'impulse', 'impulse_peak', 'x_measured', 'samples', 'status')
+
+
+def parse_line(line: str):
+    '''
+    Возвращает отсчёт (t, w, x) из строки `line` (x -- nan, если глубина не измерена)
+    или None для пустой строки, заголовка и комментария (`#`).
+    '''
+    cells = line.replace(';', ',').split(',')
+    try:
+        t = float(cells[0])
+        w = float(cells[1])
+        x = float(cells[2]) if len(cells) > 2 and cells[2].strip() else math.nan
+    except (ValueError, IndexError):
+        return None
+    return t, w, x
+
+
+def line_batches(read, follow: bool = False, stop: threading.Event = None):
+    '''
+    Возвращает порции строк источника: каждая порция -- все целые строки, прочитанные
+    одним вызовом `read()` (байты, пустые -- конец данных).
+    follow -- не заканчивать на конце данных, а ждать дописывания (файл);
+    stop -- событие, по которому чтение прекращается.
+    '''
+    tail = b''
+    while stop is None or not stop.is_set():
+        data = read()
+        if not data:
+            if not follow:
+                break
+            time.sleep(POLL)
+            continue
+        *lines, tail = (tail + data).split(b'\n')
+        if lines:
+            yield [line.decode('utf-8', 'replace') for line in lines]
+    if tail.strip():
+        yield [tail.decode('utf-8', 'replace')]
+
+
+@contextmanager
+def open_source(spec: str, stop: threading.Event = None):
+    '''
+    Открывает источник отсчётов `spec` и возвращает порции его строк (см. `line_batches`):
+    `-` -- стандартный ввод (канал); `tcp://HOST:PORT` -- ожидание подключения на адресе
+    и чтение из соединения; иначе -- путь к файлу, который читается по мере дописывания.
+    '''
+    if spec == '-':
+        yield line_batches(lambda: os.read(sys.stdin.fileno(), BUFFER), stop=stop)
+    elif spec.startswith('tcp://'):
+        host, port = spec[len('tcp://'):].rsplit(':', 1)
+        with socket.create_server((host, int(port))) as server:
+            connection, _ = server.accept()
+        with connection:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            yield line_batches(lambda: connection.recv(BUFFER), stop=stop)
+    else:
+        with open(spec, 'rb') as f:
+            yield line_batches(lambda: f.read(BUFFER), follow=True, stop=stop)
+
+
+class LiveModel:
+    '''
+    Расчёт погружения, продолжаемый по мере поступления отсчётов оборотов (`feed`).
+    params -- параметры `pogruzhatel_jit.main` (см. `main_args`); управление оборотами
+              `dw`, `t_table`, `w_table` не используется;
+    chunk -- наибольшее количество шагов за один вызов ядра (размер буферов).
+
+    Таблица оборотов состояния -- одна строка: время `inf` (обороты не меняются)
+    или `-inf` с новыми оборотами (применяются на ближайшей проверке оборотов), поэтому
+    расчёт не заканчивается по концу таблицы.
+    '''
+
+    def __init__(self, params: dict, chunk: int = CHUNK):
+        if params.get('tol'):
+            raise ValueError('Расчёт по поступающим оборотам -- только с постоянным шагом (tol = 0)')
+        self.state = pogruzhatel_jit.start({**params, 'dw': 0.0, 't_table': (math.inf,), 'w_table': (0.0,)})
+        self.dt = self.state.scal[pogruzhatel_jit.S_DT]
+        self.period = int(self.state.scal[pogruzhatel_jit.S_PERIOD])
+        self.buffers = tuple(np.empty(chunk) for _ in range(4))
+        self.t_sample = -math.inf  # время последнего отсчёта
+        self.w_sample = None  # обороты последнего отсчёта
+        self.x = self.t = self.w = self.impulse = 0.0
+        self.impulse_peak = 0.0  # наибольший модуль силы импульса после последней записи
+
+    @property
+    def running(self) -> bool:
+        return self.state.scal[pogruzhatel_jit.S_STATUS] == pogruzhatel_jit.STATUS_RUNNING
+
+    @property
+    def status(self) -> str:
+        '''
+        Причина окончания расчёта (`pogruzhatel_jit.STATUS_NAMES`), `running` -- расчёт продолжается.
+        '''
+        code = int(self.state.scal[pogruzhatel_jit.S_STATUS])
+        return 'running' if code == pogruzhatel_jit.STATUS_RUNNING else pogruzhatel_jit.STATUS_NAMES[code]
+
+    def feed(self, t: float, w: float):
+        '''
+        Продолжает расчёт до времени отсчёта `t` и запоминает его обороты `w`.
+        Проверки оборотов до `t` включительно получают обороты предыдущего отсчёта.
+        Отсчёты не новее уже полученных пропускаются.
+        '''
+        if t <= self.t_sample:
+            return
+        scal = self.state.scal
+        pending = self.w_sample if self.w_sample is not None and self.w_sample != scal[pogruzhatel_jit.S_W0] else None
+        self.advance_to(t, pending)
+        self.t_sample = t
+        self.w_sample = w
+
+    def advance_to(self, t_stop: float, pending: float = None):
+        '''
+        Считает все шаги со временем не больше `t_stop`; на первой проверке оборотов
+        устанавливаются обороты `pending` (None -- обороты не меняются).
+        '''
+        state = self.state
+        scal = state.scal
+        x, t, w, all_impulse = self.buffers
+        n_stop = int(t_stop / self.dt + 1e-9) + 1
+        while scal[pogruzhatel_jit.S_I] < n_stop and self.running:
+            i = int(scal[pogruzhatel_jit.S_I])
+            stop = min(n_stop, i + len(x))
+            tick = max(-(-i // self.period), 1) * self.period  # ближайшая проверка оборотов
+            change = pending is not None and tick < stop
+            if change:
+                # порция заканчивается проверкой оборотов, на которой применяются новые обороты
+                stop = tick + 1
+                state.t_table[0] = -math.inf
+                state.w_table[0] = pending
+                scal[pogruzhatel_jit.S_T_INDEX] = 0
+            size = pogruzhatel_jit.advance_into(state, x, t, w, all_impulse, 0, stop - i)
+            if change:
+                state.t_table[0] = math.inf
+                scal[pogruzhatel_jit.S_T_INDEX] = 0
+                pending = None
+            if size:
+                self.x, self.t, self.w, self.impulse = x[size - 1], t[size - 1], w[size - 1], all_impulse[size - 1]
+                self.impulse_peak = max(self.impulse_peak, float(np.abs(all_impulse[:size]).max()))
+
+    def record(self) -> dict:
+        '''
+        Возвращает текущие время, глубину, обороты и силу импульса расчёта, наибольший модуль
+        силы импульса после предыдущей записи и причину окончания (см. `FIELDS`).
+        '''
+        record = {
+            't': float(self.t), 'x': float(self.x), 'w': float(self.w), 'impulse': float(self.impulse),
+            'impulse_peak': self.impulse_peak, 'status': self.status,
+        }
+        self.impulse_peak = 0.0
+        return record
+
+
+def run_live(params: dict, batches, publish, chunk: int = CHUNK) -> LiveModel:
+    '''
+    Считает погружение по порциям строк отсчётов `batches` (см. `open_source`) и после
+    каждой порции вызывает `publish(record)` с записью `LiveModel.record`, дополненной
+    измеренной глубиной последнего отсчёта `x_measured` и количеством отсчётов порции `samples`.
+    Заканчивается с концом источника или расчёта; возвращает модель.
+    '''
+    model = LiveModel(params, chunk)
+    for lines in batches:
+        samples = 0
+        x_measured = math.nan
+        for line in lines:
+            sample = parse_line(line)
+            if sample is None:
+                continue
+            model.feed(sample[0], sample[1])
+            x_measured = sample[2]
+            samples += 1
+        if samples:
+            publish({**model.record(), 'x_measured': x_measured, 'samples': samples})
+        if not model.running:
+            break
+    return model
+
+
+def replay(samples: np.ndarray, address: tuple, rate: float, sent: np.ndarray = None, stop: threading.Event = None):
+    '''
+    Источник для проверки: подключается к `address` (host, port) и отправляет отсчёты
+    `samples` (строки t, w[, x]) с частотой `rate` отсчётов в секунду, по строке на отсчёт.
+    sent -- массив для времени отправки каждого отсчёта (`time.perf_counter`).
+    '''
+    with socket.create_connection(address) as connection:
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        started = time.perf_counter()
+        for k, sample in enumerate(samples):
+            if stop is not None and stop.is_set():
+                break
+            delay = started + k / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if sent is not None:
+                sent[k] = time.perf_counter()
+            try:
+                connection.sendall((','.join(repr(float(value)) for value in sample) + '\n').encode())
+            except OSError:  # приёмник закрыл соединение (расчёт окончен)
+                break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', help='источник отсчётов: файл, `-` (стандартный ввод) или tcp://HOST:PORT')
+    parser.add_argument('--base', required=True, help='параметры расчёта (JSON, см. pogruzhatel_jit.MAIN_PARAMS)')
+    parser.add_argument('--out', help='файл записей (CSV, по умолчанию -- стандартный вывод)')
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='наибольшее количество шагов за вызов ядра')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as f:
+        params = json.load(f)
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    print(','.join(FIELDS), file=out, flush=True)
+
+    def publish(record):
+        print(','.join(str(record[name]) for name in FIELDS), file=out, flush=True)
+
+    try:
+        with open_source(args.source) as batches:
+            model = run_live(params, batches, publish, args.chunk)
+    except KeyboardInterrupt:
+        return
+    finally:
+        if args.out:
+            out.close()
+    print(f'Расчёт: {model.status}, t = {model.t:.3f} с, x = {model.x:.4f} м', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import matplotlib
+import pytest
+
+matplotlib.use('Agg')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+M_DEBS = [2.75758026171761, 0.969494952543874, 0.486348994233291, 0.273755006621712, 0.155229853500278, 0.076567059516108]
+R_DEBS = [0.020070401444444, 0.011900487555556, 0.008428804666667, 0.006323725555556, 0.004761892666667, 0.003344359555556]
+
+
+@pytest.fixture
+def dw_params():
+    '''
+    Короткий расчёт с управлением шагом `dw` (как в окне программы), около 200 с модельного времени.
+    '''
+    return {
+        'g': 9.81, 'dt': 1e-3, 'l_pile': 0.1, 'P': 0.16, 'S': 0.04 * 0.04 - 0.036 * 0.036, 'M': 40.0,
+        'gamma_cr': 1.1, 'gamma_cf': 1.0, 'fi': 17000.0, 'm_debs': M_DEBS, 'R_debs': R_DEBS,
+        'dw': 0.1, 'seed': 1,
+    }
+
+
+@pytest.fixture
+def table_params():
+    '''
+    Короткий расчёт с табличным управлением оборотами, свая погружается за 70 с.
+    '''
+    return {
+        'g': 9.81, 'dt': 1e-3, 'l_pile': 0.3, 'P': 0.08, 'S': 0.02 * 0.02 - 0.018 * 0.018, 'M': 37 + 0.3 * 1.2,
+        'gamma_cr': 1.1, 'gamma_cf': 1.0, 'fi': 17000.0, 'm_debs': M_DEBS, 'R_debs': R_DEBS,
+        't_table': [0.0, 20.0, 40.0, 60.0, 80.0],
+        'w_table': [0.0, 8.0, 10.0, 12.0, 14.0],
+        'seed': 1,
+    }
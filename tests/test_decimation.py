@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import decimation
+import pogruzhatel_jit
+
+
+@pytest.fixture
+def run(table_params):
+    return pogruzhatel_jit.main(*pogruzhatel_jit.main_args(table_params), 0)
+
+
+def test_minmax_indices_keeps_endpoints_without_repeats():
+    y = np.array([0.0, 0.0, 3.0, -1.0, 2.0, 2.0, 2.0, 5.0])
+    assert decimation.minmax_indices(y, 2).tolist() == [0, 2, 3, 7]
+    assert decimation.minmax_indices(y, 100).tolist() == list(range(8))
+    assert decimation.minmax_indices(np.zeros(0), 3).tolist() == []
+
+
+@pytest.mark.parametrize('max_points', [6, 100, 1000, 5000])
+def test_kernel_minmax_keeps_endpoints_and_extrema(table_params, run, max_points):
+    x, t, w, impulse = run
+    control = np.zeros(pogruzhatel_jit.CONTROL_SIZE)
+    out = pogruzhatel_jit.simulate(*pogruzhatel_jit.main_args(table_params), max_points, control)
+    assert len(out[1]) <= max_points
+    assert control[pogruzhatel_jit.CONTROL_SAMPLES] == len(out[1])
+    assert np.all(np.diff(out[1]) > 0)
+    for full, part in zip(run, out):
+        assert part[0] == full[0] and part[-1] == full[-1]
+    if max_points > 6:
+        assert out[3].max() == impulse.max() and out[3].min() == impulse.min()
+    # каждый сохранённый момент -- момент полного расчёта
+    index = np.searchsorted(t, out[1])
+    for full, part in zip(run, out):
+        np.testing.assert_array_equal(full[index], part)
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+@pytest.mark.parametrize('n_out', [10, 1000])
+def test_decimate_keeps_endpoints(run, method, n_out):
+    out = decimation.decimate(*run, n_out, method)
+    assert len(out[1]) <= n_out
+    assert np.all(np.diff(out[1]) > 0)
+    for full, part in zip(run, out):
+        assert part[0] == full[0] and part[-1] == full[-1]
+    if method == 'minmax':
+        assert out[3].max() == run[3].max() and out[3].min() == run[3].min()
@@ -0,0 +1,48 @@
+import numpy as np
+
+import ensemble
+import pogruzhatel_jit
+
+
+def test_resample_to_grid():
+    t = np.array([0.0, 0.4, 0.8, 1.2, 1.6])
+    x = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+    impulse = np.array([1.0, -5.0, 2.0, -3.0, 1.0])
+    t_grid = np.array([0.0, 1.0, 2.0])
+    out_x, out_w, out_impulse = np.empty(3), np.empty(3), np.empty(3)
+    ensemble.resample_to_grid(t, x, x * 10, impulse, t_grid, out_x, out_w, out_impulse)
+    assert out_x.tolist() == [0.0, 2.0, 4.0]
+    assert out_w.tolist() == [0.0, 20.0, 40.0]
+    assert out_impulse[:2].tolist() == [1.0, 5.0]
+    assert np.isnan(out_impulse[2])
+
+
+def test_ensemble_matches_main_and_reports_breakage(dw_params):
+    # шумы оборотов: с зерном 0 свая ломается, с остальными погружается полностью
+    params = {**dw_params, 'rpm_noise_scale': 1e-3}
+    seeds = np.arange(4, dtype=np.int64)
+    t_grid = ensemble.default_grid(params, 301)
+    grid_x, grid_w, grid_impulse, t_full, status = ensemble.ensemble_kernel(
+        *pogruzhatel_jit.main_args(params)[:-1], seeds, t_grid
+    )
+    assert status.tolist() == [pogruzhatel_jit.STATUS_BROKEN] + [pogruzhatel_jit.STATUS_FULL_DEPTH] * 3
+
+    out = np.empty((3, t_grid.shape[0]))
+    for r, seed in enumerate(seeds):
+        if r == 0:
+            # траектория до поломки
+            state = pogruzhatel_jit.start({**params, 'seed': int(seed)})
+            x, t, w, impulse = (np.empty(10 ** 6) for _ in range(4))
+            size = pogruzhatel_jit.advance_into(state, x, t, w, impulse, 0, x.shape[0])
+            x, t, w, impulse = x[:size], t[:size], w[:size], impulse[:size]
+            assert np.isnan(t_full[r])
+        else:
+            x, t, w, impulse = pogruzhatel_jit.main(*pogruzhatel_jit.main_args({**params, 'seed': int(seed)}), 0)
+            assert t_full[r] == t[-1]
+        ensemble.resample_to_grid(t, x, w, impulse, t_grid, *out)
+        np.testing.assert_array_equal(grid_x[r], out[0])
+        np.testing.assert_array_equal(grid_w[r], out[1])
+        np.testing.assert_array_equal(grid_impulse[r], out[2])
+
+    result = ensemble.ensemble(params, 4, 1, t_grid)
+    assert result['broken_share'] + result['full_depth_share'] <= 1
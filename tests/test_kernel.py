@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import pogruzhatel_jit
+
+
+def test_xi_matches_xi_next():
+    x = np.array([0.0, 0.1, 0.0])
+    assert pogruzhatel_jit.xi(x, 2, 100.0, 0.08, 50.0, 1e-3, 17000.0, 10.0) == \
+        pogruzhatel_jit.xi_next(0.1, 0.0, 2, 100.0, 0.08, 50.0, 1e-3, 17000.0, 10.0)
+
+
+def test_xi_next_friction_from_perimeter():
+    # трение по боковой поверхности P * fi * x_1 задаётся через периметр, как раньше
+    P, fi, x_1 = 0.08, 17000.0, 0.5
+    expected = pogruzhatel_jit.depth_step(x_1, 0.5, 100.0, 50.0, 1e-3, 10.0, P * fi * x_1)
+    assert pogruzhatel_jit.xi_next(x_1, 0.5, 2, 100.0, P, 50.0, 1e-3, fi, 10.0) == expected
+
+
+def test_xi_next_raises_when_broken():
+    with pytest.raises(ZeroDivisionError):
+        pogruzhatel_jit.xi_next(0.0, 1.0, 2, 0.0, 0.08, 0.0, 1e-3, 17000.0, 10.0)
+    assert np.isnan(pogruzhatel_jit.depth_step(0.0, 1.0, 0.0, 0.0, 1e-3, 10.0, 0.0))
+
+
+@pytest.mark.parametrize('noise', [{}, {'rpm_noise_scale': 1e-3, 'm_debs_noise_scale': 0.1, 'theta_noise': 0.1}])
+def test_advance_in_chunks_matches_main(table_params, noise):
+    params = {**table_params, **noise}
+    expected = pogruzhatel_jit.main(*pogruzhatel_jit.main_args(params), 0)
+    state = pogruzhatel_jit.start(params)
+    chunks = []
+    while state.scal[pogruzhatel_jit.S_STATUS] == pogruzhatel_jit.STATUS_RUNNING:
+        chunks.append(pogruzhatel_jit.advance(state, 777))
+    for k in range(4):
+        np.testing.assert_array_equal(np.concatenate([chunk[k] for chunk in chunks]), expected[k])
+    assert len(pogruzhatel_jit.advance(state, 10)[0]) == 0
@@ -0,0 +1,22 @@
+import csv
+
+import numpy as np
+
+import sweep
+
+
+def test_empty_grid(table_params, tmp_path):
+    out = str(tmp_path / 'sweep.csv')
+    assert sweep.sweep(table_params, points=[], out=out) == []
+    with open(out, newline='') as f:
+        assert next(csv.reader(f))[:2] == ['point', 'status']
+    assert sweep.sweep(table_params, axes={'gamma_cr': []}, out=str(tmp_path / 'sweep.npz')) == []
+
+
+def test_points_match_single_runs(table_params):
+    axes = {'gamma_cr': [1.0, 1.2], 'fi': [15000.0, 17000.0]}
+    rows = sweep.sweep(table_params, axes=axes, workers=2, depths=[0.1])
+    assert [row['point'] for row in rows] == [0, 1, 2, 3]
+    for row, point in zip(rows, sweep.grid_points(axes)):
+        expected = sweep.run_point({**table_params, **point}, [0.1])
+        np.testing.assert_equal({name: row[name] for name in expected}, expected)